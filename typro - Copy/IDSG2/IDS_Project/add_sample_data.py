@@ -7,7 +7,8 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app import app
-from database.db import db, IDSAlert, User
+from database.db import db, User
+from database.alerts import insert_alerts
 from datetime import datetime, timedelta
 import random
 
@@ -37,6 +38,7 @@ def add_sample_data():
         # Generate alerts for the last 7 days
         base_date = datetime.now() - timedelta(days=7)
         
+        alerts = []
         for i in range(50):  # Create 50 sample alerts
             alert_date = base_date + timedelta(
                 days=random.randint(0, 7),
@@ -44,7 +46,7 @@ def add_sample_data():
                 minutes=random.randint(0, 59)
             )
             
-            alert = IDSAlert(
+            alerts.append(dict(
                 timestamp=alert_date,
                 source_ip=f"192.168.1.{random.randint(1, 254)}",
                 destination_ip=f"10.0.0.{random.randint(1, 254)}",
@@ -53,9 +55,9 @@ def add_sample_data():
                 severity=random.choice(severities),
                 description=f"Detected {random.choice(alert_types)} from suspicious source",
                 user_id=admin_user.id
-            )
-            db.session.add(alert)
+            ))
         
+        insert_alerts(db.session.connection(), alerts)  # day partitions + rollups
         db.session.commit()
         print("Added 50 sample alerts to the database")
         print("Dashboard should now show realistic data!")
@@ -1,14 +1,23 @@
-from flask import Flask, render_template, redirect, url_for, request, flash, send_file
+from flask import Flask, Response, render_template, redirect, url_for, request, flash
 from auth.login import auth_bp, login_manager
 from ids.detection import ids_bp as ids_pcap_bp        # existing pcap-based IDS blueprint
 from ids_single import ids_bp as ids_ui_bp             # new single-page IDS blueprint
+from ids.predict_api import api_bp as ids_api_bp       # batch scoring API
+from ids.pcap_upload import upload_bp as ids_upload_bp  # /ids/ capture uploads, alert log and export
 from crypto.crypto_tool import crypto_bp
 from scanner.port_scan import scanner_bp
 from dashboard.dashboard import dashboard_bp
-from database.db import db_init, db, User, IDSAlert  # Import models from database
+from dashboard.telemetry import collector as telemetry
+from dashboard.stream import broadcaster
+from database.db import db_init, db, User  # Import models from database
+from database.migrate import upgrade_database
+from database import alerts as alert_store
+from database import alert_export
 from password_manager import password_manager_bp
+from ids.jobs import fail_interrupted_jobs
+from scanner import store as scan_store
+from ids.model_registry import registry as model_registry
 from flask_login import login_required, current_user
-from io import BytesIO
 import json
 import os
 import pandas as pd
@@ -27,6 +36,8 @@ login_manager.init_app(app)
 app.register_blueprint(auth_bp)
 app.register_blueprint(ids_pcap_bp)       # /ids - pcap upload & parsing blueprint
 app.register_blueprint(ids_ui_bp)         # /ids (or whatever url_prefix in ids_single) - single-page UI
+app.register_blueprint(ids_api_bp)        # /api/ids/predict - JSON/CSV/NDJSON batch scoring
+app.register_blueprint(ids_upload_bp)     # /ids/ - capture upload jobs, alert log and export
 app.register_blueprint(crypto_bp)
 app.register_blueprint(scanner_bp)
 app.register_blueprint(dashboard_bp)
@@ -34,9 +45,21 @@ app.register_blueprint(password_manager_bp, url_prefix='/password-manager')
 
 # Models are now imported from database.db
 
+# Load every registered model before the first request and watch the files
+# for updates (one memory-mapped copy of each forest shared by all workers)
+model_registry.preload()
+model_registry.start_watcher()
+
 # Create tables if they don't exist
 with app.app_context():
     db.create_all()
+    upgrade_database(db.engine)   # older instance databases: single ids_alert table
+    telemetry.start(db.engine)   # /api/dashboard/realtime samples
+    broadcaster.start(db.engine)   # /api/dashboard/stream events
+    # opt-in (IDS_ALERT_RETENTION_DAYS): drops alert day partitions past the retention period
+    alert_store.start_retention(db.engine)
+    fail_interrupted_jobs()   # jobs cannot survive a restart of this process
+    scan_store.stop_interrupted_runs()
 
 @app.route("/")
 @login_required
@@ -61,7 +84,7 @@ def profile():
         ids_alerts=[],        # Replace with real IDS alerts
         passwords_count=0,    # Replace with real count
         crypto_history=[],    # Replace with real crypto history
-        port_scans=[]         # Replace with real scan history
+        port_scans=[run.summary() for run in scan_store.recent_runs(current_user.id)]
     )
 
 @app.route('/edit_bio', methods=['POST'])
@@ -115,16 +138,24 @@ def export_data():
         "email": current_user.email,
         "bio": current_user.bio,
         "saved_passwords": [pw.to_dict() for pw in getattr(current_user, 'passwords', [])],
-        "ids_logs": [log.to_dict() for log in getattr(current_user, 'ids_logs', [])],
         "crypto_history": [c.to_dict() for c in getattr(current_user, 'crypto_history', [])],
     }
-    json_data = json.dumps(data, indent=2)
-    return send_file(
-        BytesIO(json_data.encode()),
-        mimetype='application/json',
-        as_attachment=True,
-        download_name=f"my_data_{current_user.username}.json"
-    )
+    # the alerts can be millions: streamed into "ids_logs" batch by batch (database/alert_export.py)
+    head = json.dumps(data, indent=2)[:-2]   # without the closing "\n}"
+    ids_logs = alert_export.export_chunks(db.engine, 'json', current_user.id)
+
+    def document():
+        yield f'{head},\n  "ids_logs": '.encode()
+        yield from ids_logs
+        yield b'\n}\n'
+
+    chunks = document()
+    filename = f"my_data_{current_user.username}.json"
+    if request.args.get('gzip', '0') in ('1', 'true'):
+        chunks = alert_export.gzip_chunks(chunks)
+        filename += '.gz'
+    return Response(chunks, mimetype='application/gzip' if filename.endswith('.gz') else 'application/json',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
 
 # Machine Learning Model Training (Run separately, not on each app start)
 def train_ids_model():
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Alert export and log paging: whole document in memory against the
+streaming export (database/alert_export.py) and keyset pages
+(database.alerts.alert_page).
+
+Seeds a scratch SQLite database with --alerts alerts of one user over
+--days days, then exports them the old way (every alert in a list,
+json.dumps(indent=2)) and streamed as json, ndjson, csv and gzipped
+ndjson, each in a fresh process so peak RSS is comparable. Reports
+throughput, output size and peak RSS, and the time to read a page of
+--page alerts at the start, middle and end of the log.
+
+Usage:
+ $ python3 bench_alert_export.py [--alerts 1000000] [--days 30] [--page 50]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from database import alerts as alert_store
+from database import alert_export
+
+SEED_CHUNK = 50000
+USER_ID = 1
+
+
+def seed(engine, n, days):
+    rng = random.Random(7)
+    now = datetime.now()
+    types = ('Malicious Flow', 'Port Scan', 'DDoS Attempt', 'Brute Force')
+    for start in range(0, n, SEED_CHUNK):
+        rows = [{'timestamp': now - timedelta(seconds=rng.random() * days * 86400),
+                 'source_ip': rng.getrandbits(32), 'destination_ip': rng.getrandbits(32),
+                 'protocol': 'TCP', 'alert_type': rng.choice(types),
+                 'severity': rng.choice(('low', 'medium', 'high')),
+                 'description': 'bench_alert_export', 'user_id': USER_ID}
+                for _ in range(min(SEED_CHUNK, n - start))]
+        with engine.begin() as conn:
+            alert_store.insert_alerts(conn, rows)
+
+
+def export(uri, method, results):
+    engine = create_engine(uri)
+    t0 = time.perf_counter()
+    size = 0
+    if method == 'in memory':
+        with engine.connect() as conn:
+            data = [alert_export.alert_record(a) for a in alert_store.iter_alerts(conn, USER_ID)]
+        size = len(json.dumps(data, indent=2).encode())
+    else:
+        fmt, _, compress = method.partition('+')
+        for chunk in alert_export.export_chunks(engine, fmt, USER_ID, bool(compress)):
+            size += len(chunk)
+    elapsed = time.perf_counter() - t0
+    results.put((elapsed, size, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--page', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = f"sqlite:///{os.path.join(tmp, 'export.db')}"
+        engine = create_engine(uri)
+        alert_store.create_rollup_tables(engine)
+        t0 = time.perf_counter()
+        seed(engine, args.alerts, args.days)
+        print(f"seeded {args.alerts} alerts over {args.days} days in {time.perf_counter() - t0:.1f}s\n")
+
+        print(f"{'export':<14}{'alerts/s':>12}{'MiB':>10}{'peak RSS MiB':>14}")
+        context = multiprocessing.get_context('spawn')
+        for method in ('in memory', 'json', 'ndjson', 'csv', 'ndjson+gzip'):
+            results = context.Queue()
+            process = context.Process(target=export, args=(uri, method, results))
+            process.start()
+            elapsed, size, rss = results.get()
+            process.join()
+            print(f"{method:<14}{args.alerts / elapsed:>12.0f}{size / 2**20:>10.1f}{rss:>14.0f}")
+
+        print(f"\n{'page':<14}{'ms':>12}")
+        with engine.connect() as conn:
+            after, page, timings = None, 0, {}
+            last = args.alerts // args.page
+            while True:
+                t0 = time.perf_counter()
+                rows, after = alert_store.alert_page(conn, USER_ID, after, args.page)
+                if page in (0, last // 2, last) or after is None:
+                    timings[page] = (time.perf_counter() - t0) * 1000
+                if after is None:
+                    break
+                page += 1
+        for page, ms in timings.items():
+            print(f"{page:<14}{ms:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Dashboard query benchmark on a large alert history.
+
+Seeds a scratch SQLite database with the ids_alert layout older versions
+created (text addresses, mixed-case severities, no indexes), times the
+dashboard's alert queries as they ran before, migrates the table into day
+partitions and rollups with database.migrate.upgrade_database and times the
+current queries on them.
+Both runs must return the same answers; the table size is reported too.
+
+Alerts are spread over the last --days days in time order (the way the IDS
+writes them) over --users users; 10% are high, 30% medium, 60% low.
+
+Usage:
+ $ python3 bench_alert_queries.py [--alerts 10000000] [--days 30] [--users 5] [--repeat 3] [--db path]
+"""
+import argparse
+import os
+import random
+import socket
+import sqlite3
+import struct
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import text
+
+from dashboard.dashboard import alert_buckets, alert_counts, recent_alerts
+from database import alerts as alert_store
+from database.db import db
+from database.migrate import upgrade_database
+
+SEED_CHUNK = 200000
+
+# ids_alert as db.create_all() made it before database/migrate.py
+LEGACY_TABLE_SQL = """
+CREATE TABLE ids_alert (
+    id INTEGER NOT NULL,
+    timestamp DATETIME NOT NULL,
+    source_ip VARCHAR(15) NOT NULL,
+    destination_ip VARCHAR(15) NOT NULL,
+    protocol VARCHAR(10) NOT NULL,
+    alert_type VARCHAR(50) NOT NULL,
+    severity VARCHAR(10) NOT NULL,
+    description TEXT,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES user (id)
+)
+"""
+
+# the dashboard queries before the indexes (dashboard/dashboard.py and the pcap blueprint),
+# matching severities case-insensitively like the dashboard did
+LEGACY_QUERIES = {
+    'recent 10': "SELECT * FROM ids_alert ORDER BY timestamp DESC LIMIT 10",
+    'headline counts': """
+        SELECT count(ids_alert.id),
+               sum(CASE WHEN lower(ids_alert.severity) = 'high' THEN 1 ELSE 0 END),
+               (SELECT count(user.id) FROM user)
+        FROM ids_alert""",
+    '7d by day': """
+        SELECT strftime('%Y-%m-%d', timestamp) AS bucket, lower(severity) AS severity, count(*)
+        FROM ids_alert WHERE timestamp >= :since GROUP BY bucket, severity ORDER BY bucket""",
+    '24h by hour': """
+        SELECT strftime('%Y-%m-%d %H:00', timestamp) AS bucket, lower(severity) AS severity, count(*)
+        FROM ids_alert WHERE timestamp >= :since GROUP BY bucket, severity ORDER BY bucket""",
+    'user recent 10': """
+        SELECT * FROM ids_alert WHERE user_id = :user ORDER BY timestamp DESC LIMIT 10""",
+    'user high count': """
+        SELECT count(*) FROM ids_alert WHERE user_id = :user AND lower(severity) = 'high'""",
+}
+
+
+def seed(path, n_alerts, days, n_users, seed=7):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute(LEGACY_TABLE_SQL)
+    conn.execute("CREATE TABLE user (id INTEGER NOT NULL PRIMARY KEY, username VARCHAR(150) NOT NULL, "
+                 "email VARCHAR(150), password_hash VARCHAR(256) NOT NULL, bio VARCHAR(256), "
+                 "role VARCHAR(20) NOT NULL)")
+    conn.executemany("INSERT INTO user VALUES (?, ?, NULL, '', NULL, 'user')",
+                     [(i, f'user{i}') for i in range(1, n_users + 1)])
+    start = datetime.now() - timedelta(days=days)
+    step = days * 86400 / n_alerts
+    protocols = ('TCP', 'UDP', 'ICMP')
+    severities = ['low'] * 12 + ['medium'] * 6 + ['high', 'High']   # the pcap upload wrote 'High'
+    pack = struct.Struct('!I').pack
+    done = 0
+    while done < n_alerts:
+        rows = []
+        for i in range(done, min(done + SEED_CHUNK, n_alerts)):
+            when = start + timedelta(seconds=i * step + rng.random() * step)
+            rows.append((when.isoformat(' '),
+                         socket.inet_ntoa(pack(0x0A000000 | rng.getrandbits(24))),
+                         socket.inet_ntoa(pack(0xC0A80000 | rng.getrandbits(16))),
+                         rng.choice(protocols), 'Malicious Flow', rng.choice(severities),
+                         'seeded alert', rng.randint(1, n_users)))
+        with conn:
+            conn.executemany("INSERT INTO ids_alert (timestamp, source_ip, destination_ip, protocol, "
+                             "alert_type, severity, description, user_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        done += len(rows)
+    conn.close()
+
+
+def alert_storage(path):
+    """'table X MiB, indexes Y MiB' of the alert table(s) and rollups, from SQLite's dbstat table."""
+    conn = sqlite3.connect(path)
+    try:
+        table, indexes = conn.execute(
+            "SELECT coalesce(sum(CASE WHEN name LIKE 'ids_alert%' THEN pgsize END), 0), "
+            "coalesce(sum(CASE WHEN name LIKE 'ix_ids_alert_%' OR name LIKE 'sqlite_autoindex_ids_alert%' "
+            "THEN pgsize END), 0) FROM dbstat").fetchone()
+    finally:
+        conn.close()
+    return f"table {table / 2**20:.0f} MiB, indexes {indexes / 2**20:.0f} MiB"
+
+
+def best_of(repeat, func):
+    best, result = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def legacy_answers(name, rows):
+    """The result of a legacy query in the shape the current code returns."""
+    if name in ('recent 10', 'user recent 10'):
+        return [row[0] for row in rows]
+    if name == 'headline counts':
+        total, high, users = rows[0]
+        return (total, high or 0, users)
+    if name == 'user high count':
+        return rows[0][0]
+    buckets = {}
+    for key, level, count in rows:
+        counts = buckets.setdefault(key, {'total': 0, 'high': 0, 'medium': 0, 'low': 0})
+        counts['total'] += count
+        counts[level] = counts.get(level, 0) + count
+    return buckets
+
+
+def current_queries(user):
+    """The same queries as the code runs them now (partitions and rollups)."""
+    return {
+        'recent 10': lambda: [a.id for a in recent_alerts(10)],
+        'headline counts': alert_counts,
+        '7d by day': lambda: alert_buckets(timedelta(days=7), 'day'),
+        '24h by hour': lambda: alert_buckets(timedelta(hours=24), 'hour'),
+        'user recent 10': lambda: [a.id for a in alert_store.recent_alerts(db.session.connection(), 10, user)],
+        'user high count': lambda: alert_store.count_alerts(db.session.connection(), user, 'high'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=10000000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--db', help="scratch database path (default: a temporary file, removed afterwards)")
+    args = parser.parse_args()
+
+    tmp = None
+    path = args.db
+    if path is None:
+        tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp.name, 'alerts.db')
+    elif os.path.exists(path):
+        parser.error(f"{path} exists")
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.abspath(path)}'
+    db.init_app(app)
+    try:
+        t0 = time.perf_counter()
+        seed(path, args.alerts, args.days, args.users)
+        print(f"seeded {args.alerts} alerts over {args.days} days in {time.perf_counter() - t0:.1f}s: "
+              f"{alert_storage(path)}\n")
+
+        with app.app_context():
+            since = datetime.now()
+            params = {'user': 1}
+            before = {}
+            for name, sql in LEGACY_QUERIES.items():
+                if name == '7d by day':
+                    params['since'] = since - timedelta(days=7)
+                elif name == '24h by hour':
+                    params['since'] = since - timedelta(hours=24)
+                elapsed, rows = best_of(args.repeat, lambda: db.session.execute(text(sql), params).all())
+                before[name] = elapsed, legacy_answers(name, rows)
+
+            t0 = time.perf_counter()
+            upgrade_database(db.engine)
+            migration = time.perf_counter() - t0
+            after = {name: best_of(args.repeat, query) for name, query in current_queries(1).items()}
+
+        print(f"{'query':<18}{'before ms':>12}{'after ms':>12}{'speedup':>10}  same answer")
+        for name, (old, old_answer) in before.items():
+            new, new_answer = after[name]
+            if isinstance(old_answer, dict):
+                # buckets at the window edge move while the benchmark runs
+                same = list(old_answer)[1:-1] == list(new_answer)[1:-1] and all(
+                    old_answer[k] == new_answer[k] for k in list(old_answer)[1:-1])
+            else:
+                same = old_answer == new_answer
+            print(f"{name:<18}{old * 1000:>12.2f}{new * 1000:>12.2f}{old / new:>9.0f}x  {same}")
+        print(f"\nmigration (convert, partition, index, roll up): {migration:.1f}s, now {alert_storage(path)}")
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
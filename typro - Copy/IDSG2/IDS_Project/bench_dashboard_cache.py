@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+/dashboard page loads with and without the snapshot cache
+(dashboard/snapshot.py).
+
+Seeds a scratch SQLite database with --alerts alerts over the last --days
+days through database.alerts.insert_alerts, logs in an admin and loads
+/dashboard --requests times from --threads threads: once with the cache
+bypassed (ttl 0, every load runs the counts, recent alerts and chart
+queries) and once cached, with an alert stored every --write-every loads
+to show invalidation. Reports page loads per second, latency and the
+cache counters.
+
+Usage:
+ $ python3 bench_dashboard_cache.py [--alerts 1000000] [--days 30] [--requests 2000] [--threads 4]
+                                    [--write-every 200]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+SEED_CHUNK = 50000
+
+
+def seed(app, n, days):
+    from database import alerts as alert_store
+    from database.db import User, db
+
+    rng = random.Random(5)
+    now = datetime.now()
+    types = ('Malicious Flow', 'Port Scan', 'DDoS Attempt', 'Brute Force', 'SQL Injection', 'XSS Attack')
+    with app.app_context():
+        admin = User(username='bench', password_hash='-', role='admin')
+        db.session.add(admin)
+        db.session.commit()
+        for start in range(0, n, SEED_CHUNK):
+            rows = [{'timestamp': now - timedelta(seconds=rng.random() * days * 86400),
+                     'source_ip': rng.getrandbits(32), 'destination_ip': rng.getrandbits(32),
+                     'protocol': 'TCP', 'alert_type': rng.choice(types),
+                     'severity': rng.choice(('low', 'low', 'medium', 'high')),
+                     'description': 'bench_dashboard_cache', 'user_id': admin.id}
+                    for _ in range(min(SEED_CHUNK, n - start))]
+            alert_store.insert_alerts(db.session.connection(), rows)
+            db.session.commit()
+        return admin.id
+
+
+def load_pages(app, user_id, requests, threads, write_every):
+    from database import alerts as alert_store
+    from database.db import db
+
+    latencies = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        mine = []
+        for i in counter:
+            if write_every and i and i % write_every == 0:
+                with app.app_context():
+                    alert_store.insert_alerts(db.session.connection(), [{
+                        'timestamp': datetime.now(), 'source_ip': '10.0.0.1', 'destination_ip': '10.0.0.2',
+                        'protocol': 'TCP', 'alert_type': 'Malicious Flow', 'severity': 'high',
+                        'description': 'bench write', 'user_id': user_id}])
+                    db.session.commit()
+                    alert_store.notify_changed()
+            t0 = time.perf_counter()
+            response = client.get('/dashboard')
+            mine.append(time.perf_counter() - t0)
+            assert response.status_code == 200, response.status_code
+        with lock:
+            latencies.extend(mine)
+
+    t0 = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - t0, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--write-every', type=int, default=200, help="store an alert every N page loads")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['IDS_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'dashboard.db')}"
+        os.environ['IDS_ALERT_RETENTION_DAYS'] = '0'
+        import logging
+        logging.disable(logging.WARNING)
+        from app import app
+        from dashboard.dashboard import dashboard_cache
+
+        t0 = time.perf_counter()
+        user_id = seed(app, args.alerts, args.days)
+        print(f"seeded {args.alerts} alerts over {args.days} days in {time.perf_counter() - t0:.1f}s\n")
+        print(f"{'cache':<10}{'pages/s':>10}{'p50 ms':>10}{'p99 ms':>10}  counters")
+        for name, ttl in (('bypassed', 0.0), ('cached', dashboard_cache.ttl)):
+            dashboard_cache.ttl = ttl
+            dashboard_cache.hits = dashboard_cache.misses = dashboard_cache.invalidations = 0
+            elapsed, latencies = load_pages(app, user_id, args.requests, args.threads, args.write_every)
+            stats = dashboard_cache.stats()
+            print(f"{name:<10}{len(latencies) / elapsed:>10.0f}{latencies[len(latencies) // 2] * 1000:>10.2f}"
+                  f"{latencies[int(len(latencies) * 0.99)] * 1000:>10.2f}  hits {stats['hits']}, "
+                  f"misses {stats['misses']}, invalidations {stats['invalidations']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Fan-out benchmark of the dashboard's Server-Sent Events stream
+(dashboard/stream.py) against polling /api/dashboard/realtime.
+
+Serves Broadcaster.stream() from a threaded Werkzeug server (the login
+check of the real endpoint is left out), opens --clients streams, then
+publishes --events alert events of about --size bytes at --rate per second and
+measures when each client receives each event. --slow of the clients
+never read their socket: they must be disconnected once their buffer is
+full, not slow the others down or grow the server's memory.
+
+For comparison, the same number of dashboards polling every 30 s (the
+dashboard before the stream) costs clients / 30 requests per second, each
+loading the user and querying the database; the stream sends nothing per
+client but the events themselves.
+
+Usage:
+ $ python3 bench_dashboard_stream.py [--clients 500] [--slow 10] [--events 1500] [--rate 50] [--size 4096]
+"""
+import argparse
+import logging
+import socket
+import threading
+import time
+
+from flask import Flask, Response, request
+from werkzeug.serving import make_server
+
+from dashboard import stream
+from dashboard.stream import Broadcaster
+
+
+class StubTelemetry:
+    def latest(self):
+        return None
+
+
+def rss_mib():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def make_app(broadcaster):
+    app = Flask(__name__)
+
+    @app.route('/stream')
+    def events():
+        last = request.headers.get('Last-Event-ID')
+        return Response(broadcaster.stream(int(last) if last else None), mimetype='text/event-stream')
+    return app
+
+
+def open_stream(port, last_event_id=None, receive_buffer=None):
+    sock = socket.socket()
+    if receive_buffer:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)   # before the window is set
+    sock.connect(('127.0.0.1', port))
+    headers = f"Last-Event-ID: {last_event_id}\r\n" if last_event_id else ""
+    sock.sendall(f"GET /stream HTTP/1.1\r\nHost: localhost\r\n{headers}Connection: close\r\n\r\n".encode())
+    return sock
+
+
+def reader(sock, received, first_id, done):
+    """Record the arrival time of every event id on one stream."""
+    buffer = b''
+    try:
+        while not done.is_set():
+            data = sock.recv(65536)
+            if not data:
+                break
+            now = time.perf_counter()
+            buffer += data
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                if line.startswith(b'id: '):
+                    received[int(line[4:]) - first_id] = now
+    except OSError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--slow', type=int, default=10, help="clients that never read")
+    parser.add_argument('--events', type=int, default=1500)
+    parser.add_argument('--rate', type=float, default=50, help="events published per second")
+    parser.add_argument('--size', type=int, default=4096,
+                        help="bytes per event (stalled clients are only dropped once the kernel's "
+                             "socket buffers, ~4 MiB, are full too)")
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    broadcaster = Broadcaster(StubTelemetry(), max_clients=args.clients + args.slow + 10)
+    server = make_server('127.0.0.1', 0, make_app(broadcaster), threaded=True)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    rss_before = rss_mib()
+    done = threading.Event()
+    first_id = broadcaster.stats()['last_event_id'] + 1
+    received = [[None] * args.events for _ in range(args.clients)]
+    socks = []
+    t0 = time.perf_counter()
+    for i in range(args.clients):
+        sock = open_stream(port)
+        socks.append(sock)
+        threading.Thread(target=reader, args=(sock, received[i], first_id, done), daemon=True).start()
+    slow = [open_stream(port, receive_buffer=4096) for _ in range(args.slow)]
+    while broadcaster.stats()['clients'] < args.clients + args.slow:
+        time.sleep(0.01)
+    connect = time.perf_counter() - t0
+
+    # a small batch of alerts
+    payload = [{'id': i, 'source_ip': '10.0.0.1', 'destination_ip': '192.168.0.1',
+                'protocol': 'TCP', 'alert_type': 'Malicious Flow', 'severity': 'high',
+                'description': 'x' * 80} for i in range(max(1, args.size // 200))]
+    sent = []
+    t0 = time.perf_counter()
+    for i in range(args.events):
+        next_at = t0 + i / args.rate
+        time.sleep(max(0.0, next_at - time.perf_counter()))
+        sent.append(time.perf_counter())
+        broadcaster.publish('alerts', payload)
+    time.sleep(1.0)
+    rss_after = rss_mib()
+
+    # a client that lost its connection resumes with Last-Event-ID
+    resumed = [None] * args.events
+    half = first_id + args.events // 2
+    sock = open_stream(port, half)
+    thread = threading.Thread(target=reader, args=(sock, resumed, first_id, done), daemon=True)
+    thread.start()
+    time.sleep(0.5)
+    done.set()
+
+    latencies = sorted(arrival - sent[i] for client in received for i, arrival in enumerate(client)
+                       if arrival is not None)
+    delivered = len(latencies)
+    stats = broadcaster.stats()
+    pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else float('nan')
+    print(f"{args.clients} reading + {args.slow} stalled clients connected in {connect:.2f}s")
+    print(f"{args.events} events at {args.rate:g}/s: {delivered} of {args.clients * args.events} deliveries, "
+          f"latency p50 {pct(0.5):.1f} ms, p99 {pct(0.99):.1f} ms, max {pct(1.0):.1f} ms")
+    print(f"stalled clients dropped: {stats['dropped_clients']} of {args.slow} "
+          f"(buffer {stream.CLIENT_BUFFER} events)")
+    print(f"resumed after event {args.events // 2}: got {sum(r is not None for r in resumed)} of "
+          f"{args.events - args.events // 2 - 1} missed events")
+    print(f"RSS {rss_before:.0f} -> {rss_after:.0f} MiB (client and server in this process)")
+    print(f"polling every 30s instead: {args.clients / 30:.0f} requests/s, each with a user load and a query")
+    for s in socks + slow + [sock]:
+        s.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test of the alert database: writer threads insert small
+batches of alerts (like the live IDS and pcap uploads) while reader threads
+run the dashboard queries (headline counts, recent alerts, 24 h buckets),
+each thread in its own app context like a request.
+
+Runs twice on scratch SQLite files seeded with --seed alerts:
+
+    defaults     SQLAlchemy's defaults, rollback journal (before db_init
+                 configured the engine)
+    configured   db_init(): WAL, busy_timeout, synchronous=NORMAL, cache
+                 and mmap sizes, sized pool (database/config.py)
+
+and reports throughput, latency percentiles and "database is locked"
+errors per side. With --uri only that database is tested (e.g. MySQL:
+mysql+mysqlconnector://user:pw@host/scratch_db; its alert partitions are
+created if missing and alerts are added to them).
+
+Usage:
+ $ python3 bench_db_concurrency.py [--writers 4] [--readers 8] [--seconds 10] [--batch 20]
+                                   [--seed 200000] [--uri URI]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from dashboard.dashboard import alert_buckets, alert_counts, recent_alerts
+from database.alerts import insert_alerts
+from database.db import db, db_init, User
+from database.migrate import upgrade_database
+
+SEED_CHUNK = 50000
+
+
+def make_app(uri, configured):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    if configured:
+        db_init(app)
+    else:
+        db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        upgrade_database(db.engine)
+        if uri.startswith('sqlite') and not configured:
+            db.session.execute(text('PRAGMA journal_mode = DELETE'))
+        if User.query.first() is None:
+            db.session.add(User(username='stress', password_hash='-', role='admin'))
+            db.session.commit()
+    return app
+
+
+def alert_rows(rng, n, user_id, when=None):
+    now = when or datetime.now()
+    return [{'timestamp': now - timedelta(seconds=rng.random() * 86400 * 7),
+             'source_ip': rng.getrandbits(32), 'destination_ip': rng.getrandbits(32),
+             'protocol': 'TCP', 'alert_type': 'Stress Test',
+             'severity': rng.choice(('low', 'medium', 'high')),
+             'description': 'bench_db_concurrency', 'user_id': user_id} for _ in range(n)]
+
+
+def seed(app, n):
+    rng = random.Random(1)
+    with app.app_context():
+        user_id = User.query.first().id
+        for start in range(0, n, SEED_CHUNK):
+            insert_alerts(db.session.connection(), alert_rows(rng, min(SEED_CHUNK, n - start), user_id))
+            db.session.commit()
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.locked = 0
+        self.other_errors = 0
+        self.lock = threading.Lock()
+
+    def add(self, latency=None, error=None):
+        with self.lock:
+            if error is None:
+                self.latencies.append(latency)
+            elif 'locked' in str(error):
+                self.locked += 1
+            else:
+                self.other_errors += 1
+
+    def percentile(self, q):
+        if not self.latencies:
+            return float('nan')
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+def writer(app, stop, stats, batch, seed_value):
+    rng = random.Random(seed_value)
+    with app.app_context():
+        user_id = User.query.first().id
+        db.session.close()
+        while not stop.is_set():
+            rows = alert_rows(rng, batch, user_id, datetime.now())
+            t0 = time.perf_counter()
+            try:
+                insert_alerts(db.session.connection(), rows)
+                db.session.commit()
+            except OperationalError as e:
+                db.session.rollback()
+                stats.add(error=e)
+                continue
+            finally:
+                db.session.close()
+            stats.add(time.perf_counter() - t0)
+
+
+def reader(app, stop, stats):
+    queries = (
+        alert_counts,
+        lambda: recent_alerts(10),
+        lambda: alert_buckets(timedelta(hours=24), 'hour'),
+    )
+    with app.app_context():
+        i = 0
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                queries[i % len(queries)]()
+            except OperationalError as e:
+                db.session.rollback()
+                stats.add(error=e)
+                continue
+            finally:
+                db.session.close()   # the end of a request
+                i += 1
+            stats.add(time.perf_counter() - t0)
+
+
+def run(app, writers, readers, seconds, batch):
+    stop = threading.Event()
+    write_stats, read_stats = Stats(), Stats()
+    threads = [threading.Thread(target=writer, args=(app, stop, write_stats, batch, i)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(app, stop, read_stats)) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return write_stats, read_stats
+
+
+def report(name, seconds, batch, write_stats, read_stats):
+    writes, reads = len(write_stats.latencies), len(read_stats.latencies)
+    print(f"{name:<12}{writes * batch / seconds:>10.0f}{write_stats.percentile(0.5):>9.1f}"
+          f"{write_stats.percentile(0.99):>9.1f}{write_stats.locked:>8}{reads / seconds:>10.0f}"
+          f"{read_stats.percentile(0.5):>9.1f}{read_stats.percentile(0.99):>9.1f}{read_stats.locked:>8}"
+          f"{write_stats.other_errors + read_stats.other_errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--batch', type=int, default=20, help="alerts per write transaction")
+    parser.add_argument('--seed', type=int, default=200000, help="alerts in the table before the run")
+    parser.add_argument('--uri', help="test this database only, with the configured engine")
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers x {args.batch} alerts/commit, {args.readers} readers, {args.seconds:g}s\n")
+    print(f"{'engine':<12}{'alerts/s':>10}{'w p50':>9}{'w p99':>9}{'w lock':>8}{'reads/s':>10}"
+          f"{'r p50':>9}{'r p99':>9}{'r lock':>8}{'other':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.uri:
+            sides = [('configured', args.uri, True)]
+        else:
+            sides = [(name, f"sqlite:///{os.path.join(tmp, name + '.db')}", name == 'configured')
+                     for name in ('defaults', 'configured')]
+        for name, uri, configured in sides:
+            app = make_app(uri, configured)
+            if not args.uri:
+                seed(app, args.seed)
+            write_stats, read_stats = run(app, args.writers, args.readers, args.seconds, args.batch)
+            report(name, args.seconds, args.batch, write_stats, read_stats)
+            with app.app_context():
+                db.engine.dispose()
+    print("\nw/r p50, p99: milliseconds per write transaction / dashboard query; "
+          "lock: 'database is locked' errors")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for the live IDS flow table.
+
+Compares the old layout (f-string key -> dict of 10 counters per flow) with
+ids.flow_table.FlowTable (packed int key -> float64 counter row) at 1M flows.
+
+Usage:
+ $ python3 bench_flow_memory.py [n_flows]
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+from ids.flow_table import FlowTable, int_to_ip, pack_flow_key
+
+FLOW_TIMEOUT = 2.0
+
+
+def synthetic_tuples(n, seed=42):
+    rng = random.Random(seed)
+    for _ in range(n):
+        yield (rng.getrandbits(32), rng.getrandbits(32),
+               rng.randint(1024, 65535), rng.choice((22, 53, 80, 443)),
+               rng.choice((6, 17)))
+
+
+def build_dict_flows(n):
+    """Old layout from ids/ids.py before the compact flow store."""
+    flows = {}
+    ts = time.time()
+    for src, dst, sport, dport, proto in synthetic_tuples(n):
+        key = f"{int_to_ip(src)}:{sport}-{int_to_ip(dst)}:{dport}-{proto}"
+        flows[key] = {
+            'first_ts': ts,
+            'last_ts': ts + 0.5,
+            'packet_count': 1,
+            'total_bytes': 60,
+            'src_port': sport,
+            'dst_port': dport,
+            'protocol': proto,
+            'syn_count': 1,
+            'ack_count': 0,
+            'fin_count': 0,
+        }
+    return flows
+
+
+def build_flow_table(n):
+    table = FlowTable()
+    ts = time.time()
+    for src, dst, sport, dport, proto in synthetic_tuples(n):
+        key = pack_flow_key(src, dst, sport, dport, proto)
+        table.add_packet(key, ts, 60, 0x02, FLOW_TIMEOUT)
+    return table
+
+
+def measure(label, builder, n):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    obj = builder(n)
+    elapsed = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} flows={len(obj):>9,}  retained={current / 2**20:8.1f} MiB  "
+          f"peak={peak / 2**20:8.1f} MiB  per_flow={current / n:6.0f} B  "
+          f"build={elapsed:6.2f}s")
+    del obj
+    return current
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"Flow table memory benchmark ({n:,} flows)")
+    print("-" * 60)
+    old = measure("dict flows", build_dict_flows, n)
+    new = measure("FlowTable", build_flow_table, n)
+    print("-" * 60)
+    print(f"Reduction: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
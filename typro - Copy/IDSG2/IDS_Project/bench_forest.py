@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for ids.forest.CompiledForest against sklearn's
+RandomForestClassifier.predict_proba.
+
+Reports p50/p99 per-call latency for single rows and small batches, and
+checks that both return bit-identical probabilities.
+
+Without --model a 100-tree RandomForest is fitted on random 30-feature
+records (the NSL-KDD form layout of ids/detection.py).
+
+Usage:
+ $ python3 bench_forest.py [--calls 300] [--batches 1,8,64,1024] [--model ids_model/model.h5]
+"""
+import argparse
+import time
+
+import joblib
+import numpy as np
+
+from ids.forest import CompiledForest
+
+
+def fit_stand_in_model(n_features=30):
+    from sklearn.ensemble import RandomForestClassifier
+
+    rng = np.random.default_rng(0)
+    X = rng.gamma(2.0, 50.0, size=(20000, n_features))
+    y = np.where(X[:, 3] > X[:, 4], 'normal', 'dos')
+    return RandomForestClassifier(n_estimators=100, random_state=0).fit(X, y)
+
+
+def latencies(predict, batches):
+    times = []
+    for X in batches:
+        t0 = time.perf_counter()
+        predict(X)
+        times.append(time.perf_counter() - t0)
+    return np.percentile(times, [50, 99]) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=300, help="timed calls per batch size")
+    parser.add_argument('--batches', default='1,8,64,1024', help="comma-separated batch sizes")
+    parser.add_argument('--model', help="pickled RandomForestClassifier (default: fit a stand-in)")
+    args = parser.parse_args()
+
+    model = joblib.load(args.model) if args.model else fit_stand_in_model()
+    t0 = time.perf_counter()
+    compiled = CompiledForest(model)
+    print(f"Compiled {compiled.n_estimators} trees / {len(compiled.feature):,} nodes "
+          f"(max depth {compiled.max_depth}) in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    rng = np.random.default_rng(1)
+    print(f"{'batch':>6} {'sklearn p50':>12} {'p99':>9} {'compiled p50':>13} {'p99':>9} "
+          f"{'speedup':>8} {'identical':>10}")
+    print("-" * 73)
+    for size in (int(b) for b in args.batches.split(',')):
+        batches = [rng.gamma(2.0, 50.0, size=(size, compiled.n_features_in_)) for _ in range(args.calls)]
+        identical = all(np.array_equal(model.predict_proba(X), compiled.predict_proba(X))
+                        for X in batches[:20])
+        sk50, sk99 = latencies(model.predict_proba, batches)
+        c50, c99 = latencies(compiled.predict_proba, batches)
+        print(f"{size:>6} {sk50:>10.3f}ms {sk99:>7.3f}ms {c50:>11.3f}ms {c99:>7.3f}ms "
+              f"{sk50 / c50:>7.1f}x {str(identical):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the NSL-KDD connection classifier: one record per
+/ids form POST (ids/detection.py) versus batches through /api/ids/predict
+(ids/predict_api.py) as JSON, NDJSON and CSV.
+
+Without --model a RandomForest is fitted on random records so prediction
+cost is realistic; it is installed as the shared 'detection.model'.
+
+Usage:
+ $ python3 bench_predict_api.py [--records 50000] [--form-records 300] [--model ids_model/model.h5]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import time
+
+import joblib
+import numpy as np
+from flask import Flask
+
+import ids_single
+from ids import detection
+from ids.detection import FEATURE_FIELDS, _FLAG_MAP, _PROTOCOL_MAP
+from ids.forest import compile_model
+from ids.model_registry import registry
+from ids.predict_api import api_bp
+
+
+def synthetic_records(n, seed=3):
+    rng = random.Random(seed)
+    protocols = list(_PROTOCOL_MAP)
+    flags = list(_FLAG_MAP)
+    records = []
+    for _ in range(n):
+        rec = {f: round(rng.random() * 100, 2) for f in FEATURE_FIELDS}
+        rec['protocol_type'] = rng.choice(protocols)
+        rec['flag'] = rng.choice(flags)
+        records.append(rec)
+    return records
+
+
+def fit_stand_in_model(records):
+    from sklearn.ensemble import RandomForestClassifier
+
+    X = np.array([[_PROTOCOL_MAP.get(r[f], 0) if f == 'protocol_type' else
+                   _FLAG_MAP.get(r[f], 0) if f == 'flag' else r[f] for f in FEATURE_FIELDS]
+                  for r in records[:20000]])
+    y = np.where(X[:, 3] > X[:, 4], 'normal', 'dos')
+    return RandomForestClassifier(n_estimators=50, max_depth=12, random_state=0).fit(X, y)
+
+
+def make_app():
+    app = Flask(__name__, template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                       'templates'))
+    # same order as app.py: POST /ids is served by ids.detection, ids.html links ids_single
+    app.register_blueprint(detection.ids_bp)
+    app.register_blueprint(ids_single.ids_bp)
+    app.register_blueprint(api_bp)
+    return app
+
+
+def bench_form(client, records):
+    t0 = time.perf_counter()
+    for rec in records:
+        resp = client.post('/ids', data={k: str(v) for k, v in rec.items()})
+        assert resp.status_code == 200
+    return len(records) / (time.perf_counter() - t0)
+
+
+def bench_api(client, body, content_type, n):
+    t0 = time.perf_counter()
+    resp = client.post('/api/ids/predict', data=body, content_type=content_type)
+    lines = resp.get_data(as_text=True).splitlines()
+    elapsed = time.perf_counter() - t0
+    assert resp.status_code == 200 and len(lines) == n, (resp.status_code, lines[:1])
+    assert 'error' not in json.loads(lines[-1])
+    return n / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--records', type=int, default=50000, help="records per API request")
+    parser.add_argument('--form-records', type=int, default=300, help="form POSTs to time")
+    parser.add_argument('--model', help="trained model (default: fit a stand-in)")
+    args = parser.parse_args()
+
+    records = synthetic_records(max(args.records, args.form_records, 20000))
+    model = joblib.load(args.model) if args.model else fit_stand_in_model(records)
+    registry.put('detection.model', compile_model(model))
+    client = make_app().test_client()
+    batch = records[:args.records]
+
+    csv = io.StringIO()
+    csv.write(','.join(FEATURE_FIELDS) + '\n')
+    for rec in batch:
+        csv.write(','.join(str(rec[f]) for f in FEATURE_FIELDS) + '\n')
+    bodies = [
+        ('JSON', json.dumps(batch), 'application/json'),
+        ('NDJSON', '\n'.join(json.dumps(r) for r in batch), 'application/x-ndjson'),
+        ('CSV', csv.getvalue(), 'text/csv'),
+    ]
+
+    print("NSL-KDD classifier throughput")
+    print(f"{'path':<24} {'records':>9} {'records/s':>12} {'speedup':>9}")
+    print("-" * 57)
+    form_rate = bench_form(client, records[:args.form_records])
+    print(f"{'form POST /ids':<24} {args.form_records:>9,} {form_rate:>12,.0f} {1.0:>8.1f}x")
+    for name, body, content_type in bodies:
+        rate = bench_api(client, body, content_type, len(batch))
+        print(f"{'API ' + name:<24} {len(batch):>9,} {rate:>12,.0f} {rate / form_rate:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
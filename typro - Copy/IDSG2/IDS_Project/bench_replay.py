@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the flow IDS offline replay mode.
+
+Writes synthetic pcaps of increasing size, replays each one through
+ids.ids.replay_pcap in a fresh process and reports packets/s, flows/s,
+classification latency percentiles (per model call) and peak RSS.
+
+Without --model/--scaler a RandomForest + StandardScaler is fitted on random
+flow features so the classification cost is realistic.
+
+Usage:
+ $ python3 bench_replay.py [--sizes 10000,100000,1000000] [--model model.pkl --scaler scaler.pkl]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+CAPTURE_PPS = 50000          # synthetic capture rate (packets per second of capture time)
+PKTS_PER_FLOW = 10           # average packets per synthetic flow
+ACTIVE_WINDOW = 2000         # flows receiving packets at any moment
+
+
+def write_synthetic_pcap(path, n_packets, seed=7):
+    """
+    Ethernet/IPv4 TCP and UDP traffic. Flow ids advance with the packet
+    index, so each flow is active for a short while, goes idle and expires
+    after FLOW_TIMEOUT of capture time.
+    """
+    rng = random.Random(seed)
+    eth = b'\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb\x08\x00'
+    tcp_flags = (0x02, 0x12, 0x10, 0x18, 0x11)
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for i in range(n_packets):
+            newest = i // PKTS_PER_FLOW
+            flow = rng.randint(max(0, newest - ACTIVE_WINDOW), newest)
+            src = 0x0A000000 | (flow * 2654435761 & 0xFFFFFF)
+            dst = 0xC0A80000 | (flow % 254 + 1)
+            sport = 1024 + flow % 60000
+            payload = rng.randint(0, 1200)
+            if flow % 4:
+                proto = 6
+                l4 = struct.pack('!HHIIBBHHH', sport, (80, 443, 22)[flow % 3], i, 0,
+                                 0x50, rng.choice(tcp_flags), 65535, 0, 0)
+            else:
+                proto = 17
+                l4 = struct.pack('!HHHH', sport, 53, 8 + payload, 0)
+            total = 20 + len(l4) + payload
+            ip = struct.pack('!BBHHHBBHII', 0x45, 0, total, 0, 0, 64, proto, 0, src, dst)
+            frame = eth + ip + l4 + bytes(payload)
+            ts = i / CAPTURE_PPS
+            sec = int(ts)
+            f.write(struct.pack('<IIII', 1700000000 + sec, int((ts - sec) * 1e6),
+                                len(frame), len(frame)))
+            f.write(frame)
+
+
+def fit_stand_in_model(directory):
+    """Fit a RandomForest + StandardScaler on random flow features."""
+    import joblib
+    import numpy as np
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    from ids.flow_table import N_FEATURES
+
+    rng = np.random.default_rng(0)
+    X = rng.gamma(2.0, 50.0, size=(20000, N_FEATURES))
+    y = (X[:, 7] > X[:, 8]).astype(int)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=50, max_depth=12, random_state=0)
+    model.fit(scaler.transform(X), y)
+    model_path = os.path.join(directory, 'model.pkl')
+    scaler_path = os.path.join(directory, 'scaler.pkl')
+    joblib.dump(model, model_path)
+    joblib.dump(scaler, scaler_path)
+    return model_path, scaler_path
+
+
+def run_worker(pcap, model_path, scaler_path):
+    """Replay one file in this process and print the measurements as JSON."""
+    import numpy as np
+    from ids import ids as ids_live
+
+    ids_live.setup_logging()
+    ids_live.load_model(model_path, scaler_path)
+    latencies = []
+    t0 = time.perf_counter()
+    stats = ids_live.replay_pcap(pcap, on_verdict=lambda *verdict: None, latencies=latencies)
+    elapsed = time.perf_counter() - t0
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0.0, 0.0, 0.0)
+    stats.update({
+        'elapsed': elapsed,
+        'pkts_per_s': stats['packets'] / elapsed,
+        'flows_per_s': stats['flows'] / elapsed,
+        'batches': len(latencies),
+        'lat_p50_ms': p50 * 1000,
+        'lat_p95_ms': p95 * 1000,
+        'lat_p99_ms': p99 * 1000,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+    print(json.dumps(stats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                        help="comma-separated packet counts of the synthetic pcaps")
+    parser.add_argument('--model', help="trained model (default: fit a stand-in)")
+    parser.add_argument('--scaler', help="fitted scaler (default: fit a stand-in)")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.model, args.scaler)
+        return
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.model and args.scaler:
+            model_path, scaler_path = args.model, args.scaler
+        else:
+            model_path, scaler_path = fit_stand_in_model(tmp)
+
+        print("Flow IDS replay benchmark")
+        print(f"{'packets':>10} {'flows':>9} {'pkts/s':>10} {'flows/s':>9} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MB':>8}")
+        print("-" * 78)
+        for n in sizes:
+            pcap = os.path.join(tmp, f'synthetic_{n}.pcap')
+            write_synthetic_pcap(pcap, n)
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', pcap,
+                                  '--model', model_path, '--scaler', scaler_path],
+                                 capture_output=True, text=True, check=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__)))
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{r['packets']:>10,} {r['flows']:>9,} {r['pkts_per_s']:>10,.0f} "
+                  f"{r['flows_per_s']:>9,.0f} {r['lat_p50_ms']:>8.2f} {r['lat_p95_ms']:>8.2f} "
+                  f"{r['lat_p99_ms']:>8.2f} {r['peak_rss_mb']:>8.1f}")
+            os.remove(pcap)
+
+
+if __name__ == "__main__":
+    main()
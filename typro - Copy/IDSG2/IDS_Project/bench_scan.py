@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Port scan benchmark against a local listener fixture on 127.0.0.1: a block
+of consecutive ports where --open ports listen, --filtered ports drop SYNs
+(a listen(0) socket whose accept queue is already full) and the remaining
+--closed ports refuse connections.
+
+Compares the old blocking scan (one connect at a time, 0.5 s timeout) with
+scanner.engine.PortScanner at several concurrency limits, checks every
+verdict against the fixture, and times cancellation of a running scan.
+
+Usage:
+ $ python3 bench_scan.py [--open 2000] [--closed 2000] [--filtered 50]
+                         [--concurrency 100,500,1000] [--base-port 20000] [--skip-blocking]
+"""
+import argparse
+import asyncio
+import socket
+import threading
+import time
+
+from scanner.engine import PortScanner
+
+
+def blocking_scan(target, ports):
+    """The scan loop /scan used before scanner.engine."""
+    results = []
+    for port in ports:
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.settimeout(0.5)
+        try:
+            s.connect((target, port))
+            results.append({'port': port, 'status': 'open'})
+        except (socket.timeout, ConnectionRefusedError):
+            results.append({'port': port, 'status': 'closed'})
+        except Exception as e:
+            results.append({'port': port, 'status': f'error: {str(e)}'})
+        finally:
+            s.close()
+    return results
+
+
+class Fixture:
+    """Listening, SYN-dropping and closed ports in [base, base + open + filtered + closed)."""
+
+    def __init__(self, base, n_open, n_filtered, n_closed):
+        self.sockets = []
+        self.expected = {}
+        port = base
+        for kind, count in (('open', n_open), ('filtered', n_filtered)):
+            made = 0
+            while made < count:
+                s = socket.socket()
+                try:
+                    s.bind(('127.0.0.1', port))
+                except OSError:
+                    s.close()       # port in use by something else: leave it out
+                    port += 1
+                    continue
+                if kind == 'open':
+                    s.listen(128)
+                else:
+                    s.listen(0)
+                    filler = socket.socket()
+                    filler.connect(('127.0.0.1', port))   # fills the queue; later SYNs are dropped
+                    self.sockets.append(filler)
+                self.sockets.append(s)
+                self.expected[port] = kind
+                made += 1
+                port += 1
+        for port in range(port, port + n_closed):
+            self.expected[port] = 'closed'
+        self.ports = sorted(self.expected)
+
+    def mismatches(self, results, filtered_as='filtered'):
+        wrong = 0
+        for r in results:
+            want = self.expected[r['port']]
+            if want == 'filtered':
+                want = filtered_as
+            wrong += r['status'] != want
+        return wrong
+
+    def close(self):
+        for s in self.sockets:
+            s.close()
+
+
+def summarize(results):
+    counts = {}
+    for r in results:
+        counts[r['status']] = counts.get(r['status'], 0) + 1
+    return counts
+
+
+def run_engine(fixture, concurrency):
+    scanner = PortScanner(concurrency=concurrency)
+    t0 = time.perf_counter()
+    results = asyncio.run(scanner.scan('127.0.0.1', fixture.ports))
+    return results, time.perf_counter() - t0
+
+
+def time_cancel(fixture, concurrency, after):
+    """Cancel a scan of only filtered ports from another thread after `after` seconds."""
+    filtered = [p for p in fixture.ports if fixture.expected[p] == 'filtered'] * 20
+    scanner = PortScanner(concurrency=concurrency, initial_timeout=3.0)
+    timer = threading.Timer(after, scanner.cancel)
+    t0 = time.perf_counter()
+    timer.start()
+    results = asyncio.run(scanner.scan('127.0.0.1', filtered))
+    return len(results), len(filtered), time.perf_counter() - t0 - after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--open', type=int, default=2000)
+    parser.add_argument('--closed', type=int, default=2000)
+    parser.add_argument('--filtered', type=int, default=50)
+    parser.add_argument('--concurrency', default='100,500,1000')
+    parser.add_argument('--base-port', type=int, default=20000)
+    parser.add_argument('--skip-blocking', action='store_true',
+                        help="skip the old blocking scan (it waits 0.5 s per filtered port)")
+    args = parser.parse_args()
+
+    fixture = Fixture(args.base_port, args.open, args.filtered, args.closed)
+    n = len(fixture.ports)
+    print(f"fixture: {n} ports from {fixture.ports[0]} ({args.open} open, {args.filtered} filtered, "
+          f"{args.closed} closed)\n")
+    print(f"{'scan':<24}{'seconds':>10}{'ports/s':>10}  {'mismatches':>10}  verdicts")
+    try:
+        if not args.skip_blocking:
+            t0 = time.perf_counter()
+            results = blocking_scan('127.0.0.1', fixture.ports)
+            elapsed = time.perf_counter() - t0
+            # the old scan calls timeouts "closed"
+            print(f"{'blocking (old /scan)':<24}{elapsed:>10.2f}{n / elapsed:>10.0f}  "
+                  f"{fixture.mismatches(results, 'closed'):>10}  {summarize(results)}")
+        for concurrency in [int(c) for c in args.concurrency.split(',')]:
+            results, elapsed = run_engine(fixture, concurrency)
+            print(f"{f'asyncio x{concurrency}':<24}{elapsed:>10.2f}{n / elapsed:>10.0f}  "
+                  f"{fixture.mismatches(results):>10}  {summarize(results)}")
+        if args.filtered:
+            done, total, latency = time_cancel(fixture, 100, 0.5)
+            print(f"\ncancel after 0.5s: {done} of {total} filtered probes reported, "
+                  f"scan returned {latency * 1000:.1f} ms after cancel()")
+    finally:
+        fixture.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,113 +1,217 @@
-from flask import Blueprint, render_template, request, jsonify, redirect
+from flask import Blueprint, Response, render_template, request, jsonify, redirect
 from flask_login import login_required, current_user
-from database.db import db, IDSAlert, User
+from database import alerts as alert_store
+from database.alerts import BUCKETS as ALERT_BUCKETS
+from database.db import db, User
+from dashboard.snapshot import SnapshotCache
+from dashboard.stream import TooManyClients, broadcaster
+from dashboard.telemetry import collector as telemetry
 from datetime import datetime, timedelta
-import random
+from sqlalchemy import func, select
 import json
+import re
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
+MAX_ALERT_BUCKETS = 10080     # a week of minutes
+CHART_DAYS = 7
+THREAT_TYPE_COLORS = ['#dc3545', '#fd7e14', '#ffc107', '#28a745', '#17a2b8', '#6f42c1']
+_WINDOW_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+
+def parse_window(value):
+    """timedelta for '90m', '24h' or '7d'; raises ValueError."""
+    match = re.fullmatch(r'\s*(\d+)\s*([mhd])\s*', value or '')
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"invalid window {value!r}, use e.g. 90m, 24h or 7d")
+    return timedelta(**{_WINDOW_UNITS[match.group(2)]: int(match.group(1))})
+
+def alert_counts():
+    """(total alerts, high severity alerts, users) in one round trip, the alert counts from the daily rollup."""
+    users = select(func.count(User.id)).scalar_subquery()
+    query = select(alert_store.severity_totals_query(), alert_store.severity_totals_query('high'), users)
+    return tuple(db.session.execute(query).one())
+
+def recent_alerts(limit=10):
+    return alert_store.recent_alerts(db.session.connection(), limit)
+
+def alert_buckets(window, bucket):
+    """
+    {bucket label: {'total': n, 'high': n, 'medium': n, 'low': n}} for the
+    alerts of the last `window` (a timedelta). Hour and day buckets are read
+    from the rollups (see database/alerts.py), so their first bucket is
+    counted whole.
+    """
+    rows = alert_store.bucket_counts(db.session.connection(), datetime.now() - window, bucket)
+
+    buckets = {}
+    for key, level, count in rows:
+        counts = buckets.get(key)
+        if counts is None:
+            counts = buckets[key] = {'total': 0, 'high': 0, 'medium': 0, 'low': 0}
+        counts['total'] += count
+        counts[level] = counts.get(level, 0) + count
+    return buckets
+
 @dashboard_bp.route('/dashboard')
 @login_required
 def dashboard_home():
     if not hasattr(current_user, 'role') or current_user.role != 'admin':
         return redirect('/')
     
-    # Get dashboard statistics
-    total_alerts = db.session.query(IDSAlert).count()
-    high_priority_alerts = db.session.query(IDSAlert).filter(IDSAlert.severity == 'high').count()
-    active_users = db.session.query(User).count()
-    
-    # Get recent alerts (last 10)
-    recent_alerts = db.session.query(IDSAlert).order_by(IDSAlert.timestamp.desc()).limit(10).all()
-    
-    # Generate sample data for charts
-    chart_data = generate_chart_data()
+    # Counts, recent alerts and alert charts, rebuilt when alerts change (see build_snapshot)
+    snapshot = dashboard_cache.get()
+    chart_data = dict(snapshot['chart_data'], system_performance=system_performance_chart())
     
     return render_template('dashboard_enhanced.html', 
-                         total_alerts=total_alerts,
-                         high_priority_alerts=high_priority_alerts,
-                         active_users=active_users,
-                         recent_alerts=recent_alerts,
+                         total_alerts=snapshot['total_alerts'],
+                         high_priority_alerts=snapshot['high_priority_alerts'],
+                         active_users=snapshot['active_users'],
+                         recent_alerts=snapshot['recent_alerts'],
                          chart_data=chart_data)
 
+@dashboard_bp.route('/api/dashboard/cache')
+@login_required
+def get_cache_stats():
+    """Hit/miss counters of the dashboard snapshot cache."""
+    if not hasattr(current_user, 'role') or current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(dashboard_cache.stats())
+
 @dashboard_bp.route('/api/dashboard/realtime')
 @login_required
 def get_realtime_data():
-    """API endpoint for real-time dashboard updates"""
+    """
+    API endpoint for real-time dashboard updates: the newest telemetry
+    sample (dashboard/telemetry.py). ?window=10m[&points=60] adds the
+    samples of that window averaged into at most `points` buckets.
+    """
     if not hasattr(current_user, 'role') or current_user.role != 'admin':
         return jsonify({'error': 'Unauthorized'}), 403
-    
-    # Simulate real-time data
-    data = {
-        'timestamp': datetime.now().isoformat(),
-        'cpu_usage': random.randint(20, 80),
-        'memory_usage': random.randint(30, 70),
-        'network_traffic': random.randint(100, 1000),
-        'active_connections': random.randint(50, 200),
-        'threat_level': random.choice(['low', 'medium', 'high']),
-        'new_alerts': random.randint(0, 5)
-    }
+
+    data = telemetry.latest()
+    if data is None:
+        return jsonify({'error': 'Telemetry is not being collected'}), 503
+    if 'window' in request.args:
+        try:
+            window = parse_window(request.args['window'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        points = request.args.get('points', 60, type=int)
+        data = dict(data, series=telemetry.series(window.total_seconds(), points))
     return jsonify(data)
 
+@dashboard_bp.route('/api/dashboard/stream')
+@login_required
+def event_stream():
+    """
+    Server-Sent Events: 'telemetry' (changed fields of the realtime sample),
+    'alerts' (newly stored alerts) and 'reset' (reload the page) events,
+    see dashboard/stream.py. Resumes after the Last-Event-ID header or
+    ?last_event_id.
+    """
+    if not hasattr(current_user, 'role') or current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    try:
+        events = broadcaster.stream(last_event_id)
+    except TooManyClients as e:
+        return jsonify({'error': str(e)}), 503
+    # no stream_with_context: the generator must not hold the request's database session
+    return Response(events, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @dashboard_bp.route('/api/dashboard/alerts')
 @login_required
 def get_alert_data():
-    """API endpoint for alert statistics"""
+    """
+    API endpoint for alert statistics: alert counts per time bucket and
+    severity. ?window=7d (m/h/d units) and ?bucket=day (minute, hour, day).
+    """
     if not hasattr(current_user, 'role') or current_user.role != 'admin':
         return jsonify({'error': 'Unauthorized'}), 403
-    
-    # Get alerts from last 7 days
-    week_ago = datetime.now() - timedelta(days=7)
-    alerts = db.session.query(IDSAlert).filter(IDSAlert.timestamp >= week_ago).all()
-    
-    # Group by day
-    daily_alerts = {}
-    for alert in alerts:
-        day = alert.timestamp.strftime('%Y-%m-%d')
-        if day not in daily_alerts:
-            daily_alerts[day] = {'total': 0, 'high': 0, 'medium': 0, 'low': 0}
-        daily_alerts[day]['total'] += 1
-        daily_alerts[day][alert.severity] += 1
-    
-    return jsonify(daily_alerts)
+
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in ALERT_BUCKETS:
+        return jsonify({'error': f"bucket must be one of {', '.join(ALERT_BUCKETS)}"}), 400
+    try:
+        window = parse_window(request.args.get('window', '7d'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if window / ALERT_BUCKETS[bucket][2] > MAX_ALERT_BUCKETS:
+        return jsonify({'error': f"more than {MAX_ALERT_BUCKETS} buckets, use a larger bucket"}), 400
+
+    return jsonify(alert_buckets(window, bucket))
 
 def generate_chart_data():
-    """Generate sample data for dashboard charts"""
-    # Security metrics over time
-    labels = [(datetime.now() - timedelta(days=i)).strftime('%m/%d') for i in range(6, -1, -1)]
-    
+    """Alert charts of the last CHART_DAYS days, from the rollups."""
+    since = datetime.now() - timedelta(days=CHART_DAYS - 1)
+    days = alert_buckets(timedelta(days=CHART_DAYS - 1), 'day')
+    labels, totals, high = [], [], []
+    for i in range(CHART_DAYS - 1, -1, -1):
+        day = datetime.now() - timedelta(days=i)
+        counts = days.get(day.strftime(ALERT_BUCKETS['day'][0]), {})
+        labels.append(day.strftime('%m/%d'))
+        totals.append(counts.get('total', 0))
+        high.append(counts.get('high', 0))
+    types = alert_store.alert_type_counts(db.session.connection(), since, limit=len(THREAT_TYPE_COLORS))
+
     return {
         'security_overview': {
             'labels': labels,
             'datasets': [
                 {
                     'label': 'Threats Detected',
-                    'data': [random.randint(5, 25) for _ in range(7)],
+                    'data': totals,
                     'borderColor': '#dc3545',
                     'backgroundColor': 'rgba(220, 53, 69, 0.1)',
                     'tension': 0.4
                 },
                 {
-                    'label': 'Blocked Attempts',
-                    'data': [random.randint(15, 40) for _ in range(7)],
-                    'borderColor': '#28a745',
-                    'backgroundColor': 'rgba(40, 167, 69, 0.1)',
+                    'label': 'High Severity',
+                    'data': high,
+                    'borderColor': '#fd7e14',
+                    'backgroundColor': 'rgba(253, 126, 20, 0.1)',
                     'tension': 0.4
                 }
             ]
         },
         'threat_types': {
-            'labels': ['Malware', 'Phishing', 'DDoS', 'Brute Force', 'SQL Injection', 'XSS'],
-            'data': [random.randint(5, 30) for _ in range(6)],
-            'backgroundColor': [
-                '#dc3545', '#fd7e14', '#ffc107', 
-                '#28a745', '#17a2b8', '#6f42c1'
-            ]
-        },
-        'system_performance': {
-            'labels': ['CPU', 'Memory', 'Disk', 'Network'],
-            'data': [random.randint(20, 80) for _ in range(4)],
-            'backgroundColor': ['#007bff', '#28a745', '#ffc107', '#dc3545']
+            'labels': [alert_type for alert_type, _ in types],
+            'datasets': [{
+                'data': [count for _, count in types],
+                'backgroundColor': THREAT_TYPE_COLORS[:len(types)]
+            }]
         }
     }
+
+def system_performance_chart():
+    """Bar chart of the newest telemetry sample (not cached: it changes every second)."""
+    system = telemetry.latest() or {}
+    return {
+        'labels': ['CPU', 'Memory', 'Disk', 'Network'],
+        'datasets': [{
+            'data': [system.get(name) or 0 for name in
+                     ('cpu_usage', 'memory_usage', 'disk_usage', 'network_usage')],
+            'backgroundColor': ['#007bff', '#28a745', '#ffc107', '#dc3545']
+        }]
+    }
+
+def build_snapshot():
+    """The dashboard page's database aggregates (cached by dashboard_cache)."""
+    total_alerts, high_priority_alerts, active_users = alert_counts()
+    return {
+        'total_alerts': total_alerts,
+        'high_priority_alerts': high_priority_alerts,
+        'active_users': active_users,
+        'recent_alerts': recent_alerts(10),
+        'chart_data': generate_chart_data(),
+    }
+
+# rebuilt after local alert writes and when the sampled alert total moves (live IDS)
+dashboard_cache = SnapshotCache(build_snapshot, version=lambda: (telemetry.latest() or {}).get('total_alerts'))
+alert_store.on_change(dashboard_cache.invalidate)
@@ -0,0 +1,74 @@
+# dashboard/snapshot.py
+"""
+Cache of the dashboard page's database aggregates.
+
+A SnapshotCache keeps the value of build() (counts, recent alerts, chart
+data) for at most `ttl` seconds and hands the same object to every
+request in between. It is rebuilt earlier when
+
+  - alerts were stored or deleted in this process (invalidate() is a
+    database.alerts on_change() listener, called after the commit), or
+  - version() changed: the dashboard passes the alert total of the newest
+    telemetry sample, which also sees alerts written by the live IDS in
+    its own process, at most one sampling interval late.
+
+Only one request rebuilds at a time; the others wait for it and share the
+result. stats() reports hits, misses and invalidations.
+"""
+import threading
+import time
+
+SNAPSHOT_TTL = 60.0   # seconds; also bounds how stale the user count and day labels get
+
+
+class SnapshotCache:
+    def __init__(self, build, version=lambda: None, ttl=SNAPSHOT_TTL):
+        self.build = build
+        self.version = version
+        self.ttl = ttl
+        self._value = None
+        self._built_at = 0.0
+        self._built_version = None
+        self._built_generation = -1
+        self._generation = 0                   # bumped by invalidate()
+        self._lock = threading.Lock()          # counters and entry
+        self._build_lock = threading.Lock()    # one rebuild at a time
+        self.hits = self.misses = self.invalidations = 0
+
+    def _fresh(self, version):
+        return self._built_generation == self._generation and version == self._built_version and \
+            time.monotonic() - self._built_at < self.ttl
+
+    def get(self):
+        version = self.version()
+        with self._lock:
+            if self._fresh(version):
+                self.hits += 1
+                return self._value
+        with self._build_lock:
+            with self._lock:
+                if self._fresh(version):   # built by the request we waited for
+                    self.hits += 1
+                    return self._value
+                self.misses += 1
+                generation = self._generation   # an invalidate() during the build makes it stale
+            value = self.build()
+            with self._lock:
+                self._value = value
+                self._built_at = time.monotonic()
+                self._built_version = version
+                self._built_generation = generation
+            return value
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations,
+                    'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                    'age': round(time.monotonic() - self._built_at, 1) if self._value is not None else None,
+                    'ttl': self.ttl}
@@ -0,0 +1,187 @@
+# dashboard/stream.py
+"""
+Server-Sent Events for the dashboard: new alerts and telemetry changes
+pushed to every open dashboard from one broadcaster thread.
+
+Once per POLL_INTERVAL the broadcaster compares the newest telemetry
+sample (dashboard/telemetry.py) with the last one it sent and publishes
+the fields that changed as a 'telemetry' event; when the stored alert
+count moved, it reads the alerts added since the last one it saw
+(database.alerts.alerts_after, any writer process) and publishes them as
+one 'alerts' event. So the database is read once per new batch of alerts,
+however many dashboards are connected.
+
+Each event is encoded once and the same bytes are put in every client's
+queue. A queue holds at most CLIENT_BUFFER events: a client that falls
+that far behind is disconnected rather than buffered without bound; its
+EventSource reconnects with Last-Event-ID and gets what it missed from
+the last EVENT_HISTORY events, or a 'reset' event (reload everything) if
+they are gone. Event ids continue from the start time in milliseconds,
+so ids from before a restart are older than any new event.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+from dashboard.telemetry import collector
+from database import alerts as alert_store
+
+POLL_INTERVAL = 1.0     # seconds between telemetry / alert checks
+EVENT_HISTORY = 1000    # events kept for Last-Event-ID resumption
+CLIENT_BUFFER = 256     # events queued per client before it is dropped
+MAX_CLIENTS = 1000
+KEEPALIVE = 15.0        # seconds of silence before a comment line is sent
+ALERT_BATCH = 200       # alerts per 'alerts' event at most
+RETRY_MS = 3000         # reconnection delay advised to EventSource
+
+
+class TooManyClients(Exception):
+    """Raised by Broadcaster.subscribe when MAX_CLIENTS streams are open."""
+
+
+def format_event(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+def alert_event_data(alert):
+    return {'id': alert.id, 'timestamp': alert.timestamp.isoformat(), 'source_ip': alert.source_ip,
+            'destination_ip': alert.destination_ip, 'protocol': alert.protocol,
+            'alert_type': alert.alert_type, 'severity': alert.severity, 'description': alert.description}
+
+
+class Client:
+    def __init__(self):
+        self.queue = queue.Queue(CLIENT_BUFFER)
+        self.dropped = False
+
+
+class Broadcaster:
+    def __init__(self, telemetry, interval=POLL_INTERVAL, history=EVENT_HISTORY, max_clients=MAX_CLIENTS):
+        self.telemetry = telemetry
+        self.interval = interval
+        self.max_clients = max_clients
+        self._history = deque(maxlen=history)   # (event id, encoded event)
+        self._next_id = int(time.time() * 1000)
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._engine = None
+        self._thread = None
+        self._sent = {}
+        self._alert_total = None
+        self._last_alert_id = None
+        self.dropped_clients = 0
+
+    def start(self, engine):
+        """Watch engine's alerts and the telemetry collector in a daemon thread."""
+        self._engine = engine
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='dashboard-stream', daemon=True)
+            self._thread.start()
+        return self
+
+    def publish(self, event, data):
+        """Send an event to every client; returns its id."""
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            chunk = format_event(event_id, event, data)
+            self._history.append((event_id, chunk))
+            dropped = []
+            for client in self._clients:
+                try:
+                    client.queue.put_nowait(chunk)
+                except queue.Full:
+                    client.dropped = True
+                    dropped.append(client)
+            self._clients.difference_update(dropped)
+            self.dropped_clients += len(dropped)
+        return event_id
+
+    def subscribe(self, last_event_id=None):
+        """
+        (client, events to send first): the current telemetry, or with
+        last_event_id the events after it, or a 'reset' event if some were
+        already forgotten.
+        Raises TooManyClients.
+        """
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                raise TooManyClients(f"{len(self._clients)} dashboard streams open")
+            client = Client()
+            self._clients.add(client)
+            replay = []
+            if last_event_id is None and self._sent:
+                # telemetry events only carry changes: start from the full sample
+                replay.append(format_event(self._next_id - 1, 'telemetry', self._sent))
+            elif last_event_id is not None and last_event_id < self._next_id - 1:
+                oldest = self._history[0][0] if self._history else self._next_id
+                if last_event_id < oldest - 1:
+                    replay.append(format_event(self._next_id - 1, 'reset', {}))
+                else:
+                    replay.extend(chunk for event_id, chunk in self._history if event_id > last_event_id)
+        return client, replay
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def stream(self, last_event_id=None):
+        """The event stream of one new client (bytes chunks), to return as the response. Raises TooManyClients."""
+        client, replay = self.subscribe(last_event_id)
+
+        def events():
+            try:
+                yield f"retry: {RETRY_MS}\n\n".encode()
+                yield from replay
+                while not client.dropped:
+                    try:
+                        yield client.queue.get(timeout=KEEPALIVE)
+                    except queue.Empty:
+                        yield b": keepalive\n\n"   # also finds out that the browser went away
+            finally:
+                self.unsubscribe(client)
+        return events()
+
+    def stats(self):
+        with self._lock:
+            return {'clients': len(self._clients), 'dropped_clients': self.dropped_clients,
+                    'last_event_id': self._next_id - 1}
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                logging.exception("Dashboard stream failed")
+            time.sleep(self.interval)
+
+    def poll(self):
+        """Publish the telemetry fields that changed and the alerts stored since the last poll."""
+        latest = self.telemetry.latest()
+        if latest is None:
+            return
+        changed = {k: v for k, v in latest.items() if self._sent.get(k) != v}
+        if len(changed) > 1:   # more than the timestamp
+            self._sent = latest
+            self.publish('telemetry', changed)
+
+        total = latest.get('total_alerts')
+        if self._engine is None or total == self._alert_total:
+            return
+        with self._engine.connect() as conn:
+            if self._last_alert_id is None:
+                self._last_alert_id = alert_store.last_alert_id(conn)
+                found = []
+            else:
+                found = alert_store.alerts_after(conn, self._last_alert_id, ALERT_BATCH)
+        if len(found) < ALERT_BATCH:
+            self._alert_total = total   # otherwise read the next batch on the next poll
+        if found:
+            self._last_alert_id = found[-1].id
+            self.publish('alerts', [alert_event_data(a) for a in found])
+
+
+broadcaster = Broadcaster(collector)
@@ -0,0 +1,249 @@
+# dashboard/telemetry.py
+"""
+System telemetry for the dashboard, sampled in the background.
+
+A TelemetryCollector thread reads /proc/stat (CPU), /proc/meminfo
+(memory), /proc/net/dev (traffic), the disk holding the database, the live
+IDS status (ids/live_status.py: open flows) and the alert rollups every
+SAMPLE_INTERVAL seconds into a ring buffer of HISTORY samples. Requests
+only read from memory: latest() is a dict built once per sample and
+series() is computed once per sample and (window, points), so any number
+of dashboard tabs polling /api/dashboard/realtime cost neither system
+calls nor database queries.
+
+Values that cannot be read (no /proc outside Linux, live IDS not running)
+are None.
+"""
+import logging
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select
+
+from database import alerts as alert_store
+from ids import live_status
+
+SAMPLE_INTERVAL = 1.0     # seconds between samples
+HISTORY = 3600            # samples kept (an hour at SAMPLE_INTERVAL)
+ALERT_WINDOW = 60.0       # seconds of alerts counted as new_alerts / threat_level
+MAX_SERIES_POINTS = 600
+
+SAMPLE_DTYPE = np.dtype([
+    ('time', 'f8'),                 # epoch seconds
+    ('cpu_usage', 'f8'),            # percent busy since the previous sample
+    ('memory_usage', 'f8'),         # percent of MemTotal not available
+    ('disk_usage', 'f8'),           # percent of the database's file system used
+    ('network_traffic', 'f8'),      # kB/s received + sent, loopback excluded
+    ('network_usage', 'f8'),        # percent of the links' speed
+    ('active_connections', 'f8'),   # open flows in the live IDS flow table
+    ('alerts', 'f8'),               # stored alerts (rollup total)
+    ('high_alerts', 'f8'),
+])
+SERIES_FIELDS = ('cpu_usage', 'memory_usage', 'disk_usage', 'network_traffic', 'network_usage',
+                 'active_connections')
+
+
+def read_cpu_times(path='/proc/stat'):
+    """(busy, total) jiffies of all CPUs."""
+    with open(path) as f:
+        values = [int(v) for v in f.readline().split()[1:9]]
+    idle = values[3] + values[4]   # idle + iowait
+    return sum(values) - idle, sum(values)
+
+
+def read_memory_usage(path='/proc/meminfo'):
+    info = {}
+    with open(path) as f:
+        for line in f:
+            name, value = line.split(':', 1)
+            info[name] = int(value.split()[0])
+            if 'MemTotal' in info and 'MemAvailable' in info:
+                break
+    return 100.0 * (info['MemTotal'] - info['MemAvailable']) / info['MemTotal']
+
+
+def read_network_bytes(path='/proc/net/dev'):
+    """{interface: bytes received + sent}, loopback excluded."""
+    counters = {}
+    with open(path) as f:
+        for line in f.readlines()[2:]:
+            name, data = line.split(':', 1)
+            name = name.strip()
+            if name != 'lo':
+                fields = data.split()
+                counters[name] = int(fields[0]) + int(fields[8])
+    return counters
+
+
+def read_link_speed(interfaces):
+    """Summed speed in bit/s of the interfaces that report one (Ethernet), or 0."""
+    total = 0
+    for name in interfaces:
+        try:
+            with open(f'/sys/class/net/{name}/speed') as f:
+                speed = int(f.read())
+        except (OSError, ValueError):   # virtual or down interfaces
+            continue
+        if speed > 0:
+            total += speed * 1000000
+    return total
+
+
+def _value(x, digits=1):
+    return None if np.isnan(x) else round(float(x), digits or None)
+
+
+class TelemetryCollector:
+    def __init__(self, interval=SAMPLE_INTERVAL, history=HISTORY, disk_path='.'):
+        self.interval = interval
+        self.disk_path = disk_path
+        self._samples = np.full(history, np.nan, dtype=SAMPLE_DTYPE)
+        self._count = 0             # samples taken; the newest is at (count - 1) % history
+        self._lock = threading.Lock()
+        self._latest = None
+        self._series_cache = {}
+        self._previous_cpu = self._previous_net = None
+        self._alert_counter = None
+        self._thread = None
+        self._failed = set()
+
+    def start(self, engine=None):
+        """Sample now and every interval seconds in a daemon thread; engine: alert counts to sample."""
+        if engine is not None:
+            totals = select(alert_store.severity_totals_query(), alert_store.severity_totals_query('high'))
+
+            def count_alerts():
+                with engine.connect() as conn:
+                    return tuple(conn.execute(totals).one())
+            self._alert_counter = count_alerts
+        if self._thread is None:
+            self.sample()
+            self._thread = threading.Thread(target=self._run, name='dashboard-telemetry', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sample()
+            except Exception:
+                logging.exception("Telemetry sampling failed")
+
+    def _read(self, name, func, *args):
+        """func(*args), or None (logged once per source) if it fails."""
+        try:
+            return func(*args)
+        except Exception as e:
+            if name not in self._failed:
+                self._failed.add(name)
+                logging.warning("Telemetry: cannot read %s: %s", name, e)
+            return None
+
+    def sample(self):
+        """Take one sample and append it to the ring buffer."""
+        now = time.time()
+        row = np.full(1, np.nan, dtype=SAMPLE_DTYPE)[0]
+        row['time'] = now
+
+        cpu = self._read('CPU times', read_cpu_times)
+        if cpu is not None and self._previous_cpu is not None and cpu[1] > self._previous_cpu[1]:
+            row['cpu_usage'] = 100.0 * (cpu[0] - self._previous_cpu[0]) / (cpu[1] - self._previous_cpu[1])
+        self._previous_cpu = cpu
+
+        memory = self._read('memory usage', read_memory_usage)
+        if memory is not None:
+            row['memory_usage'] = memory
+        disk = self._read('disk usage', shutil.disk_usage, self.disk_path)
+        if disk is not None:
+            row['disk_usage'] = 100.0 * disk.used / disk.total
+
+        net = self._read('network counters', read_network_bytes)
+        if net is not None and self._previous_net is not None:
+            then, before = self._previous_net
+            sent = sum(n - before[name] for name, n in net.items() if name in before and n >= before[name])
+            rate = sent / (now - then)
+            row['network_traffic'] = rate / 1000
+            speed = read_link_speed(net)
+            if speed:
+                row['network_usage'] = min(100.0, 100.0 * rate * 8 / speed)
+        if net is not None:
+            self._previous_net = now, net
+
+        status = live_status.read_status()
+        if status is not None:
+            row['active_connections'] = status.get('open_flows', np.nan)
+        if self._alert_counter is not None:
+            counts = self._read('alert counts', self._alert_counter)
+            if counts is not None:
+                row['alerts'], row['high_alerts'] = counts
+
+        with self._lock:
+            self._samples[self._count % len(self._samples)] = row
+            self._count += 1
+            self._latest = self._summarize(row)
+            self._series_cache = {}
+
+    def _sample_ago(self, seconds):
+        """The newest sample at least `seconds` old (or the oldest kept); call with the lock held."""
+        back = min(self._count, len(self._samples)) - 1
+        back = min(back, max(1, int(round(seconds / self.interval))))
+        return self._samples[(self._count - 1 - back) % len(self._samples)]
+
+    def _summarize(self, row):
+        before = self._sample_ago(ALERT_WINDOW)
+        new_alerts = max(0.0, row['alerts'] - before['alerts'])
+        new_high = max(0.0, row['high_alerts'] - before['high_alerts'])
+        threat_level = None
+        if not np.isnan(new_alerts):
+            threat_level = 'high' if new_high > 0 else 'medium' if new_alerts > 0 else 'low'
+        return {
+            'timestamp': datetime.fromtimestamp(row['time']).isoformat(),
+            'cpu_usage': _value(row['cpu_usage']),
+            'memory_usage': _value(row['memory_usage']),
+            'disk_usage': _value(row['disk_usage']),
+            'network_traffic': _value(row['network_traffic']),
+            'network_usage': _value(row['network_usage']),
+            'active_connections': _value(row['active_connections'], 0),
+            'ids_running': not np.isnan(row['active_connections']),
+            'threat_level': threat_level,
+            'new_alerts': _value(new_alerts, 0),
+            'total_alerts': _value(row['alerts'], 0),
+            'high_alerts': _value(row['high_alerts'], 0),
+        }
+
+    def latest(self):
+        """The newest sample as a JSON-ready dict, or None before the first one."""
+        return self._latest
+
+    def series(self, seconds, points=60):
+        """
+        The samples of the last `seconds` averaged into at most `points`
+        buckets, oldest first: {'timestamp': [...], field: [...]} for the
+        SERIES_FIELDS; buckets without a value are None.
+        """
+        points = max(1, min(points, MAX_SERIES_POINTS))
+        with self._lock:
+            n = min(self._count, len(self._samples), max(1, int(seconds / self.interval)))
+            key = n, points
+            cached = self._series_cache.get(key)
+            if cached is not None:
+                return cached
+            window = self._samples[np.arange(self._count - n, self._count) % len(self._samples)]
+            starts = np.arange(0, n, max(1, -(-n // points)))   # ceil(n / points) samples per bucket
+            series = {'timestamp': [datetime.fromtimestamp(t).isoformat(timespec='seconds')
+                                    for t in window['time'][starts]]}
+            for field in SERIES_FIELDS:
+                values = window[field]
+                known = ~np.isnan(values)
+                sums = np.add.reduceat(np.where(known, values, 0.0), starts) if n else values
+                counts = np.add.reduceat(known.astype(np.int64), starts) if n else values
+                series[field] = [round(float(s / c), 1) if c else None for s, c in zip(sums, counts)]
+            self._series_cache[key] = series
+            return series
+
+
+collector = TelemetryCollector()
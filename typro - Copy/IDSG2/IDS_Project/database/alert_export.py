@@ -0,0 +1,110 @@
+# database/alert_export.py
+"""
+Streaming export of stored alerts.
+
+export_chunks() reads the alerts (of one user) newest first through
+database.alerts.iter_alert_batches, EXPORT_BATCH rows at a time, and
+yields the encoded bytes batch by batch: memory stays at one batch
+however many alerts are exported. Formats (FORMATS):
+
+    ndjson   one JSON record per line
+    csv      a header row, then one row per alert
+    json     one JSON array of records
+
+With compress=True the bytes are gzip-compressed as they are produced.
+Flask routes return the chunks as the response body; the export opens
+its own connection, so the request's session is not held while the
+client downloads.
+"""
+import csv
+import io
+import json
+import zlib
+
+from database import alerts as alert_store
+
+EXPORT_BATCH = 1000
+GZIP_LEVEL = 6
+
+# record key: alert column (the keys of the original /ids/export download)
+EXPORT_FIELDS = {
+    'id': 'id',
+    'timestamp': 'timestamp',
+    'src_ip': 'source_ip',
+    'dst_ip': 'destination_ip',
+    'protocol': 'protocol',
+    'prediction': 'alert_type',
+    'severity': 'severity',
+    'description': 'description',
+}
+
+# format: (mimetype, file extension)
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'json': ('application/json', 'json'),
+}
+
+
+def alert_record(row):
+    record = {key: getattr(row, column) for key, column in EXPORT_FIELDS.items()}
+    record['timestamp'] = row.timestamp.isoformat()
+    return record
+
+
+def _ndjson_chunks(batches):
+    for rows in batches:
+        yield ''.join(json.dumps(alert_record(r)) + '\n' for r in rows).encode()
+
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for rows in batches:
+        writer.writerows([alert_record(r).values() for r in rows])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():   # nothing exported: just the header
+        yield buffer.getvalue().encode()
+
+
+def _json_chunks(batches):
+    separator = '['
+    for rows in batches:
+        if rows:
+            yield (separator + ','.join(json.dumps(alert_record(r)) for r in rows)).encode()
+            separator = ','
+    yield b'[]' if separator == '[' else b']'
+
+
+_ENCODERS = {'ndjson': _ndjson_chunks, 'csv': _csv_chunks, 'json': _json_chunks}
+
+
+def gzip_chunks(chunks, level=GZIP_LEVEL):
+    """chunks compressed into one gzip stream, chunk by chunk."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)   # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(engine, fmt, user_id=None, compress=False, batch_size=EXPORT_BATCH):
+    """
+    The alerts (of one user) encoded as fmt (a FORMATS key), as a generator
+    of bytes. The connection is opened on the first chunk and closed when
+    the generator finishes or is closed. Raises ValueError for an unknown
+    format.
+    """
+    if fmt not in _ENCODERS:
+        raise ValueError(f"unknown export format {fmt!r}, use one of {', '.join(FORMATS)}")
+
+    def batches():
+        with engine.connect() as conn:
+            yield from alert_store.iter_alert_batches(conn, user_id, batch_size)
+
+    chunks = _ENCODERS[fmt](batches())
+    return gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,545 @@
+# database/alerts.py
+"""
+Time-partitioned alert storage.
+
+Alerts are stored in one table per day, ids_alert_YYYYMMDD (local time),
+created on first use with the alert columns and indexes of alert_table().
+Each day numbers its alerts from first_alert_id(day), so ids stay unique
+across partitions and newer days have larger ids.
+Writers call insert_alerts(), which also counts each alert in three
+rollup tables in the same transaction:
+
+    ids_alert_hourly       (hour 'YYYY-MM-DD HH:00', severity, alerts)
+    ids_alert_daily        (day 'YYYY-MM-DD', severity, alerts)
+    ids_alert_type_daily   (day 'YYYY-MM-DD', alert_type, alerts)
+
+so the dashboard's totals, hour/day buckets and alert type chart read a
+few rollup rows per hour or day instead of the alerts themselves, however
+many there are. Functions passed to on_change() (the dashboard's snapshot
+cache) are called by notify_changed(), which writers in this process call
+once the transaction that stored or deleted alerts has committed, so a
+listener never reads data other connections cannot see yet.
+
+Retention drops whole days: drop_partitions_before() issues one DROP TABLE
+per expired day plus a small rollup DELETE, never a DELETE over millions of
+alert rows, and start_retention() runs it periodically when
+IDS_ALERT_RETENTION_DAYS is set (ALERT_RETENTION_DAYS in
+database/config.py; off by default). Readers skip a partition dropped
+after they listed it (execute_partition()). To prune or repair a database
+file by hand:
+
+ $ python3 -m database.alerts [--keep-days 30] [--rebuild-rollups] [instance/ids_project.db]
+
+Only SQLAlchemy Core is used, so the live IDS (ids/alert_sink.py) writes
+through the same code without Flask. Functions take a Connection and run
+in its transaction; Flask code passes db.session.connection() and commits
+the session.
+"""
+import argparse
+import ipaddress
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import (BigInteger, Column, DateTime, Index, Integer, LargeBinary, MetaData, String, Table,
+                        Text, create_engine, delete, func, insert, inspect, select, text, tuple_)
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.types import VARBINARY, TypeDecorator
+
+from database.config import ALERT_RETENTION_DAYS, RETENTION_INTERVAL, configure_engine
+
+PARTITION_PREFIX = 'ids_alert_'
+
+# Bucket sizes: strftime format (SQLite and Python), DATE_FORMAT format (MySQL), length
+BUCKETS = {
+    'minute': ('%Y-%m-%d %H:%M', '%Y-%m-%d %H:%i', timedelta(minutes=1)),
+    'hour': ('%Y-%m-%d %H:00', '%Y-%m-%d %H:00', timedelta(hours=1)),
+    'day': ('%Y-%m-%d', '%Y-%m-%d', timedelta(days=1)),
+}
+
+_PARTITION_NAME = re.compile(r'^ids_alert_(\d{8})$')
+
+metadata = MetaData()
+
+
+class IPAddress(TypeDecorator):
+    """IPv4/IPv6 address stored packed (4 or 16 bytes); a string like '10.0.0.1' in Python."""
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'mysql':
+            return dialect.type_descriptor(VARBINARY(16))
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def process_bind_param(self, value, dialect):
+        # also takes uint32 IPv4 addresses (ids.flow_table keys)
+        return None if value is None else ipaddress.ip_address(value).packed
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else str(ipaddress.ip_address(bytes(value)))
+
+
+def first_alert_id(day):
+    """Alert ids of a day count up from here: unique across partitions and ordered by day."""
+    return day.toordinal() << 32
+
+
+def alert_table(name, metadata=metadata, first_id=None):
+    """
+    A table of alerts. Severities are lowercase so that severity filters
+    can use the indexes; index names start with the table's name. New ids
+    continue from first_id (AUTOINCREMENT, see create_partition()).
+    """
+    options = {}
+    if first_id is not None:
+        options = {'sqlite_autoincrement': True, 'mysql_auto_increment': str(first_id)}
+    table = Table(
+        name, metadata,
+        Column('id', Integer().with_variant(BigInteger(), 'mysql'), primary_key=True),
+        Column('timestamp', DateTime, nullable=False),
+        Column('source_ip', IPAddress, nullable=False),
+        Column('destination_ip', IPAddress, nullable=False),
+        Column('protocol', String(10), nullable=False),
+        Column('alert_type', String(50), nullable=False),
+        Column('severity', String(10), nullable=False),
+        Column('description', Text),
+        Column('user_id', Integer, nullable=False),   # user.id
+        **options,
+    )
+    Index(f'ix_{name}_timestamp_severity', table.c.timestamp, table.c.severity)  # recent alerts, time windows
+    Index(f'ix_{name}_severity_timestamp', table.c.severity, table.c.timestamp)  # counts per severity
+    Index(f'ix_{name}_user_timestamp', table.c.user_id, table.c.timestamp)       # a user's alerts
+    return table
+
+
+hourly_rollup = Table(
+    'ids_alert_hourly', metadata,
+    Column('hour', String(16), primary_key=True),
+    Column('severity', String(10), primary_key=True),
+    Column('alerts', Integer, nullable=False),
+)
+
+daily_rollup = Table(
+    'ids_alert_daily', metadata,
+    Column('day', String(10), primary_key=True),
+    Column('severity', String(10), primary_key=True),
+    Column('alerts', Integer, nullable=False),
+)
+
+type_rollup = Table(
+    'ids_alert_type_daily', metadata,
+    Column('day', String(10), primary_key=True),
+    Column('alert_type', String(50), primary_key=True),
+    Column('alerts', Integer, nullable=False),
+)
+
+# (rollup, bucket of its time column, counted column)
+_ROLLUPS = ((hourly_rollup, 'hour', 'severity'), (daily_rollup, 'day', 'severity'),
+            (type_rollup, 'day', 'alert_type'))
+ROLLUP_TABLES = [rollup for rollup, _, _ in _ROLLUPS]
+
+_partitions = {}       # day -> Table
+_created = set()       # (database url, day) of partitions known to exist
+_lock = threading.Lock()
+_listeners = []
+
+
+def create_rollup_tables(bind):
+    metadata.create_all(bind, tables=ROLLUP_TABLES)
+
+
+def partition_name(day):
+    return f'{PARTITION_PREFIX}{day:%Y%m%d}'
+
+
+def partition(day):
+    """The Table holding the alerts of one day (it may not exist in the database)."""
+    with _lock:
+        table = _partitions.get(day)
+        if table is None:
+            table = _partitions[day] = alert_table(partition_name(day), first_id=first_alert_id(day))
+        return table
+
+
+def partition_days(conn):
+    """Days that have a partition in conn's database, oldest first."""
+    days = []
+    for name in inspect(conn).get_table_names():
+        match = _PARTITION_NAME.match(name)
+        if match:
+            days.append(datetime.strptime(match.group(1), '%Y%m%d').date())
+    return sorted(days)
+
+
+def execute_partition(conn, day, statement):
+    """
+    conn.execute(statement) on the partition of day, or None if that
+    partition no longer exists (dropped by retention after the caller
+    listed the partitions).
+    """
+    try:
+        return conn.execute(statement)
+    except (OperationalError, ProgrammingError):
+        if inspect(conn).has_table(partition_name(day)):
+            raise
+        return None
+
+
+def create_partition(conn, day, indexes=True):
+    """Create the partition of day if it does not exist yet; indexes=False leaves them to the caller (SQLite)."""
+    table = partition(day)
+    if conn.dialect.name == 'sqlite':
+        # IF NOT EXISTS: the live IDS and the app may create the same day at once
+        conn.execute(CreateTable(table, if_not_exists=True))
+        # start the AUTOINCREMENT sequence at first_alert_id(), unless rows were added already
+        conn.execute(text('INSERT INTO sqlite_sequence (name, seq) SELECT :name, :seq WHERE NOT EXISTS '
+                          '(SELECT 1 FROM sqlite_sequence WHERE name = :name)'),
+                     {'name': table.name, 'seq': first_alert_id(day)})
+        if indexes:
+            create_partition_indexes(conn, day)
+    else:
+        table.create(conn, checkfirst=True)
+    return table
+
+
+def create_partition_indexes(conn, day):
+    if conn.dialect.name == 'sqlite':
+        for index in partition(day).indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _partition_for_insert(conn, day):
+    key = (str(conn.engine.url), day)
+    if key not in _created:
+        create_partition(conn, day)
+        with _lock:
+            _created.add(key)
+    return partition(day)
+
+
+def bucket_label(column, bucket, dialect_name):
+    """SQL expression formatting a timestamp column as its bucket label."""
+    sqlite_format, mysql_format, _ = BUCKETS[bucket]
+    if dialect_name == 'mysql':
+        return func.date_format(column, mysql_format)
+    return func.strftime(sqlite_format, column)
+
+
+def insert_alerts(conn, rows):
+    """
+    Store alerts, dicts with the alert_table() columns except id (timestamp
+    a datetime), in their day partitions and count them in the rollups.
+    Severities are lowercased. Returns the number of alerts stored; call
+    notify_changed() once they are committed.
+    """
+    hour_format, day_format = BUCKETS['hour'][0], BUCKETS['day'][0]
+    by_day = {}
+    hours, days, types = Counter(), Counter(), Counter()
+    for row in rows:
+        severity = row['severity']
+        if not severity.islower():
+            severity = severity.lower()
+            row = dict(row, severity=severity)
+        ts = row['timestamp']
+        by_day.setdefault(ts.date(), []).append(row)
+        day = ts.strftime(day_format)
+        hours[ts.strftime(hour_format), severity] += 1
+        days[day, severity] += 1
+        types[day, row['alert_type']] += 1
+    for day, day_rows in by_day.items():
+        conn.execute(insert(_partition_for_insert(conn, day)), day_rows)
+    for (rollup, key, column), counts in zip(_ROLLUPS, (hours, days, types)):
+        _add_to_rollup(conn, rollup, key, column, counts)
+    return sum(len(day_rows) for day_rows in by_day.values())
+
+
+def on_change(listener):
+    """Call listener() from notify_changed(); returns listener."""
+    _listeners.append(listener)
+    return listener
+
+
+def notify_changed():
+    """Tell the on_change() listeners that alerts changed; call it after committing the change."""
+    for listener in _listeners:
+        listener()
+
+
+def _add_to_rollup(conn, rollup, key, column, counts):
+    if not counts:
+        return
+    values = [{key: label, column: value, 'alerts': n} for (label, value), n in counts.items()]
+    if conn.dialect.name == 'mysql':
+        stmt = mysql.insert(rollup)
+        stmt = stmt.on_duplicate_key_update(alerts=rollup.c.alerts + stmt.inserted.alerts)
+    else:
+        stmt = sqlite.insert(rollup)
+        stmt = stmt.on_conflict_do_update(index_elements=[key, column],
+                                          set_={'alerts': rollup.c.alerts + stmt.excluded.alerts})
+    conn.execute(stmt, values)
+
+
+def _day_range(day):
+    """(first hour label, first hour label of the next day) of day."""
+    return f'{day:%Y-%m-%d} 00:00', f'{day + timedelta(days=1):%Y-%m-%d} 00:00'
+
+
+def rebuild_rollups(conn, day):
+    """Recount the rollup rows of day from its partition (after alerts were deleted, or by hand)."""
+    first, end = _day_range(day)
+    conn.execute(delete(hourly_rollup).where(hourly_rollup.c.hour >= first, hourly_rollup.c.hour < end))
+    for rollup in (daily_rollup, type_rollup):
+        conn.execute(delete(rollup).where(rollup.c.day == f'{day:%Y-%m-%d}'))
+    table = partition(day)
+    for rollup, key, column in _ROLLUPS:
+        label = bucket_label(table.c.timestamp, key, conn.dialect.name)
+        execute_partition(conn, day, insert(rollup).from_select(
+            [key, column, 'alerts'],
+            select(label, table.c[column], func.count()).group_by(label, table.c[column])))
+
+
+def recent_alerts(conn, limit=10, user_id=None):
+    """The newest `limit` alerts (of one user), newest first, reading partitions from today backwards."""
+    found = []
+    for day in reversed(partition_days(conn)):
+        table = partition(day)
+        query = select(table).order_by(table.c.timestamp.desc()).limit(limit - len(found))
+        if user_id is not None:
+            query = query.where(table.c.user_id == user_id)
+        result = execute_partition(conn, day, query)
+        if result is not None:
+            found.extend(result.all())
+        if len(found) >= limit:
+            break
+    return found
+
+
+def last_alert_id(conn):
+    """The highest alert id stored, 0 if none."""
+    highest = 0
+    for day in reversed(partition_days(conn)):
+        result = execute_partition(conn, day, select(func.max(partition(day).c.id)))
+        newest = (result.scalar() if result is not None else None) or 0
+        if newest >= first_alert_id(day):
+            # numbered by day (first_alert_id): older partitions only have lower ids
+            return max(highest, newest)
+        highest = max(highest, newest)   # ids of a migrated ids_alert table are in any order
+    return highest
+
+
+def alerts_after(conn, alert_id, limit=1000):
+    """At most `limit` alerts with an id above alert_id, lowest id first."""
+    found = []
+    since = date.fromordinal(max(1, alert_id >> 32))   # older days have lower ids
+    for day in partition_days(conn):
+        if day < since:
+            continue
+        table = partition(day)
+        result = execute_partition(conn, day, select(table).where(table.c.id > alert_id)
+                                   .order_by(table.c.id).limit(limit - len(found)))
+        if result is not None:
+            found.extend(result.all())
+        if len(found) >= limit:
+            break
+    return found
+
+
+def iter_alert_batches(conn, user_id=None, batch_size=1000):
+    """
+    Every stored alert (of one user), newest first, in lists of at most
+    batch_size rows: one partition query at a time, fetched with yield_per
+    (a server-side cursor on MySQL).
+    """
+    for day in reversed(partition_days(conn)):
+        table = partition(day)
+        query = select(table).order_by(table.c.timestamp.desc(), table.c.id.desc())
+        if user_id is not None:
+            query = query.where(table.c.user_id == user_id)
+        result = execute_partition(conn, day, query.execution_options(yield_per=batch_size))
+        if result is not None:
+            yield from result.partitions()
+
+
+def iter_alerts(conn, user_id=None):
+    """Every stored alert (of one user), newest first."""
+    for rows in iter_alert_batches(conn, user_id):
+        yield from rows
+
+
+def alert_page(conn, user_id=None, after=None, limit=50):
+    """
+    One page of alerts (of one user) in (timestamp, id) descending order:
+    (rows, cursor of the next page or None). after is the previous page's
+    cursor, a (timestamp, id) pair; the page starts right after it without
+    reading the alerts before it (keyset pagination).
+    """
+    rows = []
+    for day in reversed(partition_days(conn)):
+        if after is not None and day > after[0].date():
+            continue
+        table = partition(day)
+        query = (select(table).order_by(table.c.timestamp.desc(), table.c.id.desc())
+                 .limit(limit + 1 - len(rows)))
+        if user_id is not None:
+            query = query.where(table.c.user_id == user_id)
+        if after is not None and day == after[0].date():
+            query = query.where(tuple_(table.c.timestamp, table.c.id) < tuple_(*after))
+        result = execute_partition(conn, day, query)
+        if result is not None:
+            rows.extend(result.all())
+        if len(rows) > limit:
+            break
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1].timestamp, rows[-1].id)
+
+
+def severity_totals_query(severity=None):
+    """Scalar subquery counting the stored alerts (of one severity) from the daily rollup."""
+    query = select(func.coalesce(func.sum(daily_rollup.c.alerts), 0))
+    if severity is not None:
+        query = query.where(daily_rollup.c.severity == severity)
+    return query.scalar_subquery()
+
+
+def count_alerts(conn, user_id=None, severity=None):
+    """Number of stored alerts, from the rollups unless they are counted for one user."""
+    if user_id is None:
+        return conn.execute(select(severity_totals_query(severity))).scalar()
+    total = 0
+    for day in partition_days(conn):
+        table = partition(day)
+        query = select(func.count()).select_from(table).where(table.c.user_id == user_id)
+        if severity is not None:
+            query = query.where(table.c.severity == severity)
+        result = execute_partition(conn, day, query)
+        total += result.scalar() if result is not None else 0
+    return total
+
+
+def bucket_counts(conn, since, bucket, user_id=None):
+    """
+    (label, severity, alerts) rows, ordered by label, for the buckets from
+    the one containing `since` onwards. Hour and day buckets come from the
+    rollups and count their whole first bucket; minute buckets, and any
+    bucket of one user's alerts (the rollups count all users), are counted
+    from the partitions with one GROUP BY per day, from `since` exactly.
+    """
+    if bucket != 'minute' and user_id is None:
+        rollup, key = (hourly_rollup, 'hour') if bucket == 'hour' else (daily_rollup, 'day')
+        column = rollup.c[key]
+        return conn.execute(select(column, rollup.c.severity, rollup.c.alerts)
+                            .where(column >= since.strftime(BUCKETS[bucket][0]))
+                            .order_by(column)).all()
+    rows = []
+    for day in partition_days(conn):
+        if day < since.date():
+            continue
+        table = partition(day)
+        label = bucket_label(table.c.timestamp, bucket, conn.dialect.name)
+        query = (select(label, table.c.severity, func.count())
+                 .where(table.c.timestamp >= since)
+                 .group_by(label, table.c.severity)
+                 .order_by(label))
+        if user_id is not None:
+            query = query.where(table.c.user_id == user_id)
+        result = execute_partition(conn, day, query)
+        if result is not None:
+            rows.extend(result.all())
+    return rows
+
+
+def alert_type_counts(conn, since, limit=None):
+    """(alert type, alerts) since the day of `since`, most frequent first, from the type rollup."""
+    total = func.sum(type_rollup.c.alerts).label('alerts')
+    query = (select(type_rollup.c.alert_type, total)
+             .where(type_rollup.c.day >= since.strftime(BUCKETS['day'][0]))
+             .group_by(type_rollup.c.alert_type).order_by(total.desc()))
+    if limit is not None:
+        query = query.limit(limit)
+    return conn.execute(query).all()
+
+
+def delete_user_alerts(conn, user_id):
+    """Delete every alert of one user and recount the rollups of the days concerned; returns the number deleted."""
+    deleted = 0
+    for day in partition_days(conn):
+        table = partition(day)
+        result = execute_partition(conn, day, delete(table).where(table.c.user_id == user_id))
+        count = result.rowcount if result is not None else 0
+        if count:
+            rebuild_rollups(conn, day)
+            deleted += count
+    return deleted
+
+
+def drop_partitions_before(conn, day):
+    """Drop the partitions of the days before `day` and their rollup rows; returns the days dropped."""
+    dropped = [d for d in partition_days(conn) if d < day]
+    for d in dropped:
+        partition(d).drop(conn, checkfirst=True)   # several app processes may prune at once
+    conn.execute(delete(hourly_rollup).where(hourly_rollup.c.hour < _day_range(day)[0]))
+    for rollup in (daily_rollup, type_rollup):
+        conn.execute(delete(rollup).where(rollup.c.day < f'{day:%Y-%m-%d}'))
+    with _lock:
+        _created.difference_update((str(conn.engine.url), d) for d in dropped)
+    return dropped
+
+
+def enforce_retention(engine, keep_days=ALERT_RETENTION_DAYS):
+    """Drop the days older than keep_days days (today is kept with the keep_days before it)."""
+    with engine.begin() as conn:
+        dropped = drop_partitions_before(conn, date.today() - timedelta(days=keep_days))
+    if dropped:
+        notify_changed()
+    return dropped
+
+
+def start_retention(engine, keep_days=ALERT_RETENTION_DAYS, interval=RETENTION_INTERVAL):
+    """Enforce the retention period now and every `interval` seconds in a daemon thread; 0 keeps all."""
+    if not keep_days:
+        return None
+
+    def run():
+        while True:
+            try:
+                dropped = enforce_retention(engine, keep_days)
+                if dropped:
+                    logging.info("Alert retention: dropped %d day partitions up to %s", len(dropped), dropped[-1])
+            except Exception:
+                logging.exception("Alert retention failed")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='ids-alert-retention', daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prune or recount the alert partitions of a database file.")
+    parser.add_argument('path', nargs='?', default='instance/ids_project.db')
+    parser.add_argument('--keep-days', type=int, help="drop partitions older than this many days")
+    parser.add_argument('--rebuild-rollups', action='store_true', help="recount the rollups of every day")
+    args = parser.parse_args()
+    engine = configure_engine(create_engine(f'sqlite:///{args.path}'))
+    create_rollup_tables(engine)
+    if args.keep_days is not None:
+        dropped = enforce_retention(engine, args.keep_days)
+        print(f"dropped {len(dropped)} partitions" + (f" ({dropped[0]} to {dropped[-1]})" if dropped else ""))
+    if args.rebuild_rollups:
+        with engine.begin() as conn:
+            days = partition_days(conn)
+            for day in days:
+                rebuild_rollups(conn, day)
+        print(f"recounted the rollups of {len(days)} days")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+# database/columnar.py
+"""
+Columnar files of the stored alerts (and of the live IDS's classified
+flows, ids/flow_export.py) for offline analysis.
+
+A dataset is a directory of day partitions, one file per batch:
+
+    <out>/alerts/day=2025-09-18/part-<first alert id>.parquet
+    <out>/flows/day=2025-09-18/part-<first flow time>-<n>.parquet
+
+Files are Parquet when pyarrow is installed, Arrow IPC (.arrow) when its
+Parquet support is missing, else NumPy .npz; read_file() and
+read_dataset() load any of them as {column: array}.
+
+export_alerts() reads each alert partition (database/alerts.py) in
+batches of batch_size rows in id order and writes every batch as one
+file. The dataset's _watermark.json keeps the last exported id of each
+partition and is updated after every file, so the next run (a nightly
+job) reads only the alerts stored since, and an interrupted run resumes
+where it stopped; a batch exported again after a crash gets the same file
+name. Per-partition watermarks also cover alerts migrated from the old
+single table, whose ids are small and not ordered by day.
+
+ $ python3 -m database.columnar [--full] [--batch-size 100000] [--format npz] out_dir [instance/ids_project.db]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+from datetime import date, datetime
+
+import numpy as np
+from sqlalchemy import create_engine, select
+
+from database import alerts as alert_store
+from database.config import configure_engine
+
+try:
+    import pyarrow as pa
+    from pyarrow import ipc
+except ImportError:   # optional: .npz files without it
+    pa = ipc = None
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow', 'npz': '.npz'}
+DEFAULT_FORMAT = 'parquet' if pq is not None else 'arrow' if pa is not None else 'npz'
+EXPORT_BATCH = 100000    # alerts per file
+WATERMARK_FILE = '_watermark.json'
+
+_PARTITION_DIR = re.compile(r'^day=(\d{4}-\d{2}-\d{2})$')
+
+
+def write_file(path, columns, fmt=DEFAULT_FORMAT):
+    """
+    Write columns ({name: 1-d array}, equal lengths) to path plus the
+    format's extension, atomically. Returns the file's path. Raises
+    ValueError for a format that needs the missing pyarrow.
+    """
+    if fmt == 'parquet' and pq is None or fmt == 'arrow' and pa is None:
+        raise ValueError(f"{fmt} files need pyarrow; use {DEFAULT_FORMAT}")
+    path += EXTENSIONS[fmt]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if fmt == 'npz':
+        with open(tmp, 'wb') as f:   # a file object: savez would add .npz to the name
+            np.savez_compressed(f, **columns)
+    else:
+        table = pa.table({name: pa.array(values) for name, values in columns.items()})
+        if fmt == 'parquet':
+            pq.write_table(table, tmp)
+        else:
+            with pa.OSFile(tmp, 'wb') as sink, ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    os.replace(tmp, path)
+    return path
+
+
+def read_file(path):
+    """{column: array} of one file written by write_file()."""
+    if path.endswith('.npz'):
+        with np.load(path) as f:
+            return {name: f[name] for name in f.files}
+    if pa is None:
+        raise ValueError(f"{path}: reading {os.path.splitext(path)[1]} files needs pyarrow")
+    if path.endswith('.parquet'):
+        table = pq.read_table(path)
+    else:
+        with pa.memory_map(path) as source:
+            table = ipc.open_file(source).read_all()
+    return {name: table.column(name).to_numpy() for name in table.column_names}
+
+
+def dataset_files(dataset, since=None):
+    """The files of a dataset directory as (day, path), oldest day first; since: first day to include."""
+    files = []
+    for entry in sorted(os.listdir(dataset)) if os.path.isdir(dataset) else ():
+        match = _PARTITION_DIR.match(entry)
+        if match is None:
+            continue
+        day = date.fromisoformat(match.group(1))
+        if since is not None and day < since:
+            continue
+        for name in sorted(os.listdir(os.path.join(dataset, entry))):
+            if name.endswith(tuple(EXTENSIONS.values())):
+                files.append((day, os.path.join(dataset, entry, name)))
+    return files
+
+
+def read_dataset(dataset, since=None):
+    """All files of a dataset (from day `since` on) concatenated as {column: array}; {} if there are none."""
+    parts = [read_file(path) for _, path in dataset_files(dataset, since)]
+    if not parts:
+        return {}
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def load_watermark(dataset):
+    """{partition name: last exported alert id} of a dataset; {} before its first export."""
+    try:
+        with open(os.path.join(dataset, WATERMARK_FILE)) as f:
+            return json.load(f)['partitions']
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def save_watermark(dataset, partitions):
+    path = os.path.join(dataset, WATERMARK_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump({'partitions': partitions, 'updated': datetime.now().isoformat()}, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def alert_columns(rows):
+    """Alert rows as columns: timestamps datetime64[us], addresses and text as strings."""
+    ids, timestamps, sources, destinations, protocols, types, severities, descriptions, users = zip(*rows)
+    return {
+        'id': np.array(ids, np.int64),
+        'timestamp': np.array(timestamps, 'datetime64[us]'),
+        'source_ip': np.array(sources, str),
+        'destination_ip': np.array(destinations, str),
+        'protocol': np.array(protocols, str),
+        'alert_type': np.array(types, str),
+        'severity': np.array(severities, str),
+        'description': np.array([d or '' for d in descriptions], str),
+        'user_id': np.array(users, np.int32),
+    }
+
+
+def export_alerts(engine, directory, fmt=DEFAULT_FORMAT, batch_size=EXPORT_BATCH, full=False):
+    """
+    Write the alerts stored since the last export to <directory>/alerts;
+    full=True deletes the dataset and exports every alert again.
+    Returns {'alerts': rows written, 'files': files written}.
+    """
+    dataset = os.path.join(directory, 'alerts')
+    if full and os.path.isdir(dataset):
+        shutil.rmtree(dataset)
+    os.makedirs(dataset, exist_ok=True)
+    watermark = load_watermark(dataset)
+    written = {'alerts': 0, 'files': 0}
+    with engine.connect() as conn:
+        days = alert_store.partition_days(conn)
+        for day in days:
+            name = alert_store.partition_name(day)
+            table = alert_store.partition(day)
+            query = select(table).order_by(table.c.id)
+            if name in watermark:
+                query = query.where(table.c.id > watermark[name])
+            result = alert_store.execute_partition(conn, day, query.execution_options(yield_per=batch_size))
+            for rows in result.partitions() if result is not None else ():
+                write_file(os.path.join(dataset, f"day={day.isoformat()}", f"part-{rows[0].id:020d}"),
+                           alert_columns(rows), fmt)
+                watermark[name] = rows[-1].id
+                save_watermark(dataset, watermark)
+                written['alerts'] += len(rows)
+                written['files'] += 1
+    # partitions dropped by retention since the last run
+    kept = {alert_store.partition_name(day) for day in days}
+    save_watermark(dataset, {name: last for name, last in watermark.items() if name in kept})
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the alerts stored since the last run to columnar files.")
+    parser.add_argument('directory')
+    parser.add_argument('path', nargs='?', default='instance/ids_project.db')
+    parser.add_argument('--format', choices=EXTENSIONS, default=DEFAULT_FORMAT)
+    parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH, help="alerts per file")
+    parser.add_argument('--full', action='store_true', help="delete the exported alerts and export all again")
+    args = parser.parse_args()
+    engine = configure_engine(create_engine(f'sqlite:///{args.path}'))
+    written = export_alerts(engine, args.directory, args.format, args.batch_size, args.full)
+    print(f"exported {written['alerts']} alerts to {written['files']} {args.format} files "
+          f"in {os.path.join(args.directory, 'alerts')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,23 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from database.config import configure_engine, database_uri, engine_options
 from datetime import datetime
 
 db = SQLAlchemy()
 
-def db_init(app):
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///ids_project.db'
+def db_init(app, uri=None):
+    """
+    Bind db to app: uri, else app.config's SQLALCHEMY_DATABASE_URI, else
+    IDS_DATABASE_URI (see database/config.py), with a sized connection pool
+    and, on SQLite, WAL and the other SQLITE_PRAGMAS.
+    """
+    uri = uri or app.config.get('SQLALCHEMY_DATABASE_URI') or database_uri()
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(uri))
     db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine)
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -23,16 +33,83 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
-class IDSAlert(db.Model):
+# IDS alerts are stored in day partitions, see database/alerts.py
+
+class AnalysisJob(db.Model):
+    """Background analysis of an uploaded capture (see ids/jobs.py)."""
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False, default='pcap')
+    filename = db.Column(db.String(256))
+    status = db.Column(db.String(10), nullable=False, default='queued')  # queued/running/done/failed
+    progress = db.Column(db.Float, nullable=False, default=0.0)          # 0.0 - 1.0
+    flows = db.Column(db.Integer, nullable=False, default=0)
+    alerts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'filename': self.filename,
+            'status': self.status,
+            'progress': round(self.progress, 4),
+            'flows': self.flows,
+            'alerts': self.alerts,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+class ScanRun(db.Model):
+    """One /scan request or sweep; its per-port results are ScanResult rows (see scanner/store.py)."""
     id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, nullable=False)
-    source_ip = db.Column(db.String(15), nullable=False)
-    destination_ip = db.Column(db.String(15), nullable=False)
-    protocol = db.Column(db.String(10), nullable=False)
-    alert_type = db.Column(db.String(50), nullable=False)
-    severity = db.Column(db.String(10), nullable=False)
-    description = db.Column(db.Text)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    sweep_id = db.Column(db.String(32), unique=True)         # set for sweeps (scanner/sweep.py)
+    targets = db.Column(db.String(512), nullable=False)
+    ports = db.Column(db.String(512), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='running')  # running/done/stopped/failed
+    probes = db.Column(db.Integer, nullable=False, default=0)
+    open_ports = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_scan_run_targets_created', 'targets', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sweep_id': self.sweep_id,
+            'targets': self.targets,
+            'ports': self.ports,
+            'status': self.status,
+            'probes': self.probes,
+            'open_ports': self.open_ports,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def summary(self):
+        return (f"{self.created_at:%Y-%m-%d %H:%M} {self.targets} ports {self.ports}: "
+                f"{self.open_ports} open / {self.probes} probed ({self.status})")
+
+class ScanResult(db.Model):
+    """Status of one port of one host in one ScanRun."""
+    run_id = db.Column(db.Integer, db.ForeignKey('scan_run.id'), primary_key=True)
+    host = db.Column(db.String(255), primary_key=True)
+    port = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(128), nullable=False)   # open/closed/filtered/error: ...
+
+    __table_args__ = (
+        db.Index('ix_scan_result_run_status', 'run_id', 'status'),        # open ports of a run (diffs)
+        db.Index('ix_scan_result_host_port', 'host', 'port', 'run_id'),  # history of one port
+    )
 
 def get_db():
     return db
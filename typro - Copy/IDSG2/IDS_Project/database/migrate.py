@@ -0,0 +1,162 @@
+# database/migrate.py
+"""
+Schema upgrades for databases created by older versions of the app.
+
+db.create_all() only creates missing tables, so databases from before the
+alert partitions (database/alerts.py) still have their alerts in a single
+ids_alert table, possibly with the older layout (addresses as text,
+mixed-case severities). upgrade_database() moves them, once:
+
+    ids_alert rows              -> the day partitions ids_alert_YYYYMMDD
+    source_ip, destination_ip   text -> packed 4/16 byte addresses (IPAddress)
+    severity                    lowercased ('High' -> 'high')
+    rollups                     counted from the moved alerts
+
+and then drops ids_alert. Partitioned databases from before the alert type
+rollup (ids_alert_type_daily) get it counted from their partitions.
+app.py runs it at startup; to migrate a database
+file by hand:
+
+ $ python3 -m database.migrate [instance/ids_project.db]
+
+On SQLite everything happens in one transaction: partitions are filled day
+by day through a timestamp index, their indexes are built over the copied
+rows, then the rollups are counted. MySQL first converts the address
+columns in place with ALTER TABLE and INET6_ATON(); as MySQL commits DDL
+implicitly, an interrupted run is simply run again (copies skip rows
+already moved). Addresses that do not parse are stored as 0.0.0.0.
+"""
+import ipaddress
+import logging
+import sys
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import MetaData, String, Table, create_engine, func, insert, inspect, select
+
+from database import alerts
+
+LEGACY_TABLE = 'ids_alert'
+IP_COLUMNS = ('source_ip', 'destination_ip')
+_UNKNOWN_IP = ipaddress.ip_address('0.0.0.0').packed
+
+
+def _text_ip_columns(engine):
+    """Names of the legacy address columns still stored as text."""
+    return [c['name'] for c in inspect(engine).get_columns(LEGACY_TABLE)
+            if c['name'] in IP_COLUMNS and isinstance(c['type'], String)]
+
+
+def _convert_mysql(engine):
+    unknown = "INET6_ATON('0.0.0.0')"
+    with engine.begin() as conn:
+        for column in IP_COLUMNS:
+            conn.exec_driver_sql(f'ALTER TABLE {LEGACY_TABLE} MODIFY {column} VARBINARY(16) NOT NULL')
+        conn.exec_driver_sql(
+            f'UPDATE {LEGACY_TABLE} SET source_ip = COALESCE(INET6_ATON(source_ip), {unknown}), '
+            f'destination_ip = COALESCE(INET6_ATON(destination_ip), {unknown}), '
+            f'severity = LOWER(severity)')
+
+
+def _move_alerts(conn, legacy, pack):
+    """Copy the legacy alerts into their partitions; returns (alerts, days)."""
+    c = legacy.c
+    source, destination = (func.pack_ip(c.source_ip), func.pack_ip(c.destination_ip)) if pack \
+        else (c.source_ip, c.destination_ip)
+    columns = [c.id, c.timestamp, source, destination, c.protocol, c.alert_type,
+               func.lower(c.severity), c.description, c.user_id]
+    if conn.dialect.name == 'sqlite':
+        # day ranges below need it; goes away with the table
+        conn.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS ix_{LEGACY_TABLE}_migrate ON {LEGACY_TABLE} (timestamp)')
+    days = sorted(d if isinstance(d, date) else date.fromisoformat(d)
+                  for (d,) in conn.execute(select(func.date(c.timestamp)).distinct()))
+    moved = 0
+    for day in days:
+        table = alerts.create_partition(conn, day, indexes=False)
+        start = datetime.combine(day, datetime.min.time())
+        moved += conn.execute(
+            insert(table).prefix_with('IGNORE', dialect='mysql').from_select(
+                [col.name for col in table.c],
+                select(*columns).where(c.timestamp >= start, c.timestamp < start + timedelta(days=1)))
+        ).rowcount
+    for day in days:
+        alerts.create_partition_indexes(conn, day)
+        alerts.rebuild_rollups(conn, day)
+    legacy.drop(conn)
+    return moved, len(days)
+
+
+def _partition_legacy_alerts(engine, pack):
+    """Move the ids_alert table into partitions (see module doc); returns (alerts, days, bad addresses)."""
+    legacy = Table(LEGACY_TABLE, MetaData(), autoload_with=engine)
+    bad = [0]
+
+    def pack_ip(value):
+        try:
+            return ipaddress.ip_address(value.strip()).packed
+        except (AttributeError, ValueError):
+            bad[0] += 1
+            return _UNKNOWN_IP
+
+    with engine.connect() as conn:
+        if engine.dialect.name != 'sqlite':
+            with conn.begin():
+                moved, days = _move_alerts(conn, legacy, pack)
+            return moved, days, bad[0]
+        # no implicit transactions: BEGIN/COMMIT below, DDL included
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        conn.connection.driver_connection.create_function('pack_ip', 1, pack_ip, deterministic=True)
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+        try:
+            moved, days = _move_alerts(conn, legacy, pack)
+            conn.exec_driver_sql('COMMIT')
+        except BaseException:
+            conn.exec_driver_sql('ROLLBACK')
+            raise
+    return moved, days, bad[0]
+
+
+def _count_type_rollup(engine):
+    """Fill an empty alert type rollup from the partitions; returns the days counted."""
+    with engine.begin() as conn:
+        if conn.execute(select(alerts.type_rollup).limit(1)).first() is not None or \
+                conn.execute(select(alerts.daily_rollup).limit(1)).first() is None:
+            return 0
+        days = alerts.partition_days(conn)
+        for day in days:
+            alerts.rebuild_rollups(conn, day)
+    return len(days)
+
+
+def upgrade_database(engine):
+    """Bring engine's database to the current alert storage; returns what was done."""
+    done = []
+    alerts.create_rollup_tables(engine)
+    if inspect(engine).has_table(LEGACY_TABLE):
+        pack = bool(_text_ip_columns(engine))
+        if pack and engine.dialect.name == 'mysql':
+            _convert_mysql(engine)
+            pack = False
+        elif pack and engine.dialect.name != 'sqlite':
+            raise RuntimeError(f"cannot convert {LEGACY_TABLE} addresses on {engine.dialect.name}")
+        moved, days, bad = _partition_legacy_alerts(engine, pack)
+        done.append(f"moved {moved} alerts from {LEGACY_TABLE} into {days} day partitions")
+        if bad:
+            done.append(f"{bad} unparsable addresses stored as 0.0.0.0")
+    else:
+        days = _count_type_rollup(engine)
+        if days:
+            done.append(f"counted {alerts.type_rollup.name} for {days} days")
+    for step in done:
+        logging.info("Database upgrade: %s", step)
+    return done
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else 'instance/ids_project.db'
+    engine = create_engine(f'sqlite:///{path}')
+    done = upgrade_database(engine)
+    print('\n'.join(done) if done else f"{path} is up to date")
+
+
+if __name__ == '__main__':
+    main()
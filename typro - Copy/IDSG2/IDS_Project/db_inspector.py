@@ -6,6 +6,10 @@ import sqlite3
 import os
 from datetime import datetime
 
+from sqlalchemy import create_engine
+
+from database import alerts as alert_store
+
 class DatabaseInspector:
     def __init__(self, db_path):
         self.db_path = db_path
@@ -102,24 +106,22 @@ class DatabaseInspector:
                 print("  No users found.")
     
     def check_alerts(self):
-        """Check IDS alerts"""
-        with self.connect() as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT COUNT(*) FROM ids_alert")
-            alert_count = cursor.fetchone()[0]
+        """Check IDS alerts (day partitions and rollups, database/alerts.py)"""
+        engine = create_engine(f'sqlite:///{self.db_path}')
+        with engine.connect() as conn:
+            alert_count = alert_store.count_alerts(conn)
+            days = alert_store.partition_days(conn)
             
-            print(f"\n🚨 IDS Alerts: {alert_count} total")
+            print(f"\n🚨 IDS Alerts: {alert_count} total in {len(days)} day partitions")
             
             if alert_count > 0:
-                cursor.execute("SELECT * FROM ids_alert ORDER BY timestamp DESC LIMIT 5")
-                alerts = cursor.fetchall()
-                
+                print(f"Days: {days[0]} to {days[-1]}")
                 print("Recent alerts:")
-                for alert in alerts:
-                    print(f"  • {alert[1]} | {alert[2]} → {alert[3]} | {alert[5]} ({alert[6]})")
+                for alert in alert_store.recent_alerts(conn, limit=5):
+                    print(f"  • {alert.timestamp} | {alert.source_ip} → {alert.destination_ip} | {alert.alert_type} ({alert.severity})")
             else:
                 print("  No alerts recorded.")
+        engine.dispose()
     
     def full_inspection(self):
         """Run complete database inspection"""
@@ -139,7 +141,7 @@ class DatabaseInspector:
             if 'user' in tables:
                 self.search_users()
             
-            if 'ids_alert' in tables:
+            if alert_store.daily_rollup.name in tables:
                 self.check_alerts()
                 
         except sqlite3.Error as e:
@@ -5,6 +5,8 @@ Interactive Database Query Tool for IDS Project
 import sqlite3
 import sys
 
+FETCH_BATCH = 1000
+
 def execute_query(db_path, query):
     """Execute a SQL query and display results"""
     try:
@@ -14,21 +16,26 @@ def execute_query(db_path, query):
         cursor.execute(query)
         
         if query.strip().lower().startswith('select'):
-            results = cursor.fetchall()
-            
             # Get column names
             columns = [description[0] for description in cursor.description]
             
-            if results:
-                # Print header
-                print("\n" + " | ".join(columns))
-                print("-" * (len(" | ".join(columns)) + 10))
-                
-                # Print results
+            # Print results as they are read, FETCH_BATCH rows at a time
+            # (bulk alert exports: python3 -m database.columnar)
+            count = 0
+            while True:
+                results = cursor.fetchmany(FETCH_BATCH)
+                if not results:
+                    break
+                if not count:
+                    # Print header
+                    print("\n" + " | ".join(columns))
+                    print("-" * (len(" | ".join(columns)) + 10))
                 for row in results:
                     print(" | ".join(str(item) for item in row))
-                
-                print(f"\n{len(results)} row(s) returned.")
+                count += len(results)
+            
+            if count:
+                print(f"\n{count} row(s) returned.")
             else:
                 print("No results found.")
         else:
@@ -50,7 +57,8 @@ def interactive_mode(db_path):
     print("Examples:")
     print("  SELECT * FROM user;")
     print("  SELECT username, role FROM user WHERE role = 'admin';")
-    print("  SELECT COUNT(*) FROM ids_alert;")
+    print("  SELECT day, SUM(alerts) FROM ids_alert_daily GROUP BY day;")
+    print("  SELECT * FROM ids_alert_20250918 ORDER BY timestamp DESC LIMIT 10;")
     print()
     
     while True:
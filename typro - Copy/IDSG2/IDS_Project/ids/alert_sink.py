@@ -0,0 +1,152 @@
+# ids/alert_sink.py
+"""
+Batched, non-blocking writer from the live IDS into the dashboard's alert
+partitions (database/alerts.py).
+
+submit() only appends to a bounded in-memory queue and never waits: if the
+writer thread falls behind (locked or slow database) the queue fills up and
+further alerts are counted in `dropped` instead of stalling packet capture or
+classification. The writer thread stores queued alerts with
+database.alerts.insert_alerts (executemany into the day's partition plus the
+rollup counts), one transaction per `batch_size` rows or per `flush_every`
+seconds, whichever comes first.
+
+SQLAlchemy Core is used without Flask: the IDS runs outside the Flask app
+and must not pull in flask_sqlalchemy. Its connection gets the app's SQLite
+settings (database/config.py; WAL keeps dashboard reads from blocking it).
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import alerts
+from database.config import configure_engine
+
+DEFAULT_DB_PATH = "instance/ids_project.db"
+
+PROTOCOL_NAMES = {1: 'ICMP', 6: 'TCP', 17: 'UDP'}
+
+_CLOSE = object()
+
+
+class AlertSink:
+    """
+    Queue alerts in memory and write them to SQLite from a background thread.
+
+    user_id: owner of the inserted alerts (user_id is NOT NULL);
+    None picks the first admin user in the database.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, user_id=None, batch_size=500,
+                 flush_every=1.0, max_queue=10000, busy_timeout=5.0):
+        self.db_path = db_path
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.flush_every = flush_every
+        self.busy_timeout = busy_timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self._reported_drops = 0
+        self._thread = None
+        self._engine = None
+
+    def start(self):
+        """Check the database and start the writer thread. Raises SQLAlchemyError or ValueError."""
+        engine = configure_engine(create_engine(f'sqlite:///{self.db_path}',
+                                                connect_args={'timeout': self.busy_timeout}),
+                                  self.busy_timeout)
+        try:
+            with engine.begin() as conn:
+                if self.user_id is None:
+                    row = conn.execute(
+                        text("SELECT id FROM user WHERE role = 'admin' ORDER BY id LIMIT 1")).first()
+                    if row is None:
+                        raise ValueError("no admin user to own IDS alerts; pass an explicit user id")
+                    self.user_id = row[0]
+                if inspect(conn).has_table('ids_alert'):
+                    raise ValueError(f"{self.db_path} keeps alerts in a single ids_alert table; "
+                                     f"run python3 -m database.migrate {self.db_path} first")
+                alerts.create_rollup_tables(conn)
+        except Exception:
+            engine.dispose()
+            raise
+        self._engine = engine
+        self._thread = threading.Thread(target=self._run, name='ids-alert-sink', daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, src, dst, proto, alert_type, severity, description, when=None):
+        """
+        Queue one alert (src and dst as strings or uint32 IPv4 addresses).
+        Never blocks; returns False if it was dropped.
+        """
+        row = {'timestamp': when or datetime.now(), 'source_ip': src, 'destination_ip': dst,
+               'protocol': PROTOCOL_NAMES.get(proto, str(proto)), 'alert_type': alert_type,
+               'severity': severity, 'description': description, 'user_id': self.user_id}
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _run(self):
+        pending = []
+        deadline = time.monotonic() + self.flush_every
+        closing = False
+        try:
+            while not closing:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    item = None
+                if item is _CLOSE:
+                    closing = True
+                elif item is not None:
+                    pending.append(item)
+                now = time.monotonic()
+                if pending and (closing or len(pending) >= self.batch_size or now >= deadline):
+                    self._write(pending)
+                    pending = []
+                if now >= deadline:
+                    deadline = now + self.flush_every
+                    self._report_drops()
+        finally:
+            self._engine.dispose()
+
+    def _write(self, rows):
+        try:
+            with self._engine.begin() as conn:   # one transaction per batch
+                alerts.insert_alerts(conn, rows)
+            self.written += len(rows)
+        except (SQLAlchemyError, ValueError) as e:
+            self.dropped += len(rows)
+            logging.error("Failed to store %d IDS alerts: %s", len(rows), e)
+
+    def _report_drops(self):
+        if self.dropped != self._reported_drops:
+            logging.warning("Alert sink dropped %d alerts so far (queue full or database error)",
+                            self.dropped)
+            self._reported_drops = self.dropped
+
+    def close(self, timeout=10.0):
+        """Write what is still queued and stop the writer thread."""
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(_CLOSE, timeout=timeout)
+        except queue.Full:
+            logging.error("Alert sink queue still full at shutdown; unsaved alerts are lost")
+            return
+        self._thread.join(timeout)
+        self._thread = None
+        self._report_drops()
+
+    def stats(self):
+        return {'queued': self.queue.qsize(), 'written': self.written, 'dropped': self.dropped}
@@ -0,0 +1,354 @@
+# ids/capture.py
+"""
+Fast capture path for the live IDS.
+
+Frames are read in bulk, either from an AF_PACKET TPACKET_V3 receive ring
+(the kernel fills whole blocks of frames that are walked in place) or from a
+pcap file read in large chunks. Only the fixed IPv4/TCP/UDP header fields
+needed for the flow key are decoded, with struct.unpack_from on memoryviews;
+no per-packet scapy objects are built.
+
+An optional classic BPF program is attached to the socket so the kernel drops
+unwanted traffic before it reaches the ring.
+"""
+import ctypes
+import mmap
+import select
+import socket
+import struct
+import subprocess
+
+from ids.flow_table import pack_flow_key
+
+# pcap link-layer types
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_RAW_ALT = 12     # DLT_RAW as written by some platforms
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+
+ETH_P_ALL = 0x0003
+ETH_P_IP = 0x0800
+_VLAN_TYPES = (0x8100, 0x88A8)
+
+# Linux socket constants not exported by the socket module
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+SO_ATTACH_FILTER = 26
+
+# Default kernel filter: IPv4 frames only (ldh [12]; jeq #0x800; ret #-1; ret #0)
+BPF_IPV4_ONLY = [
+    (0x28, 0, 0, 12),
+    (0x15, 0, 1, ETH_P_IP),
+    (0x06, 0, 0, 0x00040000),
+    (0x06, 0, 0, 0),
+]
+
+_U16 = struct.Struct('!H').unpack_from
+_IPV4 = struct.Struct('!B5xH1xB2xII').unpack_from   # ver_ihl, frag, proto, src, dst
+_PORTS = struct.Struct('!HH').unpack_from
+_U32_NATIVE = struct.Struct('=I')
+_BLOCK_HDR = struct.Struct('=II').unpack_from        # num_pkts, offset_to_first_pkt
+_TP3_HDR = struct.Struct('=IIIIIIH').unpack_from     # next, sec, nsec, snaplen, len, status, mac
+
+
+def parse_frame(buf, linktype=LINKTYPE_ETHERNET):
+    """
+    Decode the flow key of one captured frame straight from its bytes.
+    Returns (key, tcp_flags), or None for non-IPv4 and truncated frames.
+    """
+    try:
+        if linktype == LINKTYPE_ETHERNET:
+            off = 14
+            ethertype = _U16(buf, 12)[0]
+            while ethertype in _VLAN_TYPES:
+                ethertype = _U16(buf, off + 2)[0]
+                off += 4
+        elif linktype == LINKTYPE_RAW or linktype == LINKTYPE_RAW_ALT:
+            off = 0
+            ethertype = ETH_P_IP
+        elif linktype == LINKTYPE_LINUX_SLL:
+            off = 16
+            ethertype = _U16(buf, 14)[0]
+        elif linktype == LINKTYPE_LINUX_SLL2:
+            off = 20
+            ethertype = _U16(buf, 0)[0]
+        else:
+            return None
+        if ethertype != ETH_P_IP:
+            return None
+        ver_ihl, frag, proto, src, dst = _IPV4(buf, off)
+        if ver_ihl >> 4 != 4:
+            return None
+        sport = dport = flags = 0
+        # only the first fragment carries the L4 header
+        if (proto == 6 or proto == 17) and not frag & 0x1FFF:
+            l4 = off + (ver_ihl & 0x0F) * 4
+            sport, dport = _PORTS(buf, l4)
+            if proto == 6:
+                flags = buf[l4 + 13]
+        return pack_flow_key(src, dst, sport, dport, proto), flags
+    except (struct.error, IndexError):
+        return None
+
+
+def compile_bpf(expression, iface=None):
+    """
+    Compile a tcpdump-style filter expression to classic BPF instructions
+    using `tcpdump -ddd`. Returns a list of (code, jt, jf, k) tuples.
+    """
+    cmd = ['tcpdump', '-ddd']
+    if iface:
+        cmd += ['-i', iface]
+    out = subprocess.run(cmd + [expression], capture_output=True, text=True, check=True).stdout.split()
+    count = int(out[0])
+    return [tuple(int(x) for x in out[1 + 4 * i:5 + 4 * i]) for i in range(count)]
+
+
+def attach_bpf(sock, program):
+    """Attach a classic BPF program to a socket (SO_ATTACH_FILTER)."""
+    insns = b''.join(struct.pack('HBBI', code, jt, jf, k) for code, jt, jf, k in program)
+    buf = ctypes.create_string_buffer(insns, len(insns))
+    # struct sock_fprog { unsigned short len; struct sock_filter *filter; }
+    fprog = struct.pack('HL', len(program), ctypes.addressof(buf))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+class RingCapture:
+    """
+    AF_PACKET capture through a TPACKET_V3 mmap ring (Linux only, needs root).
+    frames() yields (ts, frame, wire_len); frame is a memoryview into the
+    ring that is only valid until the generator moves past its block. With
+    heartbeat=True, (None, None, 0) is also yielded whenever the ring stays
+    empty for timeout_ms, so callers can do housekeeping while idle.
+    """
+
+    linktype = LINKTYPE_ETHERNET
+
+    def __init__(self, iface=None, bpf=BPF_IPV4_ONLY, block_size=1 << 20,
+                 block_nr=64, frame_size=2048, timeout_ms=100):
+        self.block_size = block_size
+        self.block_nr = block_nr
+        self.timeout_ms = timeout_ms
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        try:
+            if bpf:
+                attach_bpf(self.sock, bpf)
+            self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+            # struct tpacket_req3
+            req = struct.pack('=7I', block_size, block_nr, frame_size,
+                              block_size * block_nr // frame_size, timeout_ms, 0, 0)
+            self.sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+            self.ring = mmap.mmap(self.sock.fileno(), block_size * block_nr,
+                                  mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+            if iface:
+                self.sock.bind((iface, ETH_P_ALL))
+        except Exception:
+            self.sock.close()
+            raise
+
+    def frames(self, heartbeat=False):
+        ring = self.ring
+        view = memoryview(ring)
+        poller = select.poll()
+        poller.register(self.sock, select.POLLIN | select.POLLERR)
+        block = 0
+        try:
+            while True:
+                base = block * self.block_size
+                # tpacket_block_desc.hdr.bh1.block_status
+                if not _U32_NATIVE.unpack_from(ring, base + 8)[0] & TP_STATUS_USER:
+                    if not poller.poll(self.timeout_ms) and heartbeat:
+                        yield None, None, 0
+                    continue
+                num_pkts, off = _BLOCK_HDR(ring, base + 12)
+                off += base
+                for _ in range(num_pkts):
+                    next_off, sec, nsec, snaplen, wire_len, _, mac = _TP3_HDR(ring, off)
+                    start = off + mac
+                    yield sec + nsec * 1e-9, view[start:start + snaplen], wire_len
+                    off += next_off
+                # hand the block back to the kernel
+                _U32_NATIVE.pack_into(ring, base + 8, TP_STATUS_KERNEL)
+                block = (block + 1) % self.block_nr
+        finally:
+            view.release()
+
+    def close(self):
+        try:
+            self.ring.close()
+        except BufferError:
+            # a frames() generator is still suspended; the mapping is freed with it
+            pass
+        self.sock.close()
+
+
+class PcapReader:
+    """
+    Classic pcap file reader (microsecond or nanosecond, either byte order).
+    The file is read in chunk_size pieces; frames() yields (ts, frame, wire_len)
+    with frame a memoryview into the current chunk.
+    """
+
+    def __init__(self, path, chunk_size=4 << 20):
+        self.path = path
+        self.chunk_size = chunk_size
+        with open(path, 'rb') as f:
+            header = f.read(24)
+        if len(header) < 24:
+            raise ValueError(f"{path}: not a pcap file")
+        magic = struct.unpack('<I', header[:4])[0]
+        if magic in (0xA1B2C3D4, 0xA1B23C4D):
+            endian = '<'
+        elif magic in (0xD4C3B2A1, 0x4D3CB2A1):
+            endian = '>'
+        else:
+            raise ValueError(f"{path}: unsupported capture format (magic {magic:#x})")
+        self.bytes_read = 0   # progress of frames(), in file bytes
+        self.frac_scale = 1e-9 if magic in (0xA1B23C4D, 0x4D3CB2A1) else 1e-6
+        self.linktype = struct.unpack(endian + 'I', header[20:24])[0] & 0x0FFFFFFF
+        self._record = struct.Struct(endian + 'IIII').unpack_from
+
+    def frames(self):
+        record = self._record
+        scale = self.frac_scale
+        with open(self.path, 'rb') as f:
+            f.seek(24)
+            self.bytes_read = 24
+            pending = b''
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                self.bytes_read += len(chunk)
+                data = pending + chunk if pending else chunk
+                view = memoryview(data)
+                off = 0
+                end = len(data)
+                while off + 16 <= end:
+                    sec, frac, incl_len, orig_len = record(data, off)
+                    start = off + 16
+                    if start + incl_len > end:
+                        break
+                    yield sec + frac * scale, view[start:start + incl_len], orig_len
+                    off = start + incl_len
+                pending = data[off:]
+
+    def close(self):
+        pass
+
+
+class PcapngReader:
+    """
+    pcapng file reader for Enhanced and Simple Packet Blocks. Frames are
+    reported with the link type of the first interface; packets captured on
+    interfaces with a different link type are skipped.
+    """
+
+    SHB = 0x0A0D0D0A
+    IDB = 1
+    SPB = 3
+    EPB = 6
+
+    def __init__(self, path, chunk_size=4 << 20):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.linktype = None
+        self.bytes_read = 0   # progress of frames(), in file bytes
+        # the first interface block comes before any packet block
+        blocks = self._blocks(interfaces=[])
+        next(blocks, None)
+        blocks.close()
+        if self.linktype is None:
+            raise ValueError(f"{path}: no interface description block")
+
+    def _blocks(self, interfaces):
+        """
+        Walk the file block by block and yield (ts, frame, wire_len) for
+        packet blocks; section/interface blocks update `interfaces` in place
+        with (linktype, ts_scale) per interface id.
+        """
+        endian = '<'
+        header = struct.Struct('<II').unpack_from
+        last_ts = 0.0
+        self.bytes_read = 0
+        with open(self.path, 'rb') as f:
+            pending = b''
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                self.bytes_read += len(chunk)
+                data = pending + chunk if pending else chunk
+                view = memoryview(data)
+                off = 0
+                end = len(data)
+                while off + 12 <= end:
+                    btype = struct.unpack_from('<I', data, off)[0]
+                    if btype == self.SHB:
+                        magic = struct.unpack_from('<I', data, off + 8)[0]
+                        endian = '<' if magic == 0x1A2B3C4D else '>'
+                        header = struct.Struct(endian + 'II').unpack_from
+                    btype, blen = header(data, off)
+                    if blen < 12:
+                        raise ValueError(f"{self.path}: corrupt block at offset {off}")
+                    if off + blen > end:
+                        break
+                    if btype == self.EPB:
+                        iface, ts_hi, ts_lo, cap_len, orig_len = struct.unpack_from(endian + 'IIIII', data, off + 8)
+                        if iface >= len(interfaces):
+                            raise ValueError(f"{self.path}: packet block for undeclared interface {iface} "
+                                             f"at offset {off}")
+                        linktype, scale = interfaces[iface]
+                        last_ts = ((ts_hi << 32) | ts_lo) * scale
+                        if linktype == self.linktype:
+                            yield last_ts, view[off + 28:off + 28 + cap_len], orig_len
+                    elif btype == self.SPB:
+                        orig_len = struct.unpack_from(endian + 'I', data, off + 8)[0]
+                        cap_len = min(orig_len, blen - 16)
+                        if not interfaces:
+                            raise ValueError(f"{self.path}: packet block for undeclared interface 0 "
+                                             f"at offset {off}")
+                        if interfaces[0][0] == self.linktype:
+                            yield last_ts, view[off + 12:off + 12 + cap_len], orig_len
+                    elif btype == self.SHB:
+                        interfaces.clear()
+                    elif btype == self.IDB:
+                        linktype = struct.unpack_from(endian + 'H', data, off + 8)[0]
+                        interfaces.append((linktype, self._ts_scale(data, off + 16, off + blen - 4, endian)))
+                        if self.linktype is None:
+                            self.linktype = linktype
+                    off += blen
+                pending = data[off:]
+
+    @staticmethod
+    def _ts_scale(data, off, end, endian):
+        """Seconds per timestamp unit from the if_tsresol option (default microseconds)."""
+        while off + 4 <= end:
+            code, length = struct.unpack_from(endian + 'HH', data, off)
+            if code == 0:
+                break
+            if code == 9 and length == 1:
+                res = data[off + 4]
+                return 2.0 ** -(res & 0x7F) if res & 0x80 else 10.0 ** -res
+            off += 4 + (length + 3) // 4 * 4
+        return 1e-6
+
+    def frames(self):
+        return self._blocks(interfaces=[])
+
+    def close(self):
+        pass
+
+
+def open_capture_file(path, chunk_size=4 << 20):
+    """Open a pcap or pcapng file, picking the reader from its magic number."""
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    if len(magic) == 4 and struct.unpack('<I', magic)[0] == PcapngReader.SHB:
+        return PcapngReader(path, chunk_size)
+    return PcapReader(path, chunk_size)
@@ -1,9 +1,10 @@
 # ids/detection.py
 import os
-import joblib
 import numpy as np
 from flask import Blueprint, render_template, request, current_app
 
+from ids.model_registry import registry
+
 ids_bp = Blueprint('ids', __name__)
 
 # ------------------ Configuration ------------------
@@ -13,41 +14,40 @@ MODEL_FILENAME = 'ids_model/model.h5'   # change if your model file has a differ
 # If you saved encoders/scaler individually, set their filenames here (optional)
 ENCODER_FILENAME = None   # e.g. 'encoders.joblib' or None
 
-# ------------------ Cached objects ------------------
-_MODEL = None
-_ENCODERS = None
+# ------------------ Shared objects ------------------
+# Loaded once per process by ids.model_registry (preloaded at app startup,
+# reloaded when the file changes); forests are compiled to flat node arrays.
+def _model_path():
+    model_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), MODEL_FILENAME)
+    # try also app root if that path doesn't exist
+    if not os.path.exists(model_path):
+        model_path = os.path.join(os.getcwd(), MODEL_FILENAME)
+    return model_path
+
+registry.register('detection.model', _model_path(), compile=True)
+if ENCODER_FILENAME:
+    registry.register('detection.encoders', os.path.join(os.getcwd(), ENCODER_FILENAME))
 
 def _load_model():
-    """Load model once and cache it in module-level variable."""
-    global _MODEL
-    if _MODEL is None:
-        model_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), MODEL_FILENAME)
-        # try also app root if that path doesn't exist
-        if not os.path.exists(model_path):
-            model_path = os.path.join(os.getcwd(), MODEL_FILENAME)
-        if os.path.exists(model_path):
-            try:
-                _MODEL = joblib.load(model_path)
-                current_app.logger.info("Loaded IDS model from %s", model_path)
-            except Exception as e:
-                current_app.logger.exception("Failed to load IDS model from %s: %s", model_path, e)
-                _MODEL = None
-        else:
-            current_app.logger.warning("Model file not found at %s", model_path)
-    return _MODEL
+    """The shared IDS model, or None if it could not be loaded."""
+    model = registry.get('detection.model')
+    if model is None:
+        current_app.logger.warning("IDS model not available at %s", _model_path())
+    return model
 
 def _load_encoders():
-    """Load saved encoders if provided (optional)."""
-    global _ENCODERS
-    if _ENCODERS is None and ENCODER_FILENAME:
-        path = os.path.join(os.getcwd(), ENCODER_FILENAME)
-        if os.path.exists(path):
-            try:
-                _ENCODERS = joblib.load(path)
-            except Exception:
-                current_app.logger.exception("Failed to load encoders from %s", path)
-                _ENCODERS = None
-    return _ENCODERS
+    """Saved encoders if provided (optional)."""
+    return registry.get('detection.encoders') if ENCODER_FILENAME else None
+
+# Fields sent by ids.html / the batch API, in model training order
+FEATURE_FIELDS = [
+    'duration','protocol_type','flag','src_bytes','dst_bytes','land',
+    'wrong_fragment','urgent','hot','num_failed_logins','logged_in','num_compromised',
+    'root_shell','su_attempted','num_file_creations','num_shells','num_access_files','is_guest_login',
+    'count','srv_count','serror_rate','rerror_rate','same_srv_rate','diff_srv_rate',
+    'srv_diff_host_rate','dst_host_count','dst_host_srv_count','dst_host_diff_srv_rate',
+    'dst_host_same_src_port_rate','dst_host_srv_diff_host_rate'
+]
 
 # Fallback encoding maps (ONLY use if you DID NOT save encoders during training)
 # Replace these with your real encodings if different.
@@ -87,17 +87,8 @@ def ids_home():
 
     if request.method == 'POST':
         # Collect the same fields your ids.html sends (order MUST match model training order)
-        fields = [
-            'duration','protocol_type','flag','src_bytes','dst_bytes','land',
-            'wrong_fragment','urgent','hot','num_failed_logins','logged_in','num_compromised',
-            'root_shell','su_attempted','num_file_creations','num_shells','num_access_files','is_guest_login',
-            'count','srv_count','serror_rate','rerror_rate','same_srv_rate','diff_srv_rate',
-            'srv_diff_host_rate','dst_host_count','dst_host_srv_count','dst_host_diff_srv_rate',
-            'dst_host_same_src_port_rate','dst_host_srv_diff_host_rate'
-        ]
-
         raw_values = []
-        for f in fields:
+        for f in FEATURE_FIELDS:
             raw_values.append(request.form.get(f, '').strip())
 
         # Convert raw_values -> numeric feature vector matching training
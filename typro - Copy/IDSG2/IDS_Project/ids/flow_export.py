@@ -0,0 +1,144 @@
+# ids/flow_export.py
+"""
+Columnar log of the live IDS's classified flows for offline analysis.
+
+FlowRecorder.record() copies the flows of one classification pass (keys,
+feature matrix, labels, confidences) into a structured NumPy buffer of
+batch_size rows. A full buffer, or one older than flush_every seconds,
+goes to a writer thread that stores it with database/columnar.py as one
+file per day in <directory>/flows/day=YYYY-MM-DD/ (Parquet, Arrow IPC or
+.npz). Like the alert sink, classification never waits on the disk: when
+max_pending batches are already waiting, the batch is dropped and
+counted.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from database import columnar
+from ids.flow_table import FEATURE_ORDER, int_to_ip
+
+FLOW_BATCH = 100000      # flows per file at most
+FLUSH_EVERY = 300.0      # seconds; a partial batch is written at least this often
+
+# Columns of a flows file: the features as the model saw them
+FLOW_RECORD_DTYPE = np.dtype(
+    [('time', 'datetime64[us]'), ('src_ip', np.uint32), ('dst_ip', np.uint32)]
+    + [(name, np.float64) for name in FEATURE_ORDER]
+    + [('label', 'U32'), ('confidence', np.float64), ('malicious', np.bool_)])
+
+_CLOSE = object()
+
+
+def flow_columns(records):
+    """A batch of FLOW_RECORD_DTYPE rows as columns, addresses as dotted-quad strings."""
+    columns = {name: records[name] for name in FLOW_RECORD_DTYPE.names}
+    for name in ('src_ip', 'dst_ip'):
+        columns[name] = np.array([int_to_ip(ip) for ip in records[name].tolist()], str)
+    return columns
+
+
+class FlowRecorder:
+    def __init__(self, directory, fmt=columnar.DEFAULT_FORMAT, batch_size=FLOW_BATCH,
+                 flush_every=FLUSH_EVERY, max_pending=4):
+        self.dataset = os.path.join(directory, 'flows')
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.flush_every = flush_every
+        self.queue = queue.Queue(maxsize=max_pending)
+        self._buffer = np.empty(batch_size, FLOW_RECORD_DTYPE)
+        self._size = 0
+        self._started = time.monotonic()
+        self._files = 0
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='ids-flow-export', daemon=True)
+        self._thread.start()
+        return self
+
+    def record(self, keys, X, labels, confidences, malicious):
+        """
+        Add classified flows: keys[i] (packed flow key) has the feature row
+        X[i], the model's labels[i] and confidences[i] (None if unknown).
+        Never blocks.
+        """
+        n = len(keys)
+        hi = np.fromiter((key >> 40 for key in keys), np.uint64, n)
+        records = np.empty(n, FLOW_RECORD_DTYPE)
+        records['time'] = np.datetime64(datetime.now(), 'us')
+        records['src_ip'] = hi >> np.uint64(32)
+        records['dst_ip'] = hi & np.uint64(0xFFFFFFFF)
+        for i, name in enumerate(FEATURE_ORDER):
+            records[name] = X[:, i]
+        records['label'] = [str(label) for label in labels]
+        records['confidence'] = [np.nan if c is None else c for c in confidences]
+        records['malicious'] = malicious
+
+        start = 0
+        while start < n:
+            take = min(n - start, self.batch_size - self._size)
+            self._buffer[self._size:self._size + take] = records[start:start + take]
+            self._size += take
+            start += take
+            if self._size == self.batch_size:
+                self.flush()
+        if self._size and time.monotonic() - self._started >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Hand the buffered flows to the writer thread."""
+        if not self._size:
+            return
+        batch = self._buffer[:self._size]
+        self._buffer = np.empty(self.batch_size, FLOW_RECORD_DTYPE)
+        self._size = 0
+        self._started = time.monotonic()
+        try:
+            self.queue.put_nowait(batch)
+        except queue.Full:
+            self.dropped += len(batch)
+            logging.warning("Flow export dropped %d flows (writer behind)", len(batch))
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is _CLOSE:
+                return
+            try:
+                self._write(batch)
+            except (OSError, ValueError) as e:
+                self.dropped += len(batch)
+                logging.error("Failed to export %d flows: %s", len(batch), e)
+
+    def _write(self, batch):
+        days = batch['time'].astype('datetime64[D]')
+        for day in np.unique(days):   # a batch may span midnight
+            records = batch[days == day]
+            self._files += 1
+            name = f"part-{records['time'][0].astype(np.int64):017d}-{os.getpid()}-{self._files}"
+            columnar.write_file(os.path.join(self.dataset, f"day={day}", name), flow_columns(records), self.fmt)
+            self.written += len(records)
+
+    def close(self, timeout=30.0):
+        """Write the buffered flows and stop the writer thread."""
+        if self._thread is None:
+            return
+        self.flush()
+        try:
+            self.queue.put(_CLOSE, timeout=timeout)
+        except queue.Full:
+            logging.error("Flow export queue still full at shutdown; unsaved flows are lost")
+            return
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        return {'buffered': self._size, 'written': self.written, 'dropped': self.dropped}
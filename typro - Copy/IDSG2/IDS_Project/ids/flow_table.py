@@ -0,0 +1,392 @@
+# ids/flow_table.py
+"""
+Sharded, array-backed flow table used by the live IDS.
+
+Flows are spread over N shards by a hash of the flow key. Each shard has its
+own lock, so the sniffer callback only contends with work on the same shard,
+and a timer wheel of expiry deadlines (buckets of row numbers, with a heap
+of bucket ticks), so the monitor finds idle flows without walking the whole
+table, even when packet timestamps jump (e.g. when reading a capture file).
+
+A flow is not a Python object. Its key is one integer packing the 5-tuple
+(see pack_flow_key) and its counters are one fixed-width row of a structured
+NumPy array. Keys are found through an open-addressing index (int32 row
+numbers, linear probing) instead of a dict, which keeps a flow at well under
+100 bytes. Expired rows are turned into the classifier's feature matrix with
+column-wise vectorized gathers, without building per-flow Python objects.
+"""
+import heapq
+import socket
+import struct
+import threading
+from array import array
+
+import numpy as np
+
+# Feature order MUST match features used during model training
+FEATURE_ORDER = [
+    "duration",       # seconds
+    "total_bytes",
+    "packet_count",
+    "avg_pkt_len",
+    "src_port",
+    "dst_port",
+    "protocol",       # numeric (e.g., 6 for TCP, 17 for UDP)
+    "syn_count",
+    "ack_count",
+    "fin_count",
+]
+N_FEATURES = len(FEATURE_ORDER)
+(COL_DURATION, COL_TOTAL_BYTES, COL_PACKET_COUNT, COL_AVG_PKT_LEN,
+ COL_SRC_PORT, COL_DST_PORT, COL_PROTOCOL, COL_SYN, COL_ACK, COL_FIN) = range(N_FEATURES)
+
+# One row per flow; 60 bytes. Ports and protocol are read back from key_lo.
+FLOW_DTYPE = np.dtype([
+    ('key_hi', np.uint64),        # src << 32 | dst
+    ('key_lo', np.uint64),        # sport << 24 | dport << 8 | proto
+    ('first_ts', np.float64),
+    ('last_ts', np.float64),
+    ('total_bytes', np.uint64),
+    ('packet_count', np.uint32),  # 0 marks a free row
+    ('syn_count', np.uint32),
+    ('ack_count', np.uint32),
+    ('fin_count', np.uint32),
+    ('index_pos', np.int32),      # position of this row in the shard index
+])
+
+# TCP flag bits counted per flow
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+
+KEY_LO_BITS = 40
+KEY_LO_MASK = (1 << KEY_LO_BITS) - 1
+
+# Index slot markers
+EMPTY = -1
+TOMB = -2
+
+# Multiplicative hashing constants (64-bit); _hash and _hash_array must agree
+_M64 = (1 << 64) - 1
+_MIX1 = 0xFF51AFD7ED558CCD
+_MIX2 = 0x9E3779B97F4A7C15
+
+
+def ip_to_int(addr):
+    """Dotted-quad IPv4 string -> uint32."""
+    return struct.unpack('!I', socket.inet_aton(addr))[0]
+
+
+def int_to_ip(value):
+    """uint32 -> dotted-quad IPv4 string."""
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+def pack_flow_key(src, dst, sport, dport, proto):
+    """
+    Pack a 5-tuple into one integer: src(32) | dst(32) | sport(16) | dport(16) | proto(8).
+    src and dst are IPv4 addresses as uint32.
+    """
+    return (((((src << 32) | dst) << 16 | sport) << 16 | dport) << 8) | proto
+
+
+def unpack_flow_key(key):
+    """Inverse of pack_flow_key: returns (src, dst, sport, dport, proto)."""
+    proto = key & 0xFF
+    dport = (key >> 8) & 0xFFFF
+    sport = (key >> 24) & 0xFFFF
+    dst = (key >> 40) & 0xFFFFFFFF
+    src = key >> 72
+    return src, dst, sport, dport, proto
+
+
+def format_flow_key(key):
+    """Human-readable form used in logs: src:sport-dst:dport-proto."""
+    src, dst, sport, dport, proto = unpack_flow_key(key)
+    return f"{int_to_ip(src)}:{sport}-{int_to_ip(dst)}:{dport}-{proto}"
+
+
+class FlowShard:
+    """One slice of the flow table: index, counter rows, lock and timer wheel."""
+
+    __slots__ = ('lock', 'rows', 'key_hi', 'key_lo', 'first_ts', 'last_ts',
+                 'total_bytes', 'packet_count', 'syn_count', 'ack_count',
+                 'fin_count', 'index_pos', 'free', 'index', 'mask', 'shift',
+                 'count', 'tombs', 'wheel', 'ticks', 'resolution')
+
+    def __init__(self, capacity=1024, resolution=0.25):
+        self.lock = threading.Lock()
+        self._set_rows(np.zeros(capacity, dtype=FLOW_DTYPE))
+        self.free = array('I', range(capacity - 1, -1, -1))
+        self.count = 0
+        self._rehash(capacity * 2)
+        # tick -> row numbers whose deadline falls in that tick
+        self.wheel = {}
+        self.ticks = []     # heap of the ticks present in wheel
+        self.resolution = resolution
+
+    def __len__(self):
+        return self.count
+
+    # --- storage ---
+
+    def _set_rows(self, rows):
+        self.rows = rows
+        self.key_hi = rows['key_hi']
+        self.key_lo = rows['key_lo']
+        self.first_ts = rows['first_ts']
+        self.last_ts = rows['last_ts']
+        self.total_bytes = rows['total_bytes']
+        self.packet_count = rows['packet_count']
+        self.syn_count = rows['syn_count']
+        self.ack_count = rows['ack_count']
+        self.fin_count = rows['fin_count']
+        self.index_pos = rows['index_pos']
+
+    def _grow_rows(self):
+        old = len(self.rows)
+        rows = np.zeros(old * 2, dtype=FLOW_DTYPE)
+        rows[:old] = self.rows
+        self._set_rows(rows)
+        self.free.extend(range(old * 2 - 1, old - 1, -1))
+
+    # --- index ---
+
+    def _hash(self, hi, lo):
+        return (((hi ^ ((lo * _MIX1) & _M64)) * _MIX2) & _M64) >> self.shift
+
+    def _hash_array(self, hi, lo):
+        mixed = (hi ^ (lo * np.uint64(_MIX1))) * np.uint64(_MIX2)
+        return (mixed >> np.uint64(self.shift)).astype(np.int64)
+
+    def _find(self, hi, lo):
+        """
+        Probe the index for a key. Returns (pos, row): row is -1 if the key
+        is absent, in which case pos is where it should be inserted.
+        """
+        index = self.index
+        mask = self.mask
+        key_hi = self.key_hi
+        key_lo = self.key_lo
+        i = self._hash(hi, lo)
+        first_tomb = -1
+        while True:
+            r = int(index[i])
+            if r == EMPTY:
+                return (first_tomb if first_tomb >= 0 else i), -1
+            if r == TOMB:
+                if first_tomb < 0:
+                    first_tomb = i
+            elif int(key_hi[r]) == hi and int(key_lo[r]) == lo:
+                return i, r
+            i = (i + 1) & mask
+
+    def _rehash(self, capacity):
+        """Rebuild the index at `capacity` slots (a power of two), dropping tombstones."""
+        capacity = 1 << max(4, (capacity - 1).bit_length())
+        self.index = index = np.full(capacity, EMPTY, dtype=np.int32)
+        self.mask = capacity - 1
+        self.shift = 64 - (capacity.bit_length() - 1)
+        self.tombs = 0
+        live = np.flatnonzero(self.packet_count)
+        if not live.size:
+            return
+        pos = self._hash_array(self.key_hi[live], self.key_lo[live])
+        pending = np.arange(live.size)
+        placed = np.zeros(live.size, dtype=bool)
+        # vectorized linear probing: per round, the first candidate for each
+        # empty slot takes it, everyone else moves one slot on
+        while pending.size:
+            p = pos[pending]
+            cand = pending[index[p] == EMPTY]
+            slots, first = np.unique(pos[cand], return_index=True)
+            winners = cand[first]
+            index[slots] = live[winners]
+            self.index_pos[live[winners]] = slots
+            placed[winners] = True
+            pending = pending[~placed[pending]]
+            pos[pending] = (pos[pending] + 1) & self.mask
+
+    # --- expiry wheel ---
+
+    def _schedule(self, row, deadline):
+        tick = int(deadline / self.resolution)
+        bucket = self.wheel.get(tick)
+        if bucket is None:
+            self.wheel[tick] = array('I', (row,))
+            heapq.heappush(self.ticks, tick)
+        else:
+            bucket.append(row)
+
+    def _schedule_many(self, rows, deadlines):
+        ticks = (deadlines / self.resolution).astype(np.int64)
+        order = np.argsort(ticks, kind='stable')
+        ticks = ticks[order]
+        rows = rows[order].astype(np.uint32)
+        uniq, starts = np.unique(ticks, return_index=True)
+        for tick, chunk in zip(uniq.tolist(), np.split(rows, starts[1:])):
+            bucket = self.wheel.get(tick)
+            if bucket is None:
+                self.wheel[tick] = bucket = array('I')
+                heapq.heappush(self.ticks, tick)
+            bucket.frombytes(chunk.tobytes())
+
+    # --- public API (callers go through FlowTable) ---
+
+    def add_packet(self, key, ts, length, flags, timeout):
+        """Account one packet to its flow, creating the flow on first sight."""
+        hi = key >> KEY_LO_BITS
+        lo = key & KEY_LO_MASK
+        with self.lock:
+            pos, r = self._find(hi, lo)
+            if r < 0:
+                if (self.count + self.tombs + 1) * 2 > len(self.index):
+                    self._rehash((self.count + 1) * 3)
+                    pos, _ = self._find(hi, lo)
+                if not self.free:
+                    self._grow_rows()
+                r = self.free.pop()
+                if self.index[pos] == TOMB:
+                    self.tombs -= 1
+                self.index[pos] = r
+                self.index_pos[r] = pos
+                self.key_hi[r] = hi
+                self.key_lo[r] = lo
+                self.first_ts[r] = ts
+                self.count += 1
+                self._schedule(r, ts + timeout)
+            self.last_ts[r] = ts
+            self.packet_count[r] += 1
+            self.total_bytes[r] += length
+            if flags:
+                if flags & TCP_SYN:
+                    self.syn_count[r] += 1
+                if flags & TCP_ACK:
+                    self.ack_count[r] += 1
+                if flags & TCP_FIN:
+                    self.fin_count[r] += 1
+
+    def features(self, rows):
+        """Build the (n, N_FEATURES) feature matrix for the given row numbers."""
+        n = len(rows)
+        X = np.empty((n, N_FEATURES), dtype=np.float64)
+        total_bytes = self.total_bytes[rows].astype(np.float64)
+        counts = self.packet_count[rows].astype(np.float64)
+        lo = self.key_lo[rows]
+        X[:, COL_DURATION] = np.maximum(0.000001, self.last_ts[rows] - self.first_ts[rows])
+        X[:, COL_TOTAL_BYTES] = total_bytes
+        X[:, COL_PACKET_COUNT] = counts
+        X[:, COL_AVG_PKT_LEN] = np.divide(total_bytes, counts, out=np.zeros(n), where=counts > 0)
+        X[:, COL_SRC_PORT] = (lo >> np.uint64(24)) & np.uint64(0xFFFF)
+        X[:, COL_DST_PORT] = (lo >> np.uint64(8)) & np.uint64(0xFFFF)
+        X[:, COL_PROTOCOL] = lo & np.uint64(0xFF)
+        X[:, COL_SYN] = self.syn_count[rows]
+        X[:, COL_ACK] = self.ack_count[rows]
+        X[:, COL_FIN] = self.fin_count[rows]
+        return X
+
+    def keys_of(self, rows):
+        """Packed flow keys for the given row numbers."""
+        return [(hi << KEY_LO_BITS) | lo
+                for hi, lo in zip(self.key_hi[rows].tolist(), self.key_lo[rows].tolist())]
+
+    def release(self, rows):
+        """Drop flows from the index and return their rows to the free list."""
+        self.index[self.index_pos[rows]] = TOMB
+        self.tombs += len(rows)
+        self.count -= len(rows)
+        self.rows[rows] = 0
+        self.free.frombytes(rows.astype(np.uint32).tobytes())
+
+    def pop_expired(self, now, timeout, times=None):
+        """
+        Remove every flow idle longer than timeout. Returns (keys, X).
+        If times is a list, the flows' last packet timestamps are appended
+        to it, in the same order. Caller must hold self.lock.
+
+        Deadlines are not touched on every packet. When a due entry turns out
+        to be stale (the flow saw traffic since), it is rescheduled at the
+        flow's real deadline, so each active flow costs at most one wheel
+        operation per timeout period.
+        """
+        keys, parts = [], []
+        last_tick = int(now / self.resolution)
+        ticks = self.ticks
+        # rescheduled rows always land at or after last_tick, so this ends
+        while ticks and ticks[0] < last_tick:
+            bucket = self.wheel.pop(heapq.heappop(ticks))
+            # a row can be listed twice if it was freed and reused
+            rows = np.unique(np.frombuffer(bucket, dtype=np.uint32)).astype(np.intp)
+            rows = rows[self.packet_count[rows] > 0]
+            deadlines = self.last_ts[rows] + timeout
+            due = deadlines < now
+            if not due.all():
+                self._schedule_many(rows[~due], deadlines[~due])
+            expired = rows[due]
+            if expired.size:
+                keys.extend(self.keys_of(expired))
+                parts.append(self.features(expired))
+                if times is not None:
+                    times.append(self.last_ts[expired])
+                self.release(expired)
+        return keys, parts
+
+    def drain(self, times=None):
+        """
+        Remove every flow regardless of age (e.g. at the end of a capture
+        file). Returns (keys, parts) like pop_expired. Caller must hold self.lock.
+        """
+        self.wheel.clear()
+        self.ticks.clear()
+        rows = np.flatnonzero(self.packet_count)
+        if not rows.size:
+            return [], []
+        keys = self.keys_of(rows)
+        X = self.features(rows)
+        if times is not None:
+            times.append(self.last_ts[rows])
+        self.release(rows)
+        return keys, [X]
+
+
+class FlowTable:
+    """Lock-striped flow table keyed by the packed 5-tuple."""
+
+    def __init__(self, shards=16, capacity=1024, resolution=0.25):
+        self.shards = [FlowShard(capacity, resolution) for _ in range(shards)]
+
+    def shard_for(self, key):
+        return self.shards[hash(key) % len(self.shards)]
+
+    def add_packet(self, key, ts, length, flags, timeout):
+        self.shard_for(key).add_packet(key, ts, length, flags, timeout)
+
+    def pop_expired(self, now, timeout, times=None):
+        """
+        Collect expired flows from every shard, locking one shard at a time.
+        Returns (keys, X) where X is the (n, N_FEATURES) feature matrix,
+        row i belonging to keys[i]. If times is a list, arrays of the flows'
+        last packet timestamps are appended to it (concatenated, they line
+        up with X).
+        """
+        return self._collect(lambda shard: shard.pop_expired(now, timeout, times))
+
+    def drain(self, times=None):
+        """Remove and return every flow, as (keys, X) like pop_expired."""
+        return self._collect(lambda shard: shard.drain(times))
+
+    def _collect(self, take):
+        all_keys = []
+        parts = []
+        for shard in self.shards:
+            with shard.lock:
+                keys, shard_parts = take(shard)
+            all_keys.extend(keys)
+            parts.extend(shard_parts)
+        if not parts:
+            return all_keys, np.empty((0, N_FEATURES))
+        X = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return all_keys, X
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
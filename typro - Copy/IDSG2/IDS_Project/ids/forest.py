@@ -0,0 +1,159 @@
+# ids/forest.py
+"""
+Low-latency inference for fitted sklearn RandomForestClassifier models.
+
+sklearn's predict_proba validates its input, dispatches every tree through
+joblib and walks each tree separately, which costs milliseconds even for a
+single row. CompiledForest copies the fitted trees into flat NumPy node
+arrays (one array per node attribute, all trees concatenated) and walks
+every tree for every row at once, one vectorized step per tree level.
+That wins for single rows and small batches; from SKLEARN_MIN_ROWS rows on,
+sklearn's compiled per-tree traversal is faster and the call is passed to
+the wrapped model.
+
+The result is bit-identical to the source model's predict_proba: inputs are
+cast to float32 like sklearn does before traversal, leaf values are
+normalized the same way, and tree probabilities are summed in estimator
+order before dividing by the number of trees.
+"""
+import threading
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.utils.fixes import parse_version
+
+# before 1.4 classifier trees stored class counts and predict_proba normalized them
+_NORMALIZE_LEAVES = parse_version(sklearn.__version__) < parse_version("1.4")
+
+SKLEARN_MIN_ROWS = 192    # batches this large go to the wrapped sklearn model
+_CHUNK_ROWS = 4096        # rows walked at once when no sklearn model is at hand
+
+
+class CompiledForest:
+    """Flat-array copy of a fitted single-output forest classifier."""
+
+    def __init__(self, model):
+        # the sklearn model is not pickled with the node arrays (see
+        # __getstate__); after unpickling it is reloaded from source_path
+        # the first time a large batch needs it
+        self.source_path = None
+        self._model_lock = threading.Lock()
+        estimators = getattr(model, 'estimators_', None)
+        if not estimators or getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError("expected a fitted single-output forest classifier")
+        self.model = model
+        self.classes_ = model.classes_
+        self.n_classes_ = len(self.classes_)
+        self.n_features_in_ = model.n_features_in_
+        self.n_estimators = len(estimators)
+
+        features, thresholds, lefts, rights, values, roots, leaves = [], [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        for est in estimators:
+            tree = est.tree_
+            n = tree.node_count
+            left = tree.children_left.astype(np.intp)
+            right = tree.children_right.astype(np.intp)
+            leaf = left == -1
+            node_ids = np.arange(n, dtype=np.intp)
+            # leaves are never stepped (see is_leaf); they point at themselves
+            # so the node arrays hold no out-of-range indices
+            leaves.append(leaf)
+            lefts.append(np.where(leaf, node_ids, left) + offset)
+            rights.append(np.where(leaf, node_ids, right) + offset)
+            features.append(np.where(leaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            value = tree.value[:, 0, :self.n_classes_].astype(np.float64)
+            if _NORMALIZE_LEAVES:
+                normalizer = value.sum(axis=1)
+                normalizer[normalizer == 0.0] = 1.0
+                value = value / normalizer[:, np.newaxis]
+            values.append(value)
+            roots.append(offset)
+            offset += n
+            depth = max(depth, tree.max_depth)
+
+        self.feature = np.concatenate(features)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(lefts)
+        self.right = np.concatenate(rights)
+        self.value = np.concatenate(values)
+        self.is_leaf = np.concatenate(leaves)
+        self.roots = np.array(roots, dtype=np.intp)
+        self.max_depth = depth
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['model'] = None
+        del state['_model_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._model_lock = threading.Lock()
+
+    def _sklearn_model(self):
+        if self.model is None and self.source_path is not None:
+            with self._model_lock:
+                if self.model is None:
+                    self.model = joblib.load(self.source_path)
+        return self.model
+
+    def _check_X(self, X):
+        X = np.asarray(X, dtype=np.float32)   # sklearn traverses trees on float32 input
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[-1]} features, but the model is expecting "
+                             f"{self.n_features_in_} features as input.")
+        if not np.isfinite(X).all():
+            raise ValueError("Input X contains NaN or infinity.")
+        return np.ascontiguousarray(X)
+
+    def apply(self, X):
+        """Global leaf index of every (tree, row): array of shape (n_estimators, n_rows)."""
+        X = self._check_X(X)
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        # one entry per (tree, row) pair, tree-major
+        node = np.repeat(self.roots, n_rows)
+        row_offset = np.tile(np.arange(n_rows, dtype=np.intp) * n_features, self.n_estimators)
+        feature, threshold, left, right, is_leaf = (self.feature, self.threshold, self.left,
+                                                    self.right, self.is_leaf)
+        # only pairs that have not reached a leaf are stepped, so the work is
+        # the total path length rather than trees x rows x max_depth
+        active = np.flatnonzero(~is_leaf[node])
+        while active.size:
+            current = node[active]
+            go_left = flat[row_offset[active] + feature[current]] <= threshold[current]
+            current = np.where(go_left, left[current], right[current])
+            node[active] = current
+            active = active[~is_leaf[current]]
+        return node.reshape(self.n_estimators, n_rows)
+
+    def predict_proba(self, X):
+        X = self._check_X(X)
+        if X.shape[0] >= SKLEARN_MIN_ROWS and self._sklearn_model() is not None:
+            return self.model.predict_proba(X)
+        out = np.empty((X.shape[0], self.n_classes_), dtype=np.float64)
+        for start in range(0, X.shape[0], _CHUNK_ROWS):
+            leaves = self.apply(X[start:start + _CHUNK_ROWS])
+            # sequential sum over trees in estimator order, as sklearn accumulates
+            proba = np.cumsum(self.value[leaves], axis=0)[-1]
+            proba /= self.n_estimators
+            out[start:start + len(proba)] = proba
+        return out
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def compile_model(model):
+    """CompiledForest for a fitted RandomForest/ExtraTrees classifier, else the model unchanged."""
+    try:
+        return CompiledForest(model)
+    except (AttributeError, ValueError):
+        # pipelines, other estimators, regressors, multi-output forests
+        return model
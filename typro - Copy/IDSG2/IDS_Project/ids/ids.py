@@ -3,79 +3,113 @@
 ids_live.py - real-time flow-based IDS demo
 
 Requirements:
- - scapy
+ - scapy (fallback capture backend)
  - joblib (for loading model and scaler)
-Run with sudo/root privileges:
- $ sudo python3 ids_live.py
+Run with sudo/root privileges from the project root:
+ $ sudo python3 -m ids.ids [--backend auto|raw|scapy] [--iface eth0] [--bpf "tcp or udp"]
+Offline replay of a capture file (no root needed; packet timestamps drive
+flow expiry, so results are reproducible and the file is read at full speed):
+ $ python3 -m ids.ids --pcap capture.pcapng
+Multi-process pipeline (1 capture, N aggregation, M classifier processes):
+ $ sudo python3 -m ids.ids --workers 4 --classifiers 2 [--iface eth0]
+Also score every finished flow as an NSL-KDD connection with the /ids form's
+model (single-process mode; window features from ids/kdd_features.py):
+ $ sudo python3 -m ids.ids --kdd-model path/to/nsl_kdd_model
+Also write every classified flow to columnar files for offline analysis
+(ids/flow_export.py; single-process mode):
+ $ sudo python3 -m ids.ids --flow-export exports/
 """
 
+import argparse
+import subprocess
 import time
 import threading
 from collections import defaultdict, deque
 from datetime import datetime
-from scapy.all import sniff, IP, TCP, UDP, Raw
 import joblib
 import numpy as np
 import logging
+from sqlalchemy.exc import SQLAlchemyError
+
+from ids.flow_table import (COL_PACKET_COUNT, COL_TOTAL_BYTES, FlowTable, pack_flow_key,
+                            ip_to_int, int_to_ip, format_flow_key, unpack_flow_key)
+from ids import alert_sink as alerts, capture, flow_export, kdd_features, live_status, pipeline
+from ids.forest import compile_model
+
+try:
+    from scapy.all import sniff, IP, TCP, UDP
+except ImportError:   # only needed for the scapy backend
+    sniff = None
 
 # --- Configuration ---
 MODEL_PATH = "model.pkl"
 SCALER_PATH = "scaler.pkl"
 FLOW_TIMEOUT = 2.0       # seconds of inactivity before classifying a flow
 CLASSIFY_EVERY = 1.0     # poll interval to check flows
+FLOW_SHARDS = 16         # lock stripes in the flow table
+CLASSIFY_MAX_BATCH = 4096        # max flows sent through the model in one call
+CLASSIFY_LATENCY_TARGET = 0.25   # seconds; batches shrink if one model call takes longer
 LOG_FILE = "ids_live.log"
 
-# Feature order MUST match features used during model training
-FEATURE_ORDER = [
-    "duration",       # seconds
-    "total_bytes",
-    "packet_count",
-    "avg_pkt_len",
-    "src_port",
-    "dst_port",
-    "protocol",       # numeric (e.g., 6 for TCP, 17 for UDP)
-    "syn_count",
-    "ack_count",
-    "fin_count",
-]
-
-# Setup logging
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
-)
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-logging.getLogger("").addHandler(console)
-
-# Load model and scaler
-try:
-    model = joblib.load(MODEL_PATH)
-    scaler = joblib.load(SCALER_PATH)
-    logging.info("Loaded model and scaler.")
-except Exception as e:
-    logging.error("Failed to load model/scaler: %s", e)
-    raise SystemExit("Place trained model.pkl and scaler.pkl in project folder.")
+# FEATURE_ORDER (the feature order used during model training) lives in
+# ids/flow_table.py, whose counter rows are laid out in that order.
+
+def setup_logging():
+    """Log to LOG_FILE and the console, unless logging is already configured."""
+    root = logging.getLogger("")
+    if root.handlers:
+        # e.g. a pipeline worker that inherited the parent's handlers
+        return
+    logging.basicConfig(
+        filename=LOG_FILE,
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s"
+    )
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    root.addHandler(console)
+
+# Model and scaler, set by load_model()
+model = None
+scaler = None
+
+def load_model(model_path=MODEL_PATH, scaler_path=SCALER_PATH):
+    global model, scaler
+    try:
+        model = compile_model(joblib.load(model_path))
+        scaler = joblib.load(scaler_path)
+        logging.info("Loaded model and scaler.")
+    except Exception as e:
+        logging.error("Failed to load model/scaler: %s", e)
+        raise SystemExit("Place trained model.pkl and scaler.pkl in project folder.")
+
+# NSL-KDD connection model, set by load_kdd_model() (--kdd-model); flows are
+# scored by it too, with window features kept in traffic_windows
+kdd_model = None
+traffic_windows = kdd_features.TrafficWindows()
+
+def load_kdd_model(path):
+    global kdd_model
+    try:
+        kdd_model = compile_model(joblib.load(path))
+        logging.info("Loaded NSL-KDD model %s.", path)
+    except Exception as e:
+        logging.error("Failed to load NSL-KDD model %s: %s", path, e)
+        raise SystemExit("--kdd-model must be a model trained on the /ids form's features.")
 
 # Data structure to keep active flows
-# key -> dict with flow stats
-flows = {}
-flows_lock = threading.Lock()
+# packed 5-tuple key -> counter row, sharded by key with one lock per shard
+flow_table = FlowTable(FLOW_SHARDS)
 
 def make_flow_key(pkt):
     """
-    5-tuple flow key: (src, dst, sport, dport, proto)
-    Use string normalized key to keep dict simple.
+    5-tuple flow key: (src, dst, sport, dport, proto) packed into one int,
+    see flow_table.pack_flow_key. Returns None for non-IP packets.
     """
     if IP not in pkt:
         return None
     ip = pkt[IP]
     proto = ip.proto
-    src = ip.src
-    dst = ip.dst
-    sport = None
-    dport = None
     if proto == 6 and TCP in pkt:
         sport = pkt[TCP].sport
         dport = pkt[TCP].dport
@@ -85,149 +119,407 @@ def make_flow_key(pkt):
     else:
         sport = 0
         dport = 0
-    return f"{src}:{sport}-{dst}:{dport}-{proto}"
-
-def update_flow_with_packet(flow, pkt, ts):
-    """
-    Update the flow dict in-place with this packet information.
-    """
-    pkt_len = len(pkt)
-    flow['last_ts'] = ts
-    flow['packet_count'] += 1
-    flow['total_bytes'] += pkt_len
-    # Update first_ts if not set
-    if flow['first_ts'] is None:
-        flow['first_ts'] = ts
-    # avg pkt len will be computed at classification
-    # extract TCP flags counts if TCP
-    if TCP in pkt:
-        flags = pkt[TCP].flags
-        # scapy represents flags as integer or characters depending; use bit checks
-        # SYN = 0x02, ACK = 0x10, FIN = 0x01
-        if flags & 0x02:
-            flow['syn_count'] += 1
-        if flags & 0x10:
-            flow['ack_count'] += 1
-        if flags & 0x01:
-            flow['fin_count'] += 1
+    return pack_flow_key(ip_to_int(ip.src), ip_to_int(ip.dst), sport, dport, proto)
 
 def packet_handler(pkt):
     ts = time.time()
     key = make_flow_key(pkt)
     if key is None:
         return
+    # extract TCP flags if TCP; SYN = 0x02, ACK = 0x10, FIN = 0x01
+    flags = int(pkt[TCP].flags) if TCP in pkt else 0
+    flow_table.add_packet(key, ts, len(pkt), flags, FLOW_TIMEOUT)
 
-    with flows_lock:
-        if key not in flows:
-            # initialize
-            flows[key] = {
-                'first_ts': None,
-                'last_ts': ts,
-                'packet_count': 0,
-                'total_bytes': 0,
-                'src_port': 0,
-                'dst_port': 0,
-                'protocol': 0,
-                'syn_count': 0,
-                'ack_count': 0,
-                'fin_count': 0,
-            }
-            # set ports/proto from packet
-            try:
-                if IP in pkt:
-                    ip = pkt[IP]
-                    flows[key]['protocol'] = ip.proto
-                if TCP in pkt:
-                    flows[key]['src_port'] = int(pkt[TCP].sport)
-                    flows[key]['dst_port'] = int(pkt[TCP].dport)
-                elif UDP in pkt:
-                    flows[key]['src_port'] = int(pkt[UDP].sport)
-                    flows[key]['dst_port'] = int(pkt[UDP].dport)
-            except Exception:
-                pass
-
-        update_flow_with_packet(flows[key], pkt, ts)
-
-def classify_flow(key, flow):
-    """
-    Build feature vector in the same order as FEATURE_ORDER,
-    scale it, and predict using the loaded model.
-    """
-    duration = max(0.000001, flow['last_ts'] - (flow['first_ts'] or flow['last_ts']))
-    total_bytes = flow['total_bytes']
-    pkt_count = flow['packet_count']
-    avg_pkt_len = total_bytes / pkt_count if pkt_count > 0 else 0
-
-    fv = [
-        duration,
-        total_bytes,
-        pkt_count,
-        avg_pkt_len,
-        flow.get('src_port', 0),
-        flow.get('dst_port', 0),
-        flow.get('protocol', 0),
-        flow.get('syn_count', 0),
-        flow.get('ack_count', 0),
-        flow.get('fin_count', 0),
-    ]
-
-    # ensure shape (1, n)
-    X = np.array(fv).reshape(1, -1)
-
+def predict_matrix(X):
+    """
+    Scale a (n, len(FEATURE_ORDER)) matrix and run the model over it once.
+    Returns (labels, confidences); confidences are None if the model has
+    no predict_proba.
+    """
     try:
         X_scaled = scaler.transform(X)
     except Exception as e:
         logging.error("Scaler transform failed: %s", e)
         X_scaled = X  # fallback: try raw features
 
-    pred = model.predict(X_scaled)
-    # If classifier supports predict_proba
-    proba = None
     if hasattr(model, "predict_proba"):
-        proba = model.predict_proba(X_scaled).max()
+        # one pass: labels come from the argmax of the probabilities
+        probs = model.predict_proba(X_scaled)
+        top_idx = np.argmax(probs, axis=1)
+        classes = getattr(model, "classes_", None)
+        labels = classes[top_idx] if classes is not None else top_idx
+        confidences = probs[np.arange(len(top_idx)), top_idx]
+        return labels, [float(c) for c in confidences]
+
+    labels = model.predict(X_scaled)
+    return labels, [None] * len(labels)
 
-    return pred[0], float(proba) if proba is not None else None, fv
+# Current chunk size for classify_flows; adapted to CLASSIFY_LATENCY_TARGET
+_batch_size = CLASSIFY_MAX_BATCH
+
+def predict_each(keys, X):
+    """
+    predict_matrix flow by flow, for a chunk whose batched call failed:
+    yields (key, label, confidence, fv), logging and skipping the flows
+    that fail on their own.
+    """
+    for key, fv in zip(keys, X):
+        try:
+            labels, confidences = predict_matrix(fv.reshape(1, -1))
+        except Exception as e:
+            logging.error("Error classifying flow %s: %s", format_flow_key(key), e)
+            continue
+        yield key, labels[0], confidences[0], fv
+
+def classify_flows(keys, X, latencies=None):
+    """
+    Classify the feature matrix X (row i belongs to keys[i]) with one model
+    call per chunk. Chunks start at CLASSIFY_MAX_BATCH rows and shrink when a
+    call takes longer than CLASSIFY_LATENCY_TARGET, so a burst of expired
+    flows never stalls the monitor loop on a single huge predict. A chunk
+    whose model call fails is classified again flow by flow (predict_each).
+    Yields (key, label, confidence, fv) for every flow classified; if
+    `latencies` is a list, the duration of every chunk's model call is
+    appended to it.
+    """
+    global _batch_size
+    start = 0
+    while start < len(keys):
+        stop = min(len(keys), start + _batch_size)
+        chunk = X[start:stop]   # view, no copy
+
+        t0 = time.perf_counter()
+        try:
+            labels, confidences = predict_matrix(chunk)
+        except Exception as e:
+            logging.error("Error classifying %d flows, retrying them one by one: %s", len(chunk), e)
+            yield from predict_each(keys[start:stop], chunk)
+            start = stop
+            continue
+        elapsed = time.perf_counter() - t0
+        if latencies is not None:
+            latencies.append(elapsed)
+
+        # adapt the next chunk size to the observed per-row cost
+        if elapsed > CLASSIFY_LATENCY_TARGET:
+            per_row = elapsed / len(chunk)
+            _batch_size = max(1, int(CLASSIFY_LATENCY_TARGET / per_row))
+        elif _batch_size < CLASSIFY_MAX_BATCH:
+            _batch_size = min(CLASSIFY_MAX_BATCH, _batch_size * 2)
+
+        for key, label, conf, fv in zip(keys[start:stop], labels, confidences, chunk):
+            yield key, label, conf, fv
+        start = stop
+
+# alerts.AlertSink feeding the dashboard's alert partitions, set by start_alert_sink()
+alert_sink = None
+
+def start_alert_sink(db_path, user_id=None):
+    """Store malicious verdicts in db_path. The IDS keeps running without it on failure."""
+    global alert_sink
+    try:
+        alert_sink = alerts.AlertSink(db_path, user_id).start()
+        logging.info("Storing alerts in %s (user id %s).", db_path, alert_sink.user_id)
+    except (SQLAlchemyError, ValueError) as e:
+        logging.warning("Alert storage disabled (%s): %s", db_path, e)
+        alert_sink = None
+
+def stop_alert_sink():
+    global alert_sink
+    if alert_sink is not None:
+        alert_sink.close()
+        stats = alert_sink.stats()
+        logging.info("Alert sink wrote %d alerts, dropped %d.", stats['written'], stats['dropped'])
+        alert_sink = None
+
+# flow_export.FlowRecorder writing classified flows to columnar files, set by start_flow_export()
+flow_recorder = None
+
+def start_flow_export(directory):
+    global flow_recorder
+    flow_recorder = flow_export.FlowRecorder(directory).start()
+    logging.info("Writing classified flows to %s (%s files).", flow_recorder.dataset, flow_recorder.fmt)
+
+def stop_flow_export():
+    global flow_recorder
+    if flow_recorder is not None:
+        flow_recorder.close()
+        stats = flow_recorder.stats()
+        logging.info("Flow export wrote %d flows, dropped %d.", stats['written'], stats['dropped'])
+        flow_recorder = None
+
+def record_flows(verdicts):
+    """Hand classified flows, as (key, fv, label, confidence), to the flow export."""
+    keys, rows, labels, confidences = zip(*verdicts)
+    try:
+        flow_recorder.record(keys, np.array(rows), labels, confidences, [is_malicious(label) for label in labels])
+    except Exception as e:
+        logging.error("Error recording %d flows for export: %s", len(keys), e)
+
+def is_malicious(label):
+    return str(label).lower() in ("attack", "malicious", "1", "true")
+
+def log_verdict(key, label, confidence, fv):
+    now = datetime.now()
+    ts = now.strftime("%Y-%m-%d %H:%M:%S")
+    msg = f"{ts} | Flow {format_flow_key(key)} => Label: {label} | Conf: {confidence} | Features: {fv.tolist()}"
+    if is_malicious(label):
+        logging.warning(msg)
+        if alert_sink is not None:
+            src, dst, sport, dport, proto = unpack_flow_key(key)
+            severity = 'high' if confidence is None or confidence >= 0.8 else 'medium'
+            conf = "n/a" if confidence is None else f"{confidence:.2f}"
+            alert_sink.submit(int_to_ip(src), int_to_ip(dst), proto, 'Malicious Flow', severity,
+                              f"Flow classifier label {label} (confidence {conf}) for "
+                              f"{format_flow_key(key)}, {int(fv[COL_PACKET_COUNT])} packets / {int(fv[COL_TOTAL_BYTES])} bytes",
+                              when=now)
+    else:
+        logging.info(msg)
+
+def log_connection_verdict(key, label, confidence, record):
+    """Like log_verdict, for a verdict of the NSL-KDD model on a flow's connection record."""
+    now = datetime.now()
+    conf = "n/a" if confidence is None else f"{confidence:.2f}"
+    msg = (f"{now.strftime('%Y-%m-%d %H:%M:%S')} | Connection {format_flow_key(key)} => NSL-KDD: {label} "
+           f"| Conf: {conf} | flag {record['flag']}, count {record['count']}, srv_count {record['srv_count']}, "
+           f"dst_host_count {record['dst_host_count']}")
+    if label == 'Normal':
+        logging.info(msg)
+        return
+    logging.warning(msg)
+    if alert_sink is not None:
+        src, dst, sport, dport, proto = unpack_flow_key(key)
+        severity = 'high' if confidence is None or confidence >= 0.8 else 'medium'
+        alert_sink.submit(int_to_ip(src), int_to_ip(dst), proto, f'NSL-KDD {label}', severity,
+                          f"NSL-KDD model label {label} (confidence {conf}) for {format_flow_key(key)}: "
+                          f"flag {record['flag']}, {record['count']} connections to the host and "
+                          f"{record['srv_count']} to the service in the last {traffic_windows.window_seconds:g}s",
+                          when=now)
+
+def classify_expired(now, on_verdict=log_verdict, latencies=None):
+    """
+    Pop the flows that are idle at `now` and classify them in batches.
+    Returns the number of flows classified.
+    """
+    # expired flows are already removed from the table
+    times = [] if kdd_model is not None else None
+    keys, X = flow_table.pop_expired(now, FLOW_TIMEOUT, times)
+    return classify_and_report(keys, X, on_verdict, latencies, times)
+
+def classify_and_report(keys, X, on_verdict=log_verdict, latencies=None, times=None):
+    if not keys:
+        return 0
+    verdicts = [] if flow_recorder is not None else None
+    try:
+        for key, label, confidence, fv in classify_flows(keys, X, latencies):
+            on_verdict(key, label, confidence, fv)
+            if verdicts is not None:
+                verdicts.append((key, fv, label, confidence))
+    except Exception as e:
+        logging.error("Error classifying %d flows: %s", len(keys), e)
+    if verdicts:
+        record_flows(verdicts)
+    if times is not None:
+        classify_connections(keys, X, np.concatenate(times))
+    return len(keys)
+
+def classify_connections(keys, X, times):
+    """Score finished flows (last packet timestamps in `times`) with the NSL-KDD model."""
+    try:
+        records, labels, confidences = kdd_features.score_connections(
+            kdd_model, traffic_windows, keys, X, times)
+        if confidences is None:
+            confidences = [None] * len(labels)
+        for (i, record), label, confidence in zip(records.iterrows(), labels, confidences):
+            log_connection_verdict(keys[i], label, None if confidence is None else float(confidence), record)
+    except Exception as e:
+        logging.error("Error scoring %d connections with the NSL-KDD model: %s", len(keys), e)
+
+def publish_status(classified):
+    """Counters for the dashboard's telemetry (ids/live_status.py); never stops the monitor."""
+    sink = alert_sink.stats() if alert_sink is not None else {}
+    try:
+        live_status.write_status(open_flows=len(flow_table), classified_flows=classified,
+                                 alerts_written=sink.get('written', 0), alerts_dropped=sink.get('dropped', 0))
+    except OSError as e:
+        logging.debug("Cannot publish live status: %s", e)
 
 def flow_monitor_loop():
     """
     Periodically check flows for inactivity and classify them.
     """
+    classified = 0
     while True:
-        now = time.time()
-        to_classify = []
-        with flows_lock:
-            for key, flow in list(flows.items()):
-                if now - flow['last_ts'] > FLOW_TIMEOUT:
-                    to_classify.append((key, flow.copy()))
-                    # remove from active flows
-                    del flows[key]
-        # classify outside lock
-        for key, flow in to_classify:
-            try:
-                label, confidence, fv = classify_flow(key, flow)
-                ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                msg = f"{ts} | Flow {key} => Label: {label} | Conf: {confidence} | Features: {fv}"
-                if str(label).lower() in ("attack", "malicious", "1", "true"):
-                    logging.warning(msg)
-                else:
-                    logging.info(msg)
-            except Exception as e:
-                logging.error("Error classifying flow %s: %s", key, e)
+        # classify outside the shard locks, all expired flows of this tick in batches
+        classified += classify_expired(time.time())
+        publish_status(classified)
         time.sleep(CLASSIFY_EVERY)
 
-def main():
+def raw_capture_loop(source):
+    """
+    Feed frames from a capture.RingCapture into the flow table. Headers are
+    decoded in place by capture.parse_frame.
+    """
+    linktype = source.linktype
+    parse_frame = capture.parse_frame
+    add_packet = flow_table.add_packet
+    for ts, frame, wire_len in source.frames():
+        parsed = parse_frame(frame, linktype)
+        if parsed is not None:
+            add_packet(parsed[0], ts, wire_len, parsed[1], FLOW_TIMEOUT)
+
+def replay_pcap(path, on_verdict=log_verdict, latencies=None):
+    """
+    Stream a pcap/pcapng file through the same flow table and classifier as
+    live capture, as fast as the file can be read. Packet timestamps are the
+    clock: expired flows are classified every CLASSIFY_EVERY seconds of
+    capture time, so FLOW_TIMEOUT expiry replays deterministically. Flows
+    still open at the end of the file are classified last.
+    Returns a dict with packet and flow counts.
+    """
+    source = capture.open_capture_file(path)
+    linktype = source.linktype
+    parse_frame = capture.parse_frame
+    add_packet = flow_table.add_packet
+    packets = frames = flows = 0
+    next_check = None
+    try:
+        for ts, frame, wire_len in source.frames():
+            frames += 1
+            if next_check is None:
+                next_check = ts + CLASSIFY_EVERY
+            elif ts >= next_check:
+                flows += classify_expired(ts, on_verdict, latencies)
+                next_check = ts + CLASSIFY_EVERY
+            parsed = parse_frame(frame, linktype)
+            if parsed is not None:
+                add_packet(parsed[0], ts, wire_len, parsed[1], FLOW_TIMEOUT)
+                packets += 1
+    finally:
+        source.close()
+    times = [] if kdd_model is not None else None
+    keys, X = flow_table.drain(times)
+    flows += classify_and_report(keys, X, on_verdict, latencies, times)
+    return {'frames': frames, 'packets': packets, 'flows': flows}
+
+def open_raw_source(args):
+    """Open the AF_PACKET ring selected on the command line."""
+    bpf = capture.compile_bpf(args.bpf, args.iface) if args.bpf else capture.BPF_IPV4_ONLY
+    return capture.RingCapture(iface=args.iface, bpf=bpf)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Real-time flow-based IDS")
+    parser.add_argument('--backend', choices=('auto', 'raw', 'scapy'), default='auto',
+                        help="raw: AF_PACKET ring with in-place header parsing; "
+                             "scapy: scapy sniff(); auto: raw, falling back to scapy")
+    parser.add_argument('--iface', default=None, help="interface to capture on (default: all)")
+    parser.add_argument('--bpf', default=None,
+                        help="tcpdump-style filter applied in the kernel (raw backend compiles it "
+                             "with tcpdump; default: IPv4 only)")
+    parser.add_argument('--pcap', default=None,
+                        help="replay a pcap/pcapng file offline instead of capturing live")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="run the multi-process pipeline with this many flow aggregation "
+                             "processes (raw capture or --pcap; 0: single process)")
+    parser.add_argument('--classifiers', type=int, default=1,
+                        help="classifier processes in pipeline mode")
+    parser.add_argument('--alert-db', default=alerts.DEFAULT_DB_PATH,
+                        help="SQLite database whose alert partitions receive malicious verdicts")
+    parser.add_argument('--alert-user', type=int, default=None,
+                        help="user id that owns stored alerts (default: first admin user)")
+    parser.add_argument('--no-alerts', action='store_true',
+                        help="only log verdicts, do not store alerts in the database")
+    parser.add_argument('--model', default=MODEL_PATH, help="trained model (joblib)")
+    parser.add_argument('--scaler', default=SCALER_PATH, help="fitted scaler (joblib)")
+    parser.add_argument('--kdd-model', default=None,
+                        help="also score every flow as an NSL-KDD connection with this model "
+                             "(trained on the /ids form's features; single-process mode only)")
+    parser.add_argument('--flow-export', default=None, metavar='DIR',
+                        help="also write every classified flow to columnar files in DIR/flows "
+                             "(Parquet, Arrow IPC or .npz; single-process mode only)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    alert_db = None if args.no_alerts else args.alert_db
+
+    if args.workers > 0:
+        if args.kdd_model:
+            # the windows need every connection in time order, the pipeline splits them by key
+            logging.warning("--kdd-model is ignored in pipeline mode")
+        if args.flow_export:
+            logging.warning("--flow-export is ignored in pipeline mode")
+        # each classifier process loads the model and opens its alert sink itself
+        t0 = time.perf_counter()
+        stats = pipeline.run_pipeline(args.workers, max(1, args.classifiers), args.model, args.scaler,
+                                      FLOW_TIMEOUT, CLASSIFY_EVERY,
+                                      pcap=args.pcap, iface=args.iface, bpf=args.bpf,
+                                      alert_db=alert_db, alert_user=args.alert_user)
+        logging.info("Pipeline processed %d packets / %d flows in %.2fs",
+                     stats['packets'], stats['flows'], time.perf_counter() - t0)
+        return
+
+    load_model(args.model, args.scaler)
+    if args.kdd_model:
+        load_kdd_model(args.kdd_model)
+    if alert_db:
+        start_alert_sink(alert_db, args.alert_user)
+    if args.flow_export:
+        start_flow_export(args.flow_export)
+    try:
+        run(args)
+    finally:
+        stop_flow_export()
+        stop_alert_sink()
+
+def run(args):
+    """Single-process replay or live capture, after the model is loaded."""
+    if args.pcap:
+        if args.bpf:
+            logging.warning("--bpf is ignored when replaying a capture file")
+        logging.info("Replaying %s...", args.pcap)
+        t0 = time.perf_counter()
+        stats = replay_pcap(args.pcap)
+        elapsed = time.perf_counter() - t0
+        logging.info("Replayed %d packets / %d flows in %.2fs (%.0f pkts/s, %.0f flows/s)",
+                     stats['packets'], stats['flows'], elapsed,
+                     stats['packets'] / elapsed, stats['flows'] / elapsed)
+        return
+
+    source = None
+    if args.backend in ('auto', 'raw'):
+        try:
+            source = open_raw_source(args)
+        except (OSError, AttributeError, ValueError, subprocess.CalledProcessError) as e:
+            # AttributeError: no socket.AF_PACKET outside Linux
+            if args.backend == 'raw':
+                logging.error("Raw capture unavailable: %s", e)
+                return
+            logging.warning("Raw capture unavailable (%s), falling back to scapy.", e)
+    if source is None and sniff is None:
+        logging.error("scapy is not installed; use --backend raw or --pcap.")
+        return
+
     logging.info("Starting flow monitor thread...")
     monitor_thread = threading.Thread(target=flow_monitor_loop, daemon=True)
     monitor_thread.start()
 
     logging.info("Starting packet sniffing (press Ctrl+C to stop)...")
     try:
-        # sniff on all interfaces; change iface param to restrict
-        sniff(prn=packet_handler, store=False)
+        if source is not None:
+            logging.info("Using raw capture backend.")
+            raw_capture_loop(source)
+        else:
+            # sniff on all interfaces unless --iface is given
+            sniff(prn=packet_handler, store=False, iface=args.iface, filter=args.bpf)
     except KeyboardInterrupt:
         logging.info("Stopping sniffing. Exiting.")
     except Exception as e:
         logging.error("Sniffing failed: %s", e)
+    finally:
+        if source is not None:
+            source.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,114 @@
+# ids/jobs.py
+"""
+In-process background jobs for long-running IDS analyses.
+
+A request hands the work to JobRunner.submit(), which records an
+AnalysisJob row and returns its id at once; a small thread pool runs the
+work inside an app context and writes status and progress back to the row,
+so any request (or a restarted browser) can poll it. At most
+MAX_CONCURRENT_JOBS analyses run at a time and at most MAX_PENDING_JOBS may
+be queued or running, so a burst of big uploads cannot take every worker
+the web server has.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from database.db import db, AnalysisJob
+
+MAX_CONCURRENT_JOBS = 2
+MAX_PENDING_JOBS = 8          # queued + running; further submissions are refused
+PROGRESS_MIN_INTERVAL = 1.0   # seconds between progress writes for one job
+
+
+class JobQueueFull(Exception):
+    """Raised by JobRunner.submit when MAX_PENDING_JOBS jobs are already pending."""
+
+
+class JobRunner:
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS, max_pending=MAX_PENDING_JOBS):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='ids-job')
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def submit(self, app, user_id, func, *args, kind='pcap', filename=None):
+        """
+        Queue func(*args, progress=callback) and return the new job id. func
+        returns (flows, alerts); callback(fraction, flows, alerts) may be
+        called as it goes. Raises JobQueueFull.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} analyses already queued or running")
+            self._pending += 1
+        try:
+            job = AnalysisJob(id=uuid.uuid4().hex, user_id=user_id, kind=kind, filename=filename)
+            db.session.add(job)
+            db.session.commit()
+            self._executor.submit(self._run, app, job.id, func, args)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return job.id
+
+    def _run(self, app, job_id, func, args):
+        try:
+            with app.app_context():
+                job = db.session.get(AnalysisJob, job_id)
+                job.status = 'running'
+                job.started_at = datetime.now()
+                db.session.commit()
+                try:
+                    flows, alerts = func(*args, progress=_ProgressWriter(job_id))
+                except Exception as e:
+                    logging.exception("Job %s failed", job_id)
+                    db.session.rollback()
+                    job = db.session.get(AnalysisJob, job_id)
+                    job.status = 'failed'
+                    job.error = str(e)
+                else:
+                    job = db.session.get(AnalysisJob, job_id)
+                    job.status = 'done'
+                    job.progress = 1.0
+                    job.flows = flows
+                    job.alerts = alerts
+                job.finished_at = datetime.now()
+                db.session.commit()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+class _ProgressWriter:
+    """Progress callback that stores at most one update per PROGRESS_MIN_INTERVAL."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._last = 0.0
+
+    def __call__(self, fraction, flows, alerts):
+        now = time.monotonic()
+        if now - self._last < PROGRESS_MIN_INTERVAL:
+            return
+        self._last = now
+        db.session.query(AnalysisJob).filter_by(id=self.job_id).update(
+            {'progress': min(fraction, 1.0), 'flows': flows, 'alerts': alerts})
+        db.session.commit()
+
+
+def fail_interrupted_jobs():
+    """Mark jobs left queued/running by a previous server process as failed."""
+    count = (db.session.query(AnalysisJob)
+             .filter(AnalysisJob.status.in_(('queued', 'running')))
+             .update({'status': 'failed', 'error': 'interrupted by server restart',
+                      'finished_at': datetime.now()}, synchronize_session=False))
+    db.session.commit()
+    return count
+
+
+runner = JobRunner()
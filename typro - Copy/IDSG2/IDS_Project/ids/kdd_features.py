@@ -0,0 +1,205 @@
+# ids/kdd_features.py
+"""
+Streaming NSL-KDD traffic features for live connections.
+
+The /ids form and the batch API (FEATURE_FIELDS in ids/detection.py) score
+NSL-KDD connection records, whose last twelve fields aggregate the traffic
+seen before the connection:
+
+    time window: connections of the last WINDOW_SECONDS seconds
+        count, srv_count, serror_rate, rerror_rate, same_srv_rate,
+        diff_srv_rate, srv_diff_host_rate
+    host window: the last HOST_WINDOW connections
+        dst_host_count, dst_host_srv_count, dst_host_diff_srv_rate,
+        dst_host_same_src_port_rate, dst_host_srv_diff_host_rate
+
+TrafficWindows keeps both windows as ring buffers of small connection
+tuples plus running counters per destination host, per service, per
+(host, service) pair and per (host, source port) pair. Adding a connection counts it in and counts out every
+connection that falls out of a window, so an update is O(1) (amortized for
+the time window) and no history is ever rescanned. Both windows include the
+connection being added, and rates are rounded to two decimals like in the
+NSL-KDD files. A service is the (protocol, destination port) pair.
+
+connection_records() turns flows finished by the live IDS (ids/flow_table.py)
+into such records. Flow counters describe one direction of a 5-tuple and
+carry no payload, so src_bytes is the flow's byte count and dst_bytes 0, the
+flag is derived from the SYN/ACK/FIN counts (RSTs are not counted, so REJ
+never occurs and rerror_rate stays 0 for live flows) and the content
+features (hot, num_failed_logins, ...) are 0.
+"""
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from ids.detection import FEATURE_FIELDS
+from ids.flow_table import (COL_ACK, COL_DURATION, COL_FIN, COL_SYN, COL_TOTAL_BYTES,
+                            unpack_flow_key)
+from ids.predict_api import build_matrix, predict_batch
+
+WINDOW_SECONDS = 2.0   # time window of count/srv_count and their rates
+HOST_WINDOW = 100      # connections in the dst_host_* window
+
+WINDOW_FIELDS = FEATURE_FIELDS[FEATURE_FIELDS.index('count'):]
+# fields between land and count describe payload, which flows do not see
+_CONTENT_FIELDS = FEATURE_FIELDS[FEATURE_FIELDS.index('land') + 1:FEATURE_FIELDS.index('count')]
+
+PROTOCOL_TYPES = {6: 'tcp', 17: 'udp', 1: 'icmp'}
+SERROR_FLAGS = frozenset(('S0', 'S1', 'S2', 'S3'))
+RERROR_FLAGS = frozenset(('REJ',))
+
+
+def _inc(counts, key):
+    counts[key] = counts.get(key, 0) + 1
+
+
+def _dec(counts, key):
+    n = counts[key] - 1
+    if n:
+        counts[key] = n
+    else:
+        del counts[key]   # keeps the counters as small as the windows
+
+
+def _rate(part, whole):
+    return round(part / whole, 2) if whole else 0.0
+
+
+class TrafficWindows:
+    """Running NSL-KDD time and host window counters over a stream of connections."""
+
+    def __init__(self, window_seconds=WINDOW_SECONDS, host_window=HOST_WINDOW):
+        self.window_seconds = window_seconds
+        self.latest = float('-inf')
+        # time window: (ts, dst, service, serror, rerror) oldest first
+        self._recent = deque()
+        self._t_host = {}
+        self._t_srv = {}
+        self._t_host_srv = {}
+        self._t_serror = {}      # per dst host
+        self._t_rerror = {}      # per dst host
+        # host window: fixed ring of (dst, service, sport), next slot to overwrite
+        self._ring = [None] * host_window
+        self._pos = 0
+        self._h_host = {}
+        self._h_srv = {}
+        self._h_host_srv = {}
+        self._h_host_sport = {}
+
+    def add(self, ts, dst, service, sport, flag):
+        """
+        Count one connection in and return its window features as a tuple in
+        WINDOW_FIELDS order. Connections should arrive in time order; a
+        slightly late one is placed at the newest time seen so far.
+        """
+        self.latest = now = max(ts, self.latest)
+        serror = flag in SERROR_FLAGS
+        rerror = flag in RERROR_FLAGS
+        host_srv = (dst, service)
+
+        # time window: expire from the old end, then append
+        recent = self._recent
+        horizon = now - self.window_seconds
+        while recent and recent[0][0] <= horizon:
+            _, old_dst, old_srv, old_serror, old_rerror = recent.popleft()
+            _dec(self._t_host, old_dst)
+            _dec(self._t_srv, old_srv)
+            _dec(self._t_host_srv, (old_dst, old_srv))
+            if old_serror:
+                _dec(self._t_serror, old_dst)
+            if old_rerror:
+                _dec(self._t_rerror, old_dst)
+        recent.append((now, dst, service, serror, rerror))
+        _inc(self._t_host, dst)
+        _inc(self._t_srv, service)
+        _inc(self._t_host_srv, host_srv)
+        if serror:
+            _inc(self._t_serror, dst)
+        if rerror:
+            _inc(self._t_rerror, dst)
+
+        # host window: overwrite the oldest slot
+        old = self._ring[self._pos]
+        if old is not None:
+            old_dst, old_srv, old_sport = old
+            _dec(self._h_host, old_dst)
+            _dec(self._h_srv, old_srv)
+            _dec(self._h_host_srv, (old_dst, old_srv))
+            _dec(self._h_host_sport, (old_dst, old_sport))
+        self._ring[self._pos] = (dst, service, sport)
+        self._pos = (self._pos + 1) % len(self._ring)
+        _inc(self._h_host, dst)
+        _inc(self._h_srv, service)
+        _inc(self._h_host_srv, host_srv)
+        _inc(self._h_host_sport, (dst, sport))
+
+        count = self._t_host[dst]
+        srv_count = self._t_srv[service]
+        same_srv = self._t_host_srv[host_srv]
+        dst_host_count = self._h_host[dst]
+        dst_host_srv_count = self._h_srv[service]
+        dst_host_same_srv = self._h_host_srv[host_srv]
+        return (
+            count,
+            srv_count,
+            _rate(self._t_serror.get(dst, 0), count),
+            _rate(self._t_rerror.get(dst, 0), count),
+            _rate(same_srv, count),
+            _rate(count - same_srv, count),
+            _rate(srv_count - same_srv, srv_count),
+            dst_host_count,
+            dst_host_srv_count,
+            _rate(dst_host_count - dst_host_same_srv, dst_host_count),
+            _rate(self._h_host_sport[(dst, sport)], dst_host_count),
+            _rate(dst_host_srv_count - dst_host_same_srv, dst_host_srv_count),
+        )
+
+
+def connection_flag(protocol, syn, ack, fin):
+    """NSL-KDD connection flag from one flow direction's TCP flag counts."""
+    if protocol != 6:
+        return 'SF'
+    if syn and not ack:
+        return 'S0'    # connection attempt, never established
+    if syn:
+        return 'SF' if fin else 'S1'
+    return 'OTH'       # picked up mid-connection
+
+
+def connection_records(windows, keys, X, times):
+    """
+    NSL-KDD records (a DataFrame with FEATURE_FIELDS columns, protocol_type
+    and flag as strings) for finished flows: keys and X as returned by
+    FlowTable.pop_expired, times their last packet timestamps. Flows are fed
+    to `windows` in time order. Protocols other than TCP/UDP/ICMP are left
+    out; the frame index is the position of each record's flow in keys.
+    """
+    rows, index = [], []
+    zeros = (0,) * len(_CONTENT_FIELDS)
+    for i in np.argsort(times, kind='stable').tolist():
+        src, dst, sport, dport, proto = unpack_flow_key(keys[i])
+        protocol_type = PROTOCOL_TYPES.get(proto)
+        if protocol_type is None:
+            continue
+        fv = X[i]
+        flag = connection_flag(proto, fv[COL_SYN], fv[COL_ACK], fv[COL_FIN])
+        land = int(src == dst and sport == dport)
+        window = windows.add(float(times[i]), dst, (proto, dport), sport, flag)
+        rows.append((int(fv[COL_DURATION]), protocol_type, flag, int(fv[COL_TOTAL_BYTES]), 0, land)
+                    + zeros + window)
+        index.append(i)
+    return pd.DataFrame.from_records(rows, index=index, columns=FEATURE_FIELDS)
+
+
+def score_connections(model, windows, keys, X, times):
+    """
+    Classify finished flows with an NSL-KDD model (the /ids form's model).
+    Returns (records, labels, confidences); confidences is None if the model
+    has no predict_proba.
+    """
+    records = connection_records(windows, keys, X, times)
+    if records.empty:
+        return records, [], None
+    labels, confidences = predict_batch(model, build_matrix(records))
+    return records, labels, confidences
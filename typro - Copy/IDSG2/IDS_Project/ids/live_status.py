@@ -0,0 +1,37 @@
+# ids/live_status.py
+"""
+Status of the live IDS for other processes.
+
+The live IDS (ids/ids.py) runs outside the web app, so it publishes a few
+counters once per classification tick in a small JSON file that the
+dashboard's telemetry collector (dashboard/telemetry.py) reads at its own
+sampling interval. The file is replaced atomically, so readers never see
+a partial write; a status older than max_age seconds means the IDS is not
+running.
+"""
+import json
+import os
+import time
+
+STATUS_PATH = "instance/ids_live.json"
+MAX_AGE = 10.0     # seconds after which a status is stale
+
+
+def write_status(path=STATUS_PATH, **values):
+    """Publish values (JSON-serialisable) with the current time."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(dict(values, time=time.time(), pid=os.getpid()), f)
+    os.replace(tmp, path)
+
+
+def read_status(path=STATUS_PATH, max_age=MAX_AGE):
+    """The last published status dict, or None if there is none or it is stale."""
+    try:
+        with open(path) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - status.get('time', 0) > max_age:
+        return None
+    return status
@@ -0,0 +1,174 @@
+# ids/model_registry.py
+"""
+One shared registry for the model artifacts used by the web app.
+
+Blueprints register their files under a name at import time and fetch the
+loaded object with registry.get(name); app.py preloads everything at
+startup, so no request pays for an unpickle.
+
+Forests registered with compile=True are converted once to
+ids.forest.CompiledForest and written to a cache file under CACHE_DIR.
+Every process then loads that file with joblib mmap_mode='r', so the
+node arrays are shared through the page cache instead of one private copy
+per gunicorn worker.
+
+A watcher thread stats the registered files every check_every seconds and
+loads a changed file in the background. The new object replaces the old
+one in a single reference assignment: requests never wait for a reload and
+never take a lock, they just see the old or the new model. If loading fails
+(e.g. a half-copied file), the old model stays in place and the load is
+retried on the next check. Deploy new models with an atomic rename.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import joblib
+
+from ids.forest import CompiledForest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(PROJECT_ROOT, 'instance', 'model_cache')
+CHECK_EVERY = 5.0     # seconds between file checks of the watcher
+
+
+def _stamp(path):
+    """Identity of the file's current contents, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class _Entry:
+    __slots__ = ('path', 'compile', 'current', 'failed', 'lock')
+
+    def __init__(self, path, compile):
+        self.path = path
+        self.compile = compile
+        self.current = (None, None)   # (object, stamp), replaced as one tuple
+        self.failed = None            # stamp of the last version that failed to load
+        self.lock = threading.Lock()  # serializes loaders only, never readers
+
+
+class ModelRegistry:
+    def __init__(self, cache_dir=CACHE_DIR, check_every=CHECK_EVERY):
+        self.cache_dir = cache_dir
+        self.check_every = check_every
+        self._entries = {}
+        self._watcher = None
+
+    def register(self, name, path, compile=False):
+        """Declare an artifact. compile=True turns fitted forests into CompiledForest."""
+        entry = self._entries.get(name)
+        if entry is None or entry.path != path or entry.compile != compile:
+            self._entries[name] = _Entry(path, compile)
+
+    def get(self, name):
+        """The loaded object, or None if its file is missing or unloadable."""
+        entry = self._entries[name]
+        obj, stamp = entry.current
+        if stamp is None:
+            # not preloaded (e.g. scripts without app startup): load on first use
+            self._load(entry)
+            obj = entry.current[0]
+        return obj
+
+    def put(self, name, obj):
+        """Install an in-memory object (benchmarks, tests); the watcher leaves it alone."""
+        entry = self._entries.setdefault(name, _Entry(None, False))
+        entry.current = (obj, 'put')
+
+    def preload(self):
+        for entry in self._entries.values():
+            self._load(entry)
+
+    def reload_changed(self):
+        """Reload every artifact whose file changed since it was loaded; returns their names."""
+        changed = []
+        for name, entry in list(self._entries.items()):
+            stamp = entry.current[1]
+            if stamp == 'put' or entry.path is None:
+                continue
+            if _stamp(entry.path) != stamp and self._load(entry):
+                changed.append(name)
+        return changed
+
+    def start_watcher(self):
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name='ids-model-watcher', daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.check_every)
+            try:
+                for name in self.reload_changed():
+                    logging.info("Model registry: reloaded %s", name)
+            except Exception:
+                logging.exception("Model registry watcher failed")
+
+    def _load(self, entry):
+        """Load entry.path and swap it in. Returns True if a new object was installed."""
+        with entry.lock:
+            stamp = _stamp(entry.path)
+            if stamp is None:
+                if entry.current[1] is None:
+                    entry.current = (None, 'missing')
+                return False
+            if stamp == entry.current[1] or stamp == entry.failed:
+                return False   # already loaded (by another thread), or known to be broken
+            try:
+                obj = self._load_compiled(entry.path, stamp) if entry.compile else \
+                    joblib.load(entry.path, mmap_mode='r')
+            except Exception as e:
+                logging.error("Model registry: failed to load %s: %s", entry.path, e)
+                entry.failed = stamp
+                return False
+            entry.current = (obj, stamp)
+            return True
+
+    def _cache_path(self, path, stamp):
+        key = hashlib.sha1(f"{os.path.abspath(path)}|{stamp[0]}|{stamp[1]}".encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{os.path.basename(path)}.{key}.compiled")
+
+    def _load_compiled(self, path, stamp):
+        cache = self._cache_path(path, stamp)
+        if not os.path.exists(cache):
+            model = joblib.load(path)
+            try:
+                compiled = CompiledForest(model)
+            except (AttributeError, ValueError):
+                return model   # not a forest classifier: serve it as is
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f"{cache}.{os.getpid()}.tmp"
+            joblib.dump(compiled, tmp)   # uncompressed, so it can be memory-mapped
+            try:
+                # link, not replace: a worker that raced us may already map its
+                # file, and every worker must end up on the same inode
+                os.link(tmp, cache)
+            except FileExistsError:
+                pass
+            finally:
+                os.unlink(tmp)
+            self._remove_stale(path, cache)
+        compiled = joblib.load(cache, mmap_mode='r')
+        compiled.source_path = path
+        return compiled
+
+    def _remove_stale(self, path, keep):
+        """Drop cache files of older versions of path (open mappings stay valid)."""
+        prefix = os.path.basename(path) + '.'
+        for name in os.listdir(self.cache_dir):
+            full = os.path.join(self.cache_dir, name)
+            if name.startswith(prefix) and name.endswith('.compiled') and full != keep:
+                try:
+                    os.unlink(full)
+                except OSError:
+                    pass
+
+
+registry = ModelRegistry()
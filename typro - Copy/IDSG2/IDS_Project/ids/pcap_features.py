@@ -0,0 +1,168 @@
+# ids/pcap_features.py
+"""
+Offline pcap/pcapng -> flow feature extraction for uploaded captures.
+
+The file is streamed with ids.capture (large buffered reads, header fields
+decoded in place) and packets are collected into fixed-size NumPy chunks.
+Each chunk, together with the flows still open from earlier chunks, is
+reduced to flows with one sort and one pandas groupby. Flows follow the
+live flow table's rules (ids/flow_table.py): a 5-tuple silent for more
+than flow_timeout expires, and its next packet starts a new flow. Flows
+idle for flow_timeout at the end of a chunk are finished and yielded, so
+memory is bounded by the chunk size plus the number of concurrently active
+flows, not by the size of the capture.
+
+Features use the same FEATURE_ORDER and definitions as the live IDS
+(FlowShard.features, durations floored at 1e-6 s), so the same model.pkl /
+scaler.pkl can classify them.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from ids import capture
+from ids.flow_table import FEATURE_ORDER, KEY_LO_BITS, KEY_LO_MASK
+
+CHUNK_PACKETS = 262144     # packets per groupby chunk
+FLOW_TIMEOUT = 2.0         # seconds of capture time before a flow is finished
+
+_AGG = {
+    'key_hi': 'first',
+    'key_lo': 'first',
+    'first_ts': 'min',
+    'last_ts': 'max',
+    'total_bytes': 'sum',
+    'packet_count': 'sum',
+    'syn_count': 'sum',
+    'ack_count': 'sum',
+    'fin_count': 'sum',
+}
+
+
+def _packet_chunks(path, chunk_packets, progress=None):
+    """
+    Yield dicts of column arrays holding up to chunk_packets decoded packets.
+    progress(bytes_read, file_size) is called after every chunk.
+    """
+    source = capture.open_capture_file(path)
+    file_size = os.path.getsize(path)
+    parse_frame = capture.parse_frame
+    linktype = source.linktype
+    key_hi = np.empty(chunk_packets, np.uint64)
+    key_lo = np.empty(chunk_packets, np.uint64)
+    ts = np.empty(chunk_packets, np.float64)
+    length = np.empty(chunk_packets, np.uint32)
+    flags = np.empty(chunk_packets, np.uint8)
+    n = 0
+    try:
+        for frame_ts, frame, wire_len in source.frames():
+            parsed = parse_frame(frame, linktype)
+            if parsed is None:
+                continue
+            key = parsed[0]
+            key_hi[n] = key >> KEY_LO_BITS
+            key_lo[n] = key & KEY_LO_MASK
+            ts[n] = frame_ts
+            length[n] = wire_len
+            flags[n] = parsed[1] & 0xFF
+            n += 1
+            if n == chunk_packets:
+                yield {'key_hi': key_hi, 'key_lo': key_lo, 'ts': ts, 'length': length, 'flags': flags}
+                n = 0
+                if progress is not None:
+                    progress(source.bytes_read, file_size)
+    finally:
+        source.close()
+    if n:
+        yield {'key_hi': key_hi[:n], 'key_lo': key_lo[:n], 'ts': ts[:n],
+               'length': length[:n], 'flags': flags[:n]}
+    if progress is not None:
+        progress(file_size, file_size)
+
+
+def _packet_rows(chunk):
+    """One row of flow counters per packet of a chunk (no per-packet Python)."""
+    flags = chunk['flags']
+    packets = pd.DataFrame({
+        'key_hi': chunk['key_hi'],
+        'key_lo': chunk['key_lo'],
+        'first_ts': chunk['ts'],
+        'last_ts': chunk['ts'],
+        'total_bytes': chunk['length'].astype(np.int64),
+        'packet_count': np.ones(len(flags), np.int64),
+        # SYN = 0x02, ACK = 0x10, FIN = 0x01, as in the live IDS
+        'syn_count': (flags & 0x02 != 0).astype(np.int64),
+        'ack_count': (flags & 0x10 != 0).astype(np.int64),
+        'fin_count': (flags & 0x01 != 0).astype(np.int64),
+    })
+    return packets
+
+
+def _split_flows(rows, flow_timeout):
+    """
+    Merge rows of flow counters (packets, and flows still open) into flows:
+    rows of one 5-tuple belong to one flow until a gap of more than
+    flow_timeout. Returns (flows, last), the flows ordered by key and time
+    and a boolean array marking the last flow of each key.
+    """
+    key_hi = rows['key_hi'].to_numpy()
+    key_lo = rows['key_lo'].to_numpy()
+    order = np.lexsort((rows['first_ts'].to_numpy(), key_lo, key_hi))
+    key_hi, key_lo = key_hi[order], key_lo[order]
+    first_ts = rows['first_ts'].to_numpy()[order]
+    last_ts = rows['last_ts'].to_numpy()[order]
+    new_key = np.ones(len(order), bool)
+    new_key[1:] = (key_hi[1:] != key_hi[:-1]) | (key_lo[1:] != key_lo[:-1])
+    new_flow = new_key.copy()
+    new_flow[1:] |= first_ts[1:] - last_ts[:-1] > flow_timeout
+    flows = rows.iloc[order].groupby(np.cumsum(new_flow), sort=True).agg(_AGG)
+    return flows, np.append(new_key[new_flow][1:], True)
+
+
+def _features(flows):
+    """Turn merged flow counters into a DataFrame of src/dst plus FEATURE_ORDER columns."""
+    key_hi = flows['key_hi'].to_numpy(np.uint64)
+    key_lo = flows['key_lo'].to_numpy(np.uint64)
+    packet_count = flows['packet_count'].to_numpy(np.float64)
+    total_bytes = flows['total_bytes'].to_numpy(np.float64)
+    columns = {
+        'duration': np.maximum(0.000001, (flows['last_ts'] - flows['first_ts']).to_numpy()),
+        'total_bytes': total_bytes,
+        'packet_count': packet_count,
+        'avg_pkt_len': total_bytes / packet_count,
+        'src_port': ((key_lo >> np.uint64(24)) & np.uint64(0xFFFF)).astype(np.float64),
+        'dst_port': ((key_lo >> np.uint64(8)) & np.uint64(0xFFFF)).astype(np.float64),
+        'protocol': (key_lo & np.uint64(0xFF)).astype(np.float64),
+        'syn_count': flows['syn_count'].to_numpy(np.float64),
+        'ack_count': flows['ack_count'].to_numpy(np.float64),
+        'fin_count': flows['fin_count'].to_numpy(np.float64),
+    }
+    frame = pd.DataFrame({name: columns[name] for name in FEATURE_ORDER})
+    frame.insert(0, 'src', (key_hi >> np.uint64(32)).astype(np.uint32))
+    frame.insert(1, 'dst', (key_hi & np.uint64(0xFFFFFFFF)).astype(np.uint32))
+    return frame
+
+
+def iter_flow_features(path, chunk_packets=CHUNK_PACKETS, flow_timeout=FLOW_TIMEOUT, progress=None):
+    """
+    Stream a capture file and yield DataFrames of finished flows: columns
+    'src', 'dst' (IPv4 as uint32) followed by FEATURE_ORDER. A 5-tuple that
+    goes idle for more than flow_timeout and then reappears is a new flow,
+    wherever the chunk boundaries fall. progress(bytes_read, file_size) is
+    called as the file is consumed.
+    """
+    open_flows = None
+    for chunk in _packet_chunks(path, chunk_packets, progress):
+        rows = _packet_rows(chunk)
+        if open_flows is not None and not open_flows.empty:
+            rows = pd.concat([open_flows, rows], ignore_index=True)
+        flows, last = _split_flows(rows, flow_timeout)
+        # a flow followed by another of its key has ended; so has one idle at the chunk's end
+        cutoff = float(chunk['ts'].max()) - flow_timeout
+        finished = ~last | (flows['last_ts'].to_numpy() < cutoff)
+        if finished.any():
+            yield _features(flows[finished])
+        open_flows = flows[~finished]
+    if open_flows is not None and not open_flows.empty:
+        yield _features(open_flows)
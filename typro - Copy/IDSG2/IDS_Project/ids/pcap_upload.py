@@ -0,0 +1,223 @@
+# ids/pcap_upload.py
+"""
+/ids/ pages for capture files: upload a pcap for background analysis
+(ids/jobs.py), follow its job, and browse, export or clear the alerts
+it stored.
+"""
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify, current_app
+from flask_login import login_required, current_user
+from werkzeug.utils import secure_filename
+from datetime import datetime, timedelta
+import numpy as np
+import os
+import uuid
+from database import alerts as alert_store
+from database import alert_export
+from database.db import db, AnalysisJob
+from ids.jobs import runner, JobQueueFull
+from ids.flow_table import FEATURE_ORDER
+from ids.pcap_features import iter_flow_features
+from ids.model_registry import registry
+
+upload_bp = Blueprint('ids_upload', __name__, url_prefix='/ids')
+
+# Flow model and scaler shared with the live IDS (trained on FEATURE_ORDER), in the project root
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.path.join(PROJECT_DIR, 'model.pkl')
+SCALER_PATH = os.path.join(PROJECT_DIR, 'scaler.pkl')
+UPLOAD_DIR = 'uploads'
+LOGS_PAGE = 50         # alerts per /logs page
+LOGS_MAX_PAGE = 500
+CHART_DAYS = 30        # days of the dashboard's alerts-per-day table
+
+_PROTOCOL_NAMES = {1: 'ICMP', 6: 'TCP', 17: 'UDP'}
+_ATTACK_LABELS = ('attack', 'malicious', '1', 'true')
+
+registry.register('flow.model', MODEL_PATH, compile=True)
+registry.register('flow.scaler', SCALER_PATH)
+
+def load_model():
+    """Shared flow model and scaler (ids/model_registry.py). Raises OSError if missing."""
+    model, scaler = registry.get('flow.model'), registry.get('flow.scaler')
+    if model is None or scaler is None:
+        raise OSError(f"flow model not available: place {MODEL_PATH} and {SCALER_PATH}")
+    return model, scaler
+
+def analyze_pcap(file_path, user_id, progress=None):
+    """
+    Classify every flow of a capture file and store an alert per attack flow
+    (database.alerts.insert_alerts). Features are computed chunk by chunk (ids.pcap_features),
+    the model runs once per chunk and each chunk is one insert per day
+    partition in its own transaction. progress(fraction, flows, alerts) is
+    called after every chunk. Returns (flows, alerts).
+    """
+    model, scaler = load_model()
+    now = datetime.now()
+    flows = alerts = 0
+    read = [0.0]
+
+    def on_read(bytes_read, file_size):
+        read[0] = bytes_read / file_size if file_size else 1.0
+
+    for chunk in iter_flow_features(file_path, progress=on_read):
+        preds = model.predict(scaler.transform(chunk[FEATURE_ORDER].to_numpy()))
+        attack = np.isin(np.char.lower(preds.astype(str)), _ATTACK_LABELS)
+        flows += len(chunk)
+        if not attack.any():
+            if progress is not None:
+                progress(read[0], flows, alerts)
+            continue
+        hits = chunk[attack]
+        rows = [
+            {
+                'timestamp': now,
+                'source_ip': src,
+                'destination_ip': dst,
+                'protocol': _PROTOCOL_NAMES.get(proto, str(proto)),
+                'alert_type': 'Malicious Flow',
+                'severity': 'high',
+                'description': f"{int(packets)} packets / {int(size)} bytes, "
+                               f"port {int(sport)} -> {int(dport)} ({os.path.basename(file_path)})",
+                'user_id': user_id,
+            }
+            for src, dst, proto, sport, dport, packets, size in zip(
+                hits['src'].tolist(), hits['dst'].tolist(), hits['protocol'].astype(int).tolist(),
+                hits['src_port'].tolist(), hits['dst_port'].tolist(),
+                hits['packet_count'].tolist(), hits['total_bytes'].tolist())
+        ]
+        alert_store.insert_alerts(db.session.connection(), rows)
+        db.session.commit()
+        alert_store.notify_changed()
+        alerts += len(rows)
+        if progress is not None:
+            progress(read[0], flows, alerts)
+    return flows, alerts
+
+def _wants_json():
+    # API clients ask for JSON; the upload form gets flash + redirect
+    return request.accept_mimetypes.best == 'application/json'
+
+@upload_bp.route('/', methods=['GET'])
+@login_required
+def dashboard():
+    user_id = current_user.id
+    conn = db.session.connection()
+    total_alerts = alert_store.count_alerts(conn, user_id)
+    severe_alerts = alert_store.count_alerts(conn, user_id, 'high')
+    recent_alerts = alert_store.recent_alerts(conn, 10, user_id)
+    last_scan_time = recent_alerts[0].timestamp if recent_alerts else "Never"
+    # alerts per day and severity: one GROUP BY per day partition, never the alerts themselves
+    since = datetime.combine(datetime.now().date() - timedelta(days=CHART_DAYS - 1), datetime.min.time())
+    chart_data = alert_store.bucket_counts(conn, since, 'day', user_id)
+    return render_template('ids_dashboard.html',
+        total_alerts=total_alerts,
+        severe_alerts=severe_alerts,
+        last_scan_time=last_scan_time,
+        recent_alerts=recent_alerts,
+        chart_data=chart_data
+    )
+
+@upload_bp.route('/run', methods=['POST'])
+@login_required
+def run_ids():
+    file = request.files.get('pcap_file')
+    if not file:
+        flash('No file uploaded.', 'danger')
+        return redirect(url_for('ids_upload.dashboard'))
+    filename = secure_filename(file.filename)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    # unique name: several uploads of the same file may be queued at once
+    file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}_{filename}")
+    file.save(file_path)   # streamed to disk, never held in memory
+    try:
+        job_id = runner.submit(current_app._get_current_object(), current_user.id,
+                               analyze_pcap, file_path, current_user.id, filename=filename)
+    except JobQueueFull as e:
+        os.remove(file_path)
+        if _wants_json():
+            return jsonify({'error': f'Too many analyses pending: {e}'}), 429
+        flash('Too many analyses are already running, try again later.', 'danger')
+        return redirect(url_for('ids_upload.dashboard'))
+    if _wants_json():
+        return jsonify({
+            'job_id': job_id,
+            'status_url': url_for('ids_upload.job_status', job_id=job_id),
+            'progress_url': url_for('ids_upload.job_progress', job_id=job_id),
+        }), 202
+    flash(f'Capture queued for analysis (job {job_id}).', 'success')
+    return redirect(url_for('ids_upload.dashboard'))
+
+@upload_bp.route('/jobs', methods=['GET'])
+@login_required
+def jobs():
+    recent = (AnalysisJob.query.filter_by(user_id=current_user.id)
+              .order_by(AnalysisJob.created_at.desc()).limit(50).all())
+    return jsonify([job.to_dict() for job in recent])
+
+@upload_bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    job = AnalysisJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return jsonify(job.to_dict())
+
+@upload_bp.route('/jobs/<job_id>/progress', methods=['GET'])
+@login_required
+def job_progress(job_id):
+    job = AnalysisJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return jsonify({'status': job.status, 'progress': round(job.progress, 4),
+                    'flows': job.flows, 'alerts': job.alerts})
+
+def _format_cursor(cursor):
+    return None if cursor is None else f"{cursor[0].isoformat()}_{cursor[1]}"
+
+def _parse_cursor(value):
+    """(timestamp, id) from ?after=; raises ValueError."""
+    timestamp, alert_id = value.rsplit('_', 1)
+    return datetime.fromisoformat(timestamp), int(alert_id)
+
+@upload_bp.route('/logs', methods=['GET'])
+@login_required
+def logs():
+    """One page of the user's alerts, newest first; ?after= is the previous page's next_cursor."""
+    limit = max(1, min(request.args.get('limit', LOGS_PAGE, type=int), LOGS_MAX_PAGE))
+    after = request.args.get('after')
+    try:
+        after = _parse_cursor(after) if after else None
+    except ValueError:
+        return jsonify({'error': 'invalid cursor'}), 400
+    alerts, cursor = alert_store.alert_page(db.session.connection(), current_user.id, after, limit)
+    next_cursor = _format_cursor(cursor)
+    if _wants_json():
+        return jsonify({'alerts': [alert_export.alert_record(a) for a in alerts], 'next_cursor': next_cursor})
+    return render_template('ids_logs.html', alerts=alerts, next_cursor=next_cursor)
+
+@upload_bp.route('/clear', methods=['POST'])
+@login_required
+def clear_logs():
+    user_id = current_user.id
+    if alert_store.delete_user_alerts(db.session.connection(), user_id):
+        db.session.commit()
+        alert_store.notify_changed()
+    flash('IDS logs cleared.', 'success')
+    return redirect(url_for('ids_upload.dashboard'))
+
+@upload_bp.route('/export', methods=['GET'])
+@login_required
+def export_logs():
+    """
+    All of the user's alerts as a download, streamed in batches
+    (database/alert_export.py): ?format=json (default), ndjson or csv,
+    &gzip=1 to compress.
+    """
+    fmt = request.args.get('format', 'json')
+    if fmt not in alert_export.FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(alert_export.FORMATS)}"}), 400
+    compress = request.args.get('gzip', '0') in ('1', 'true')
+    mimetype, extension = alert_export.FORMATS[fmt]
+    filename = f"ids_logs_{current_user.username}.{extension}"
+    if compress:
+        mimetype, filename = 'application/gzip', filename + '.gz'
+    # no stream_with_context: the export has its own connection, the session is released now
+    chunks = alert_export.export_chunks(db.engine, fmt, current_user.id, compress)
+    return Response(chunks, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
\ No newline at end of file
@@ -0,0 +1,338 @@
+# ids/pipeline.py
+"""
+Multi-process capture/classify pipeline for the flow IDS.
+
+    capture process --(packets, routed by flow key hash)--> N aggregation workers
+    aggregation workers --(finished flow batches)--> classifier pool
+
+Each stage runs in its own process, so capture, flow bookkeeping and model
+inference no longer share one GIL. Packet and flow records travel through
+shared-memory slabs; the multiprocessing queues only carry slab numbers, and
+a fixed number of slabs per queue gives backpressure all the way back to the
+capture socket.
+
+Ctrl+C stops the capture process; every later stage then drains what it
+holds (aggregators classify their open flows) before exiting. If an
+aggregation or classifier process dies (e.g. the model fails to load), no
+slabs come back to the stages before it, so the parent stops every process
+and exits with an error instead of waiting on them forever.
+"""
+import logging
+import multiprocessing as mp
+import queue
+import signal
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ids import capture
+from ids.flow_table import FlowTable, KEY_LO_BITS, KEY_LO_MASK, N_FEATURES
+
+PACKET_DTYPE = np.dtype([
+    ('key_hi', np.uint64),
+    ('key_lo', np.uint64),
+    ('ts', np.float64),
+    ('length', np.uint32),
+    ('flags', np.uint32),
+])
+FLOW_BATCH_DTYPE = np.dtype([
+    ('key_hi', np.uint64),
+    ('key_lo', np.uint64),
+    ('features', np.float64, (N_FEATURES,)),
+])
+
+PACKET_BATCH = 4096      # packet records per slab
+PACKET_SLABS = 8         # slabs per aggregation worker
+FLOW_BATCH = 4096        # flow records per slab
+FLOW_SLABS_PER_WORKER = 4
+FLUSH_EVERY = 0.1        # seconds; partial packet batches are sent at least this often
+SHUTDOWN_TIMEOUT = 30.0
+
+_STOP = -1               # slab number used as end-of-stream marker
+
+
+class SlabQueue:
+    """
+    A fixed pool of shared-memory slabs of `dtype` records with two queues:
+    `ready` carries (slab, count) from producers to consumers and `free`
+    returns slab numbers to producers. acquire() blocks when every slab is
+    in flight, which is the backpressure between stages.
+    """
+
+    def __init__(self, ctx, dtype, records, slabs):
+        self.dtype = dtype
+        self.records = records
+        self.slabs = slabs
+        self.shm = shared_memory.SharedMemory(create=True, size=dtype.itemsize * records * slabs)
+        self.free = ctx.Queue()
+        self.ready = ctx.Queue()
+        for i in range(slabs):
+            self.free.put(i)
+        self._array = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_array'] = None
+        return state
+
+    @property
+    def array(self):
+        if self._array is None:
+            self._array = np.ndarray((self.slabs, self.records), dtype=self.dtype, buffer=self.shm.buf)
+        return self._array
+
+    def acquire(self):
+        return self.free.get()
+
+    def publish(self, slab, count):
+        self.ready.put((slab, count))
+
+    def get(self, timeout=None):
+        """Next (slab, count), or raises queue.Empty. slab is _STOP at end of stream."""
+        return self.ready.get(timeout=timeout)
+
+    def stop(self):
+        self.ready.put((_STOP, 0))
+
+    def release(self, slab):
+        self.free.put(slab)
+
+    def destroy(self):
+        self._array = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _ignore_sigint():
+    # Ctrl+C is handled by the parent, which shuts the stages down in order
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def capture_worker(pcap, iface, bpf, packet_queues, stop, packet_counter):
+    """Read frames, decode flow keys and route packet records by key hash."""
+    _ignore_sigint()
+    if pcap:
+        source = capture.open_capture_file(pcap)
+        frames = source.frames()
+    else:
+        program = capture.compile_bpf(bpf, iface) if bpf else capture.BPF_IPV4_ONLY
+        source = capture.RingCapture(iface=iface, bpf=program)
+        frames = source.frames(heartbeat=True)
+    linktype = source.linktype
+    parse_frame = capture.parse_frame
+    n = len(packet_queues)
+    slabs = [None] * n
+    views = [None] * n
+    counts = [0] * n
+    packets = 0
+    last_flush = time.monotonic()
+
+    def flush(w):
+        packet_queues[w].publish(slabs[w], counts[w])
+        slabs[w] = None
+        counts[w] = 0
+
+    try:
+        for ts, frame, wire_len in frames:
+            if frame is not None:
+                parsed = parse_frame(frame, linktype)
+                if parsed is None:
+                    continue
+                key, flags = parsed
+                w = hash(key) % n
+                if slabs[w] is None:
+                    slabs[w] = packet_queues[w].acquire()
+                    views[w] = packet_queues[w].array[slabs[w]]
+                views[w][counts[w]] = (key >> KEY_LO_BITS, key & KEY_LO_MASK, ts, wire_len, flags)
+                counts[w] += 1
+                packets += 1
+                if counts[w] == PACKET_BATCH:
+                    flush(w)
+                if packets & 0x3FF:
+                    continue
+            # every 1024 packets, or on an idle heartbeat
+            now = time.monotonic()
+            if now - last_flush >= FLUSH_EVERY:
+                for w in range(n):
+                    if counts[w]:
+                        flush(w)
+                last_flush = now
+            if stop.is_set():
+                break
+    finally:
+        for w in range(n):
+            if counts[w]:
+                flush(w)
+            elif slabs[w] is not None:
+                packet_queues[w].release(slabs[w])
+        source.close()
+        with packet_counter.get_lock():
+            packet_counter.value += packets
+
+
+def _emit_flows(flow_queue, keys, X):
+    for start in range(0, len(keys), FLOW_BATCH):
+        chunk = keys[start:start + FLOW_BATCH]
+        slab = flow_queue.acquire()
+        view = flow_queue.array[slab]
+        n = len(chunk)
+        view['key_hi'][:n] = np.fromiter((k >> KEY_LO_BITS for k in chunk), np.uint64, n)
+        view['key_lo'][:n] = np.fromiter((k & KEY_LO_MASK for k in chunk), np.uint64, n)
+        view['features'][:n] = X[start:start + n]
+        flow_queue.publish(slab, n)
+
+
+def aggregate_worker(packet_queue, flow_queue, packet_clock, flow_timeout, classify_every):
+    """
+    Build flows from the packets routed to this worker and publish expired
+    flows in batches. With packet_clock the newest packet timestamp is the
+    clock (capture files), otherwise wall time.
+    """
+    _ignore_sigint()
+    table = FlowTable(shards=1)
+    add_packet = table.add_packet
+    now = None
+    next_check = None
+    while True:
+        try:
+            slab, count = packet_queue.get(timeout=classify_every)
+        except queue.Empty:
+            slab = None
+        if slab == _STOP:
+            break
+        if slab is not None:
+            batch = packet_queue.array[slab, :count]
+            for hi, lo, ts, length, flags in zip(batch['key_hi'].tolist(), batch['key_lo'].tolist(),
+                                                batch['ts'].tolist(), batch['length'].tolist(),
+                                                batch['flags'].tolist()):
+                add_packet((hi << KEY_LO_BITS) | lo, ts, length, flags, flow_timeout)
+            if packet_clock and count:
+                now = max(now or 0.0, float(batch['ts'].max()))
+            packet_queue.release(slab)
+        if not packet_clock:
+            now = time.time()
+        if now is None:
+            continue
+        if next_check is None:
+            next_check = now + classify_every
+        elif now >= next_check:
+            keys, X = table.pop_expired(now, flow_timeout)
+            if keys:
+                _emit_flows(flow_queue, keys, X)
+            next_check = now + classify_every
+    keys, X = table.drain()
+    if keys:
+        _emit_flows(flow_queue, keys, X)
+
+
+def classify_worker(flow_queue, model_path, scaler_path, flow_counter, alert_db, alert_user):
+    """Classify flow batches straight out of shared memory."""
+    _ignore_sigint()
+    from ids import ids as ids_live   # ids.ids imports this module
+    ids_live.setup_logging()
+    ids_live.load_model(model_path, scaler_path)
+    if alert_db:
+        ids_live.start_alert_sink(alert_db, alert_user)
+    try:
+        while True:
+            slab, count = flow_queue.get()
+            if slab == _STOP:
+                break
+            batch = flow_queue.array[slab, :count]
+            keys = [(hi << KEY_LO_BITS) | lo
+                    for hi, lo in zip(batch['key_hi'].tolist(), batch['key_lo'].tolist())]
+            classified = ids_live.classify_and_report(keys, batch['features'])
+            flow_queue.release(slab)
+            with flow_counter.get_lock():
+                flow_counter.value += classified
+    finally:
+        ids_live.stop_alert_sink()
+
+
+def _join(processes, label):
+    for p in processes:
+        p.join(SHUTDOWN_TIMEOUT)
+        if p.is_alive():
+            logging.warning("%s process %d did not stop, terminating it", label, p.pid)
+            p.terminate()
+            p.join()
+
+
+def _failed(processes):
+    """The first of processes that exited with an error, or None."""
+    return next((p for p in processes if p.exitcode not in (None, 0)), None)
+
+
+def run_pipeline(workers, classifiers, model_path, scaler_path, flow_timeout, classify_every,
+                 pcap=None, iface=None, bpf=None, alert_db=None, alert_user=None):
+    """
+    Run capture -> aggregation -> classification across processes until the
+    capture file ends or Ctrl+C. Malicious verdicts go to alert_db unless it
+    is None. Returns {'packets': n, 'flows': m}; raises SystemExit if an
+    aggregation or classifier process fails.
+    """
+    ctx = mp.get_context()
+    stop = ctx.Event()
+    packet_counter = ctx.Value('q', 0)
+    flow_counter = ctx.Value('q', 0)
+    packet_queues = [SlabQueue(ctx, PACKET_DTYPE, PACKET_BATCH, PACKET_SLABS) for _ in range(workers)]
+    flow_queue = SlabQueue(ctx, FLOW_BATCH_DTYPE, FLOW_BATCH, FLOW_SLABS_PER_WORKER * workers)
+
+    capturer = ctx.Process(target=capture_worker, name='ids-capture',
+                           args=(pcap, iface, bpf, packet_queues, stop, packet_counter))
+    aggregators = [ctx.Process(target=aggregate_worker, name=f'ids-aggregate-{i}',
+                               args=(q, flow_queue, bool(pcap), flow_timeout, classify_every))
+                   for i, q in enumerate(packet_queues)]
+    classifier_pool = [ctx.Process(target=classify_worker, name=f'ids-classify-{i}',
+                                   args=(flow_queue, model_path, scaler_path, flow_counter,
+                                         alert_db, alert_user))
+                       for i in range(classifiers)]
+
+    # children must not see the terminal's SIGINT before installing SIG_IGN
+    previous = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        for p in [capturer] + aggregators + classifier_pool:
+            p.start()
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+    logging.info("Pipeline running: 1 capture, %d aggregation, %d classifier processes",
+                 workers, classifiers)
+    consumers = aggregators + classifier_pool
+    failed = None
+    try:
+        while capturer.is_alive() and failed is None:
+            capturer.join(0.5)
+            failed = _failed(consumers)
+    except KeyboardInterrupt:
+        logging.info("Stopping pipeline...")
+        stop.set()
+    try:
+        if failed is not None:
+            # the stages feeding it may be blocked on slabs that never come back
+            logging.error("%s process exited with code %d, stopping the pipeline",
+                          failed.name, failed.exitcode)
+            stop.set()
+            for p in [capturer] + consumers:
+                if p.is_alive():
+                    p.terminate()
+                p.join()
+        else:
+            # stop each stage only after the one feeding it has exited, so
+            # every batch already in flight is still processed
+            _join([capturer], 'capture')
+            for q in packet_queues:
+                q.stop()
+            _join(aggregators, 'aggregation')
+            for _ in classifier_pool:
+                flow_queue.stop()
+            _join(classifier_pool, 'classifier')
+            failed = _failed(consumers)
+    finally:
+        for q in packet_queues:
+            q.destroy()
+        flow_queue.destroy()
+    if failed is not None:
+        raise SystemExit(f"IDS pipeline failed: {failed.name} exited with code {failed.exitcode}")
+    return {'packets': packet_counter.value, 'flows': flow_counter.value}
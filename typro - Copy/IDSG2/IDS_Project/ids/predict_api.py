@@ -0,0 +1,179 @@
+# ids/predict_api.py
+"""
+Batch scoring API for the NSL-KDD style connection classifier.
+
+POST /api/ids/predict with one of
+    application/json       [{"duration": 0, "protocol_type": "tcp", ...}, ...]
+                           (or {"records": [...]})
+    application/x-ndjson   one JSON record per line
+    text/csv               header row with the FEATURE_FIELDS names
+and the response streams one NDJSON line per record, in input order:
+    {"index": 0, "label": "Normal", "confidence": 0.97}
+Records carrying an "id" field get it echoed back.
+
+Uses the same cached model and encoders as the /ids form (ids/detection.py),
+but protocol_type/flag are encoded column-wise and predict_proba runs once
+per batch of up to PREDICT_BATCH records instead of once per record.
+"""
+import io
+import itertools
+import json
+
+import numpy as np
+import pandas as pd
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+
+from ids.detection import (FEATURE_FIELDS, MODEL_FILENAME, _FLAG_MAP, _PROTOCOL_MAP,
+                           _load_encoders, _load_model, _normalize_label)
+
+api_bp = Blueprint('ids_api', __name__, url_prefix='/api/ids')
+
+PREDICT_BATCH = 10000      # records per predict_proba call
+_CATEGORICAL = ('protocol_type', 'flag')
+_NUMERIC = [f for f in FEATURE_FIELDS if f not in _CATEGORICAL]
+
+
+class BadRecords(ValueError):
+    """Input that cannot be turned into a feature matrix (reported as HTTP 400)."""
+
+
+def _records_frame(records, start):
+    """DataFrame of JSON records numbered from `start`; raises BadRecords unless each is an object."""
+    for i, record in enumerate(records, start):
+        if not isinstance(record, dict):
+            raise BadRecords(f"record {i}: expected a JSON object, got {json.dumps(record)[:100]}")
+    frame = pd.DataFrame.from_records(records)
+    frame.index = pd.RangeIndex(start, start + len(frame))   # record numbers, as for CSV
+    return frame
+
+
+def _ndjson_records(stream):
+    """The parsed lines of an NDJSON body, skipping blank ones."""
+    for number, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8'), 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise BadRecords(f"line {number}: invalid JSON: {e}")
+
+
+def _iter_frames(content_type, stream, batch=PREDICT_BATCH):
+    """Yield DataFrames of at most `batch` records parsed from the request body."""
+    if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonlines'):
+        records = _ndjson_records(stream)
+        start = 0
+        while True:
+            chunk = list(itertools.islice(records, batch))
+            if not chunk:
+                return
+            yield _records_frame(chunk, start)
+            start += len(chunk)
+    elif content_type in ('text/csv', 'application/csv'):
+        yield from pd.read_csv(stream, chunksize=batch, dtype={f: str for f in _CATEGORICAL})
+    elif content_type == 'application/json':
+        try:
+            body = json.load(stream)
+        except ValueError as e:
+            raise BadRecords(f"invalid JSON: {e}")
+        if isinstance(body, dict):
+            body = body.get('records')
+        if not isinstance(body, list):
+            raise BadRecords("expected a JSON array of records or {\"records\": [...]}")
+        for start in range(0, len(body), batch):
+            yield _records_frame(body[start:start + batch], start)
+    else:
+        raise BadRecords(f"unsupported content type {content_type!r}; "
+                         "use application/json, application/x-ndjson or text/csv")
+
+
+def _encode_column(values, name, mapping, normalize):
+    """Encode a categorical column with the saved encoder or the fallback map, one call per batch."""
+    encoders = _load_encoders()
+    values = values.fillna('').astype(str).str.strip()
+    if encoders and name in encoders:
+        try:
+            return encoders[name].transform(values.to_numpy()).astype(float)
+        except ValueError as e:
+            raise BadRecords(f"{name}: {e}")
+    return normalize(values).map(mapping).fillna(-1).to_numpy(dtype=float)
+
+
+def build_matrix(frame):
+    """(n, len(FEATURE_FIELDS)) float matrix from a DataFrame of records."""
+    missing = [f for f in FEATURE_FIELDS if f not in frame.columns]
+    if missing:
+        raise BadRecords(f"missing fields: {', '.join(missing)}")
+    X = np.empty((len(frame), len(FEATURE_FIELDS)), dtype=float)
+    numeric = frame[_NUMERIC].replace('', np.nan).apply(pd.to_numeric, errors='coerce')
+    # like the form, empty/missing values count as 0.0; anything else must be numeric
+    bad = numeric.isna() & frame[_NUMERIC].notna() & (frame[_NUMERIC] != '')
+    if bad.to_numpy().any():
+        row, col = np.argwhere(bad.to_numpy())[0]
+        raise BadRecords(f"record {frame.index[row]}: invalid numeric value for "
+                         f"{_NUMERIC[col]}: {frame[_NUMERIC[col]].iloc[row]!r}")
+    for i, field in enumerate(FEATURE_FIELDS):
+        if field == 'protocol_type':
+            X[:, i] = _encode_column(frame[field], field, _PROTOCOL_MAP, lambda s: s.str.lower())
+        elif field == 'flag':
+            X[:, i] = _encode_column(frame[field], field, _FLAG_MAP, lambda s: s.str.upper())
+        else:
+            X[:, i] = numeric[field].fillna(0.0).to_numpy(dtype=float)
+    return X
+
+
+def predict_batch(model, X):
+    """One model call for the whole batch: (labels, confidences or None)."""
+    if hasattr(model, 'predict_proba'):
+        probs = model.predict_proba(X)
+        top = np.argmax(probs, axis=1)
+        classes = getattr(model, 'classes_', np.arange(probs.shape[1]))
+        names = np.array([_normalize_label(c) for c in classes], dtype=object)
+        return names[top], probs[np.arange(len(top)), top]
+    preds = model.predict(X)
+    return [_normalize_label(p) for p in preds], None
+
+
+def _result_lines(model, frame, X, frames, offset=0):
+    """
+    NDJSON lines for `frame` (already encoded as X) and the remaining frames;
+    an error ends the stream with an error line.
+    """
+    try:
+        while frame is not None:
+            labels, confidences = predict_batch(model, X)
+            ids = frame['id'].tolist() if 'id' in frame.columns else None
+            lines = []
+            for i, label in enumerate(labels):
+                result = {'index': offset + i, 'label': label,
+                          'confidence': None if confidences is None else round(float(confidences[i]), 4)}
+                if ids is not None:
+                    result['id'] = ids[i]
+                lines.append(json.dumps(result, default=str))
+            yield '\n'.join(lines) + '\n'
+            offset += len(frame)
+            frame = next(frames, None)
+            if frame is not None:
+                X = build_matrix(frame)
+    except (BadRecords, ValueError) as e:
+        yield json.dumps({'error': str(e), 'index': offset}) + '\n'
+
+
+@api_bp.route('/predict', methods=['POST'])
+def predict():
+    model = _load_model()
+    if model is None:
+        return jsonify({'error': f"IDS model is not loaded. Place '{MODEL_FILENAME}' in the app root."}), 503
+    frames = _iter_frames(request.mimetype, request.stream)
+    try:
+        # parse and check the first batch up front so bad input is a plain 400
+        first = next(frames, None)
+        if first is None:
+            return Response('', mimetype='application/x-ndjson')
+        X = build_matrix(first)
+    except (BadRecords, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception("Error parsing IDS batch")
+        return jsonify({'error': str(e)}), 400
+    return Response(stream_with_context(_result_lines(model, first, X, frames)),
+                    mimetype='application/x-ndjson')
@@ -1,9 +1,10 @@
 # ids_single.py
 import os
-import joblib
 import numpy as np
 from flask import Blueprint, render_template, request, current_app, flash
 
+from ids.model_registry import registry
+
 # Blueprint name MUST be unique across your app
 ids_bp = Blueprint('ids_single', __name__, template_folder='templates', static_folder='static')
 
@@ -12,49 +13,24 @@ MODEL_FILENAME = 'model.joblib'      # preferred: sklearn Pipeline saved via job
 SCALER_FILENAME = 'scaler.joblib'    # optional
 ENCODER_FILENAME = 'encoder.joblib'  # optional: dict of label encoders
 
-# ----- Cached objects -----
-_model = None
-_scaler = None
-_encoders = None
+# ----- Shared objects (see ids/model_registry.py) -----
+# app.root_path is the directory of app.py, which is this one
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+registry.register('single.model', os.path.join(_ROOT, MODEL_FILENAME), compile=True)
+registry.register('single.scaler', os.path.join(_ROOT, SCALER_FILENAME))
+registry.register('single.encoders', os.path.join(_ROOT, ENCODER_FILENAME))
 
 def get_model():
-    global _model
-    if _model is None:
-        model_path = os.path.join(current_app.root_path, MODEL_FILENAME)
-        if os.path.exists(model_path):
-            try:
-                _model = joblib.load(model_path)
-                current_app.logger.info("Loaded model from %s", model_path)
-            except Exception as e:
-                current_app.logger.error("Failed to load model: %s", e)
-                _model = None
-        else:
-            current_app.logger.warning("Model file not found at %s", model_path)
-    return _model
+    model = registry.get('single.model')
+    if model is None:
+        current_app.logger.warning("Model file not found at %s", os.path.join(_ROOT, MODEL_FILENAME))
+    return model
 
 def get_scaler():
-    global _scaler
-    if _scaler is None:
-        path = os.path.join(current_app.root_path, SCALER_FILENAME)
-        if os.path.exists(path):
-            try:
-                _scaler = joblib.load(path)
-            except Exception as e:
-                current_app.logger.error("Failed to load scaler: %s", e)
-                _scaler = None
-    return _scaler
+    return registry.get('single.scaler')
 
 def get_encoders():
-    global _encoders
-    if _encoders is None:
-        path = os.path.join(current_app.root_path, ENCODER_FILENAME)
-        if os.path.exists(path):
-            try:
-                _encoders = joblib.load(path)
-            except Exception as e:
-                current_app.logger.error("Failed to load encoders: %s", e)
-                _encoders = None
-    return _encoders
+    return registry.get('single.encoders')
 
 # If you did NOT save encoders, these example maps are here as fallback.
 # IMPORTANT: if you trained with different mappings, replace these accordingly.
@@ -0,0 +1,304 @@
+# scanner/engine.py
+"""
+asyncio TCP connect scan engine used by the /scan page and usable as a library:
+
+    results = scan_ports('192.168.1.10', range(1, 1025))
+
+    scanner = PortScanner(concurrency=1000, rate=2000)
+    results = asyncio.run(scanner.scan('192.168.1.10', range(1, 65536), deadline=120))
+    if scanner.cancelled: ...          # stopped early, results are partial
+
+Instead of one blocking connect at a time, up to `concurrency` connects are
+in flight at once, bounded by a semaphore (and by the open file limit).
+Per-host state limits the connect rate (a token bucket of `rate` connects
+per second) and sizes the connect timeout from measured round trips, the
+way TCP computes its retransmission timeout (RFC 6298): a closed port
+answers within a few RTTs, so once the host has answered, silent ports are
+declared filtered after srtt + 4 * rttvar instead of a fixed timeout.
+
+A scan stops early when cancel() is called (from any thread) or when its
+deadline passes; connects still in flight are cancelled and the ports
+scanned so far are returned.
+
+Results are {'port': n, 'status': 'open' | 'closed' | 'filtered' | 'error: ...'}
+sorted by port: closed means the host refused the connection, filtered that
+nothing answered within the timeout.
+"""
+import asyncio
+import errno
+import ipaddress
+import socket
+import struct
+import time
+
+try:
+    import resource
+except ImportError:   # Windows: no RLIMIT_NOFILE to respect
+    resource = None
+
+DEFAULT_CONCURRENCY = 500
+DEFAULT_RATE = None          # connects per second per host; None: unlimited
+INITIAL_TIMEOUT = 1.0        # seconds, until the host has answered once
+MIN_TIMEOUT = 0.2            # event loop delays must not turn open ports into filtered ones
+MAX_TIMEOUT = 3.0
+FD_RESERVE = 64              # file descriptors left for the rest of the process
+
+# close with RST: no TIME_WAIT sockets piling up over a large scan
+_LINGER_RESET = struct.pack('ii', 1, 0)
+_REFUSED = (errno.ECONNREFUSED, errno.ECONNRESET)
+_UNREACHABLE = (errno.EHOSTUNREACH, errno.ENETUNREACH)
+
+
+def parse_ports(spec):
+    """Ports from '20-25', '80,443' or a mix like '22,80-90'; raises ValueError."""
+    ports = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = (int(p) for p in part.split('-', 1))
+            ports.extend(range(start, end + 1))
+        else:
+            ports.append(int(part))
+    if not ports:
+        raise ValueError("no ports given")
+    bad = [p for p in ports if not 0 < p < 65536]
+    if bad:
+        raise ValueError(f"invalid port {bad[0]}")
+    return list(dict.fromkeys(ports))
+
+
+def max_concurrency(requested):
+    """requested, capped so the scan cannot run the process out of file descriptors."""
+    if resource is None:
+        return requested
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return requested
+    return max(1, min(requested, soft - FD_RESERVE))
+
+
+class _TokenBucket:
+    """Allows `rate` acquisitions per second on average, in bursts of up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return
+            await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+
+class _RttEstimator:
+    """Smoothed RTT and connect timeout of one host (RFC 6298 with alpha 1/8, beta 1/4)."""
+
+    def __init__(self, initial, minimum, maximum):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.srtt = None
+        self.rttvar = None
+        self.timeout = initial
+
+    def sample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.timeout = min(self.maximum, max(self.minimum, self.srtt + 4 * self.rttvar))
+
+
+class _Host:
+    __slots__ = ('bucket', 'rtt')
+
+    def __init__(self, bucket, rtt):
+        self.bucket = bucket
+        self.rtt = rtt
+
+
+class PortScanner:
+    """TCP connect scanner; one instance may run several scans, sharing per-host state."""
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, burst=None,
+                 initial_timeout=INITIAL_TIMEOUT, min_timeout=MIN_TIMEOUT, max_timeout=MAX_TIMEOUT):
+        self.concurrency = max_concurrency(concurrency)
+        self.rate = rate
+        self.burst = burst or (max(1, int(rate)) if rate else None)
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.cancelled = False
+        self._hosts = {}
+        self._loop = None
+        self._stop = None
+
+    def cancel(self):
+        """Stop the running scan, and any later one of this scanner; safe to call from any thread."""
+        self.cancelled = True
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+    def _host(self, address):
+        host = self._hosts.get(address)
+        if host is None:
+            bucket = _TokenBucket(self.rate, self.burst) if self.rate else None
+            rtt = _RttEstimator(self.initial_timeout, self.min_timeout, self.max_timeout)
+            host = self._hosts[address] = _Host(bucket, rtt)
+        return host
+
+    async def resolve(self, target):
+        """(family, address) of target; raises OSError (socket.gaierror) if it does not resolve."""
+        try:
+            ip = ipaddress.ip_address(target)
+        except ValueError:
+            infos = await asyncio.get_running_loop().getaddrinfo(target, None, type=socket.SOCK_STREAM)
+            family, _, _, _, sockaddr = infos[0]
+            return family, sockaddr[0]
+        return (socket.AF_INET6 if ip.version == 6 else socket.AF_INET), str(ip)
+
+    async def probe(self, family, address, port):
+        """Connect once to address:port and return its status."""
+        loop = asyncio.get_running_loop()
+        host = self._host(address)
+        if host.bucket is not None:
+            await host.bucket.acquire()
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.setblocking(False)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RESET)
+            timeout = host.rtt.timeout
+            start = time.monotonic()
+            try:
+                await asyncio.wait_for(loop.sock_connect(sock, (address, port)), timeout)
+            except asyncio.TimeoutError:
+                return 'filtered'
+            except OSError as e:
+                if e.errno in _REFUSED:
+                    host.rtt.sample(time.monotonic() - start)
+                    return 'closed'
+                if e.errno in _UNREACHABLE:
+                    return 'filtered'
+                return f'error: {e}'
+            host.rtt.sample(time.monotonic() - start)
+            return 'open'
+        finally:
+            sock.close()
+
+    async def scan(self, target, ports, on_result=None, deadline=None):
+        """
+        Scan ports of target and return the results sorted by port.
+        on_result(result) is called as each port finishes. The scan stops
+        after `deadline` seconds or on cancel(); self.cancelled tells whether
+        it did and the results then cover only the ports scanned so far.
+        """
+        family, address = await self.resolve(target)
+        results = []
+
+        def done(port, status):
+            result = {'port': port, 'status': status}
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+        await self._run(((port, family, address, port) for port in ports), done, deadline)
+        results.sort(key=lambda r: r['port'])
+        return results
+
+    async def sweep(self, hosts, ports, on_result, deadline=None, skip=None):
+        """
+        Scan ports on every host of a list (see scanner.sweep.parse_targets).
+        Probes are numbered port-major (index = port position * len(hosts) +
+        host position) and issued in that order, so the in-flight probes are
+        spread over all hosts and a slow host holds only its share of the
+        slots. on_result(index, {'host', 'port', 'status'}) is called per
+        probe as it finishes (results are not collected: a /16 sweep has
+        millions). Probes for which skip(index) is true are left out, which
+        is how a saved sweep resumes. Stops like scan().
+        """
+        resolved = []
+        for host in hosts:
+            try:
+                resolved.append(await self.resolve(host))
+            except OSError as e:
+                resolved.append((None, f'error: {e}'))
+        n_hosts = len(hosts)
+
+        def probes():
+            for p, port in enumerate(ports):
+                for h, (family, address) in enumerate(resolved):
+                    index = p * n_hosts + h
+                    if skip is not None and skip(index):
+                        continue
+                    if family is None:
+                        # does not resolve: report without connecting
+                        on_result(index, {'host': hosts[h], 'port': port, 'status': address})
+                        continue
+                    yield index, family, address, port
+
+        def done(index, status):
+            p, h = divmod(index, n_hosts)
+            on_result(index, {'host': hosts[h], 'port': ports[p], 'status': status})
+
+        await self._run(probes(), done, deadline)
+
+    async def _run(self, probes, on_done, deadline):
+        """
+        probe() every (key, family, address, port) of probes with at most
+        self.concurrency in flight, calling on_done(key, status) as each
+        finishes, until all are done or the scan is stopped.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stop = stop = asyncio.Event()
+        if self.cancelled:
+            stop.set()
+        pending = set()
+        slots = asyncio.Semaphore(self.concurrency)
+
+        def finished(task):
+            pending.discard(task)
+            slots.release()
+            if not task.cancelled():
+                on_done(task.key, task.result())
+
+        async def stopper():
+            await stop.wait()
+            for task in list(pending):
+                task.cancel()
+
+        timer = self._loop.call_later(deadline, self.cancel) if deadline else None
+        watcher = asyncio.create_task(stopper())
+        try:
+            for key, family, address, port in probes:
+                await slots.acquire()
+                if stop.is_set():
+                    slots.release()
+                    break
+                task = asyncio.create_task(self.probe(family, address, port))
+                task.key = key
+                pending.add(task)
+                task.add_done_callback(finished)
+            while pending:
+                await asyncio.wait(set(pending))
+        finally:
+            if timer is not None:
+                timer.cancel()
+            watcher.cancel()
+            for task in list(pending):
+                task.cancel()
+            self._stop = None
+
+
+def scan_ports(target, ports, **options):
+    """Blocking wrapper: scan ports of target with a new PortScanner(**options)."""
+    return asyncio.run(PortScanner(**options).scan(target, ports))
@@ -1,39 +1,174 @@
-from flask import Blueprint, render_template, request
-import socket
+from flask import (Blueprint, Response, current_app, jsonify, render_template, request,
+                   stream_with_context, url_for)
+from flask_login import current_user
+import asyncio
+import json
+import queue
+import time
+
+from scanner.engine import PortScanner, parse_ports, scan_ports
+from scanner.sweep import Sweep, SweepCheckpoint, TooManySweeps, parse_targets
+from scanner import store
+from database.db import ScanRun, db
+
+# scan_ports stays importable from here for scripts that used the old blocking version
+__all__ = ['scanner_bp', 'scan_ports']
 
 scanner_bp = Blueprint('scanner', __name__)
 
-def scan_ports(target, ports):
-    results = []
-    for port in ports:
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(0.5)
-        try:
-            s.connect((target, port))
-            results.append({'port': port, 'status': 'open'})
-        except (socket.timeout, ConnectionRefusedError):
-            results.append({'port': port, 'status': 'closed'})
-        except Exception as e:
-            results.append({'port': port, 'status': f'error: {str(e)}'})
-        finally:
-            s.close()
-    return results
+# A request scans for at most this long; the ports done by then are shown
+SCAN_TIME_LIMIT = 60.0
+# Seconds between progress events of a streamed sweep
+PROGRESS_EVERY = 0.5
+
+def _user_id():
+    return current_user.id if current_user.is_authenticated else None
+
+def _scan_and_store(target, port_range, ports):
+    """Scan one host, storing the results as a ScanRun in chunks of store.SAVE_CHUNK."""
+    run = store.start_run(target, port_range, _user_id())
+    unsaved = []
+
+    def on_result(result):
+        unsaved.append({'host': target, 'port': result['port'], 'status': result['status']})
+        if len(unsaved) >= store.SAVE_CHUNK:
+            store.save_results(run.id, unsaved)
+            unsaved.clear()
+
+    scanner = PortScanner()
+    try:
+        results = asyncio.run(scanner.scan(target, ports, on_result=on_result, deadline=SCAN_TIME_LIMIT))
+    except Exception:
+        db.session.rollback()
+        store.finish_run(run.id, 'failed', 0, 0)
+        raise
+    store.save_results(run.id, unsaved)
+    store.finish_run(run.id, 'stopped' if scanner.cancelled else 'done', len(results),
+                     sum(r['status'] == 'open' for r in results))
+    return results, scanner.cancelled
 
 @scanner_bp.route('/scan', methods=['GET', 'POST'])
 def scan_home():
     results = None
     error = None
+    sweep = None
     if request.method == 'POST':
-        target = request.form.get('target')
-        port_range = request.form.get('ports')
+        target = request.form.get('target', '')
+        port_range = request.form.get('ports', '')
         try:
-            ports = []
-            if '-' in port_range:
-                start, end = map(int, port_range.split('-'))
-                ports = list(range(start, end+1))
+            ports = parse_ports(port_range)
+            hosts = parse_targets(target)
+            if len(hosts) > 1:
+                # host lists and CIDR blocks stream from /scan/sweeps/<id>/events
+                checkpoint = SweepCheckpoint.create(target, port_range)
+                store.start_run(target, port_range, _user_id(), sweep_id=checkpoint.id)
+                sweep = {'id': checkpoint.id, 'events_url': url_for('scanner.sweep_events', sweep_id=checkpoint.id)}
             else:
-                ports = [int(p.strip()) for p in port_range.split(',')]
-            results = scan_ports(target, ports)
+                results, cancelled = _scan_and_store(hosts[0], port_range, ports)
+                if cancelled:
+                    error = (f"Scan stopped after {SCAN_TIME_LIMIT:g}s: "
+                             f"{len(results)} of {len(ports)} ports scanned.")
         except Exception as e:
             error = f"Error: {str(e)}"
-    return render_template('scan.html', results=results, error=error)
+    return render_template('scan.html', results=results, error=error, sweep=sweep)
+
+@scanner_bp.route('/scan/sweeps', methods=['POST'])
+def create_sweep():
+    """Create a sweep from targets/ports (form or JSON); stream it from events_url."""
+    data = request.get_json(silent=True) or request.form
+    try:
+        checkpoint = SweepCheckpoint.create(str(data.get('targets', '')), str(data.get('ports', '')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    run = store.start_run(checkpoint.targets, checkpoint.ports, _user_id(), sweep_id=checkpoint.id)
+    return jsonify({
+        'id': checkpoint.id,
+        'run_id': run.id,
+        'status_url': url_for('scanner.sweep_status', sweep_id=checkpoint.id),
+        'events_url': url_for('scanner.sweep_events', sweep_id=checkpoint.id),
+    }), 201
+
+@scanner_bp.route('/scan/sweeps/<sweep_id>')
+def sweep_status(sweep_id):
+    try:
+        checkpoint = SweepCheckpoint.load(sweep_id)
+    except KeyError:
+        return jsonify({'error': 'sweep not found'}), 404
+    hosts = parse_targets(checkpoint.targets)
+    ports = parse_ports(checkpoint.ports)
+    progress = checkpoint.progress()
+    run = store.run_for_sweep(sweep_id)
+    progress.update(id=checkpoint.id, run_id=run.id if run else None, targets=checkpoint.targets, ports=checkpoint.ports,
+                    created_at=checkpoint.created_at, finished=checkpoint.finished,
+                    total=len(hosts) * len(ports), results=[])
+    for index, status in checkpoint.found:
+        p, h = divmod(index, len(hosts))
+        progress['results'].append({'host': hosts[h], 'port': ports[p], 'status': status})
+    return jsonify(progress)
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@scanner_bp.route('/scan/sweeps/<sweep_id>/events')
+def sweep_events(sweep_id):
+    """
+    Server-Sent Events for a sweep: 'result' per open port (saved ones
+    first), 'progress' every PROGRESS_EVERY seconds and a final 'end'.
+    Connecting starts or resumes the sweep; disconnecting stops it, and the
+    next connection picks up where it left off.
+    """
+    try:
+        sweep = Sweep.start(sweep_id, current_app._get_current_object())
+    except KeyError:
+        return jsonify({'error': 'sweep not found'}), 404
+    except TooManySweeps as e:
+        return jsonify({'error': str(e)}), 429
+
+    def events():
+        next_progress = 0.0
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event, data = sweep.events.get(timeout=PROGRESS_EVERY)
+                except queue.Empty:
+                    event = None
+                if event == 'end':
+                    yield _sse('end', data)
+                    return
+                if event is not None:
+                    yield _sse(event, data)
+                now = time.monotonic()
+                if now >= next_progress:
+                    next_progress = now + PROGRESS_EVERY
+                    yield _sse('progress', sweep.progress())
+        finally:
+            # client gone (or sweep over): stop scanning, the checkpoint keeps what was done
+            sweep.stop(wait=False)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@scanner_bp.route('/scan/runs')
+def scan_runs():
+    """Recent scan runs (the signed-in user's, or everyone's)."""
+    limit = min(request.args.get('limit', 20, type=int), 200)
+    return jsonify([run.to_dict() for run in store.recent_runs(_user_id(), limit)])
+
+@scanner_bp.route('/scan/runs/<int:run_id>')
+def scan_run(run_id):
+    run = db.get_or_404(ScanRun, run_id)
+    result = run.to_dict()
+    result['open'] = store.open_ports(run_id)
+    return jsonify(result)
+
+@scanner_bp.route('/scan/runs/<int:run_a>/diff/<int:run_b>')
+def scan_diff(run_a, run_b):
+    """Ports opened and closed between run_a and run_b."""
+    runs = {run.id: run for run in ScanRun.query.filter(ScanRun.id.in_((run_a, run_b)))}
+    missing = [r for r in (run_a, run_b) if r not in runs]
+    if missing:
+        return jsonify({'error': f"scan run {missing[0]} not found"}), 404
+    diff = store.diff_runs(run_a, run_b)
+    diff.update(before=runs[run_a].to_dict(), after=runs[run_b].to_dict())
+    return jsonify(diff)
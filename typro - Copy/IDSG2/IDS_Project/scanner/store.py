@@ -0,0 +1,122 @@
+# scanner/store.py
+"""
+Scan history: ScanRun rows for /scan requests and sweeps, and one
+ScanResult row per (run, host, port).
+
+Results reach the database in bulk, one multi-row INSERT per chunk
+(SAVE_CHUNK results of a single-host scan, or everything a sweep finished
+since its last checkpoint flush), never one ORM object per port. Must be
+called inside an app context.
+
+diff_runs() compares two runs in one query: the ix_scan_result_run_status
+index yields the open ports of both runs, and each one is checked against
+the other run through the (run_id, host, port) primary key, so the cost
+grows with the number of open ports, not with the number of stored rows.
+"""
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.dialects import mysql, sqlite
+
+from database.db import db, ScanRun, ScanResult
+
+SAVE_CHUNK = 5000            # results per bulk insert of a single-host scan
+_STATUS_LENGTH = ScanResult.__table__.c.status.type.length
+
+
+def _insert_results(dialect_name):
+    """Bulk insert of results; a resumed sweep may probe a port again after a crash: keep the newest status."""
+    table = ScanResult.__table__
+    if dialect_name == 'mysql':
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update(status=stmt.inserted.status)
+    stmt = sqlite.insert(table)
+    return stmt.on_conflict_do_update(index_elements=['run_id', 'host', 'port'],
+                                      set_={'status': stmt.excluded.status})
+
+
+_DIFF_SQL = text("""
+    SELECT o.run_id, o.host, o.port, other.status
+    FROM scan_result AS o
+    LEFT JOIN scan_result AS other
+      ON other.run_id = CASE o.run_id WHEN :a THEN :b ELSE :a END
+     AND other.host = o.host AND other.port = o.port
+    WHERE o.run_id IN (:a, :b) AND o.status = 'open'
+      AND (other.status IS NULL OR other.status != 'open')
+    ORDER BY o.host, o.port
+""")
+
+
+def start_run(targets, ports, user_id=None, sweep_id=None):
+    run = ScanRun(targets=targets[:512], ports=ports[:512], user_id=user_id, sweep_id=sweep_id)
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+def save_results(run_id, results):
+    """Insert {'host', 'port', 'status'} results of a run in one statement and commit."""
+    if not results:
+        return
+    rows = [{'run_id': run_id, 'host': r['host'], 'port': r['port'],
+             'status': r['status'][:_STATUS_LENGTH]} for r in results]
+    db.session.execute(_insert_results(db.session.get_bind().dialect.name), rows)
+    db.session.commit()
+
+
+def finish_run(run_id, status, probes, open_ports):
+    db.session.query(ScanRun).filter_by(id=run_id).update(
+        {'status': status, 'probes': probes, 'open_ports': open_ports, 'finished_at': datetime.now()})
+    db.session.commit()
+
+
+def stop_interrupted_runs():
+    """Mark runs left running by a previous server process as stopped (sweeps can be resumed)."""
+    count = (db.session.query(ScanRun).filter_by(status='running')
+             .update({'status': 'stopped', 'finished_at': datetime.now()}, synchronize_session=False))
+    db.session.commit()
+    return count
+
+
+def run_for_sweep(sweep_id):
+    return ScanRun.query.filter_by(sweep_id=sweep_id).first()
+
+
+def sweep_run(sweep_id, targets, ports):
+    """The ScanRun of a sweep that is (re)starting: created if missing, marked running."""
+    run = run_for_sweep(sweep_id)
+    if run is None:
+        return start_run(targets, ports, sweep_id=sweep_id)
+    run.status = 'running'
+    run.finished_at = None
+    db.session.commit()
+    return run
+
+
+def recent_runs(user_id=None, limit=10):
+    query = ScanRun.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    return query.order_by(ScanRun.created_at.desc()).limit(limit).all()
+
+
+def open_ports(run_id):
+    rows = (db.session.query(ScanResult.host, ScanResult.port)
+            .filter_by(run_id=run_id, status='open')
+            .order_by(ScanResult.host, ScanResult.port))
+    return [{'host': host, 'port': port} for host, port in rows]
+
+
+def diff_runs(a, b):
+    """
+    Ports open in run b but not in run a ('opened', with their status in a)
+    and open in a but not in b ('closed', with their status in b). A status
+    of None means the port was not part of the other run.
+    """
+    opened, closed = [], []
+    for run_id, host, port, other in db.session.execute(_DIFF_SQL, {'a': a, 'b': b}):
+        if run_id == b:
+            opened.append({'host': host, 'port': port, 'before': other})
+        else:
+            closed.append({'host': host, 'port': port, 'after': other})
+    return {'opened': opened, 'closed': closed}
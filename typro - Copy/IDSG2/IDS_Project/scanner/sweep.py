@@ -0,0 +1,336 @@
+# scanner/sweep.py
+"""
+Multi-target port sweeps: host lists and CIDR blocks scanned by one shared
+PortScanner, streamed to the browser and resumable after an interruption.
+
+A sweep is created with a target spec ('10.0.0.0/24, db1.example.org') and
+a port spec, and gets an id. Running it (Sweep.start) scans in a background
+thread with its own event loop; the streaming view reads its events queue.
+Probe i is port i // len(hosts) on host i % len(hosts) (see
+PortScanner.sweep), so a sweep's progress is described by indices:
+
+    watermark   every probe below it is done
+    above       done probes at or above it, with their status
+
+The checkpoint file instance/scans/<id>.jsonl holds a header line with the
+specs, then, at most every FLUSH_EVERY seconds, the open/error results found
+since the last flush and a {"done": watermark, "counts": {...}} line.
+Closed and filtered ports are not stored one by one; below the watermark
+they are only counted. When a run stops, the last line also lists the done
+probes above the watermark (a slow host can hold it back by a few thousand
+probes). Resuming a sweep skips everything below the saved watermark plus
+the saved probes above it, so only the probes that were in flight when it
+stopped are repeated (after a crash: everything done since the last flush
+above the watermark).
+"""
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from scanner import store
+from scanner.engine import PortScanner, parse_ports
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SWEEP_DIR = os.path.join(PROJECT_ROOT, 'instance', 'scans')
+MAX_SWEEP_HOSTS = 65536      # a /16
+MAX_ACTIVE_SWEEPS = 4        # sweeps scanning at the same time, over all clients
+FLUSH_EVERY = 1.0            # seconds between checkpoint writes
+REPORTED = ('open',)         # statuses stored and streamed one by one (and errors)
+
+_SWEEP_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class TooManySweeps(Exception):
+    """Raised by Sweep.start when MAX_ACTIVE_SWEEPS sweeps are already running."""
+
+
+def parse_targets(spec):
+    """
+    Hosts from a comma/space separated list of addresses, host names and
+    CIDR blocks ('10.0.0.0/24' is its 254 usable addresses); raises ValueError.
+    """
+    hosts = []
+    for item in re.split(r'[\s,]+', spec.strip()):
+        if not item:
+            continue
+        if '/' in item:
+            network = ipaddress.ip_network(item, strict=False)
+            if network.num_addresses > MAX_SWEEP_HOSTS + 2:
+                raise ValueError(f"{item} is larger than {MAX_SWEEP_HOSTS} hosts")
+            hosts.extend(str(ip) for ip in network.hosts())
+        else:
+            hosts.append(item)
+        if len(hosts) > MAX_SWEEP_HOSTS:
+            raise ValueError(f"more than {MAX_SWEEP_HOSTS} hosts")
+    if not hosts:
+        raise ValueError("no targets given")
+    return list(dict.fromkeys(hosts))
+
+
+def _is_reported(status):
+    return status in REPORTED or status.startswith('error')
+
+
+class SweepCheckpoint:
+    """Progress of one sweep and its append-only checkpoint file."""
+
+    def __init__(self, sweep_id, targets, ports, directory=SWEEP_DIR):
+        self.id = sweep_id
+        self.targets = targets
+        self.ports = ports
+        self.path = os.path.join(directory, f'{sweep_id}.jsonl')
+        self.created_at = None
+        self.finished = False
+        self.watermark = 0
+        self.counts = Counter()   # statuses of the probes below the watermark
+        self.above = {}           # index -> status of done probes at or above it
+        self.found = []           # (index, status) of every reported result, in finishing order
+        self._unsaved = []
+        self._lock = threading.Lock()
+        self._file = None
+
+    @classmethod
+    def create(cls, targets, ports, directory=SWEEP_DIR):
+        """Check the specs and write the header of a new sweep; raises ValueError."""
+        parse_targets(targets)
+        parse_ports(ports)
+        checkpoint = cls(uuid.uuid4().hex, targets, ports, directory)
+        checkpoint.created_at = datetime.now().isoformat(timespec='seconds')
+        os.makedirs(directory, exist_ok=True)
+        with open(checkpoint.path, 'x') as f:
+            f.write(json.dumps({'id': checkpoint.id, 'targets': targets, 'ports': ports,
+                                'created_at': checkpoint.created_at}) + '\n')
+        return checkpoint
+
+    @classmethod
+    def load(cls, sweep_id, directory=SWEEP_DIR):
+        """The saved state of a sweep; raises KeyError if there is no such sweep."""
+        if not _SWEEP_ID.match(sweep_id or ''):
+            raise KeyError(sweep_id)
+        try:
+            f = open(os.path.join(directory, f'{sweep_id}.jsonl'))
+        except FileNotFoundError:
+            raise KeyError(sweep_id)
+        with f:
+            header = json.loads(f.readline())
+            checkpoint = cls(sweep_id, header['targets'], header['ports'], directory)
+            checkpoint.created_at = header.get('created_at')
+            results = []
+            saved_above = {}
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break   # torn last line of a crashed process
+                if isinstance(record, list):
+                    results.append(record)
+                elif 'done' in record:
+                    checkpoint.watermark = record['done']
+                    checkpoint.counts = Counter(record['counts'])
+                    saved_above = dict(record.get('above', ()))
+                elif record.get('finished'):
+                    checkpoint.finished = True
+        checkpoint.found = [(index, status) for index, status in results]
+        saved_above.update((index, status) for index, status in results if index >= checkpoint.watermark)
+        checkpoint.above = saved_above
+        return checkpoint
+
+    def is_done(self, index):
+        return index < self.watermark or index in self.above
+
+    def record(self, index, status):
+        with self._lock:
+            self.above[index] = status
+            above = self.above
+            while self.watermark in above:
+                self.counts[above.pop(self.watermark)] += 1
+                self.watermark += 1
+            if _is_reported(status):
+                self.found.append((index, status))
+                self._unsaved.append([index, status])
+
+    def progress(self):
+        """{'done': n, 'counts': {status: n}} over everything scanned so far."""
+        with self._lock:
+            counts = self.counts + Counter(self.above.values())
+            return {'done': self.watermark + len(self.above), 'counts': dict(counts)}
+
+    def flush(self, finished=False, stopped=False):
+        """Append the new results and the watermark; stopped=True also saves the probes above it."""
+        with self._lock:
+            lines = [json.dumps(r) for r in self._unsaved]
+            self._unsaved = []
+            done = {'done': self.watermark, 'counts': dict(self.counts)}
+            if stopped and self.above:
+                done['above'] = sorted(self.above.items())
+            lines.append(json.dumps(done))
+            if finished:
+                lines.append(json.dumps({'finished': True}))
+                self.finished = True
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Sweep:
+    """
+    A sweep scanning in a background thread; its events queue feeds the
+    streaming client. With an app, results are also stored as the sweep's
+    ScanRun (scanner/store.py), each batch before the checkpoint that
+    covers it, so a resumed sweep never skips a port missing from the
+    database.
+    """
+
+    _active = {}
+    _active_lock = threading.Lock()
+
+    def __init__(self, checkpoint, app=None, scanner=None):
+        self.checkpoint = checkpoint
+        self.app = app
+        self.hosts = parse_targets(checkpoint.targets)
+        self.ports = parse_ports(checkpoint.ports)
+        self.total = len(self.hosts) * len(self.ports)
+        self.scanner = scanner or PortScanner()
+        self.events = queue.Queue()
+        self.error = None
+        self.run_id = None
+        self._thread = None
+        self._unsaved = []       # results not in the database yet
+        self._last_flush = time.monotonic()
+        self._failed_hosts = set()
+
+    @classmethod
+    def start(cls, sweep_id, app=None):
+        """
+        Load the sweep and scan whatever it has left in a new thread. A run
+        of the same sweep that is still going (e.g. a reconnecting browser)
+        is stopped first. Raises KeyError or TooManySweeps.
+        """
+        sweep = cls(SweepCheckpoint.load(sweep_id), app)
+        with cls._active_lock:
+            previous = cls._active.get(sweep_id)
+            if previous is None and len(cls._active) >= MAX_ACTIVE_SWEEPS:
+                raise TooManySweeps(f"{len(cls._active)} sweeps already running")
+            cls._active[sweep_id] = sweep   # the slot is reserved from here on
+        if previous is not None:
+            try:
+                previous.stop()
+                sweep.checkpoint = SweepCheckpoint.load(sweep_id)   # with what it saved on the way out
+            except Exception:
+                sweep._release()
+                raise
+        sweep._thread = threading.Thread(target=sweep._run, name=f'scan-sweep-{sweep_id[:8]}', daemon=True)
+        sweep._thread.start()
+        return sweep
+
+    def _release(self):
+        """Free this run's slot in _active, unless a newer run of the sweep has taken it."""
+        with self._active_lock:
+            if self._active.get(self.checkpoint.id) is self:
+                del self._active[self.checkpoint.id]
+
+    def stop(self, wait=True):
+        self.scanner.cancel()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def progress(self):
+        progress = self.checkpoint.progress()
+        progress['total'] = self.total
+        return progress
+
+    def _emit(self, result):
+        if result['status'].startswith('error'):
+            if result['host'] in self._failed_hosts:
+                return
+            self._failed_hosts.add(result['host'])   # one error per host, not one per port
+        self.events.put(('result', result))
+
+    def _save(self, **flush):
+        """Store the results since the last save, then flush the checkpoint."""
+        if self._unsaved:
+            rows, self._unsaved = self._unsaved, []
+            try:
+                store.save_results(self.run_id, rows)
+            except Exception:
+                self._unsaved = rows + self._unsaved   # retried by the next save
+                raise
+        self.checkpoint.flush(**flush)
+
+    def _on_result(self, index, result):
+        self.checkpoint.record(index, result['status'])
+        if self.run_id is not None:
+            self._unsaved.append(result)
+        if _is_reported(result['status']):
+            self._emit(result)
+        now = time.monotonic()
+        if now - self._last_flush >= FLUSH_EVERY:
+            self._last_flush = now
+            try:
+                self._save()
+            except Exception as e:
+                logging.exception("Sweep %s: saving results failed", self.checkpoint.id)
+                self.error = f"saving results failed: {e}"
+                self.scanner.cancel()
+
+    def _run(self):
+        try:
+            if self.app is None:
+                self._sweep()
+                return
+            with self.app.app_context():
+                checkpoint = self.checkpoint
+                self.run_id = store.sweep_run(checkpoint.id, checkpoint.targets, checkpoint.ports).id
+                self._sweep()
+        finally:
+            self._release()   # also when the run could not start
+
+    def _sweep(self):
+        checkpoint = self.checkpoint
+        for index, status in checkpoint.found:
+            # results saved by earlier runs come first
+            p, h = divmod(index, len(self.hosts))
+            self._emit({'host': self.hosts[h], 'port': self.ports[p], 'status': status})
+        try:
+            if not checkpoint.finished:
+                asyncio.run(self.scanner.sweep(self.hosts, self.ports, self._on_result,
+                                               skip=checkpoint.is_done))
+        except Exception as e:
+            logging.exception("Sweep %s failed", checkpoint.id)
+            self.error = str(e)
+        finally:
+            done = checkpoint.finished or not (self.scanner.cancelled or self.error)
+            try:
+                self._save(finished=done and not checkpoint.finished, stopped=True)
+            except Exception as e:
+                # the checkpoint stays at its last save: a resume probes the rest again
+                logging.exception("Sweep %s: saving results failed", checkpoint.id)
+                self.error = self.error or f"saving results failed: {e}"
+                done = False
+            finally:
+                checkpoint.close()
+                self._release()   # before 'end': the client may start another sweep right away
+            end = self.progress()
+            end.update(finished=done, error=self.error)
+            if self.run_id is not None:
+                status = 'done' if done else 'failed' if self.error else 'stopped'
+                try:
+                    store.finish_run(self.run_id, status, end['done'], end['counts'].get('open', 0))
+                except Exception:
+                    logging.exception("Sweep %s: updating scan run %s failed", checkpoint.id, self.run_id)
+            self.events.put(('end', end))
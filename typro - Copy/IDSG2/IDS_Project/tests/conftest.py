@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# run from anywhere; the app's database is a scratch file, never instance/ids_project.db
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['IDS_DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ids-tests-'), 'test.db')}"
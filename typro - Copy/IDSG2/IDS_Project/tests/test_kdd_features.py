@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from ids.kdd_features import SERROR_FLAGS, TrafficWindows
+
+
+def _rate(part, whole):
+    return round(part / whole, 2) if whole else 0.0
+
+
+def brute_force(history, window_seconds, host_window):
+    """The window features of the last connection of history, recounted from scratch."""
+    now, dst, service, sport, flag = history[-1]
+    recent = [c for c in history if c[0] > now - window_seconds]
+    same_host = [c for c in recent if c[1] == dst]
+    same_srv = [c for c in recent if c[2] == service]
+    count, srv_count = len(same_host), len(same_srv)
+    same_host_srv = sum(c[2] == service for c in same_host)
+
+    last = history[-host_window:]
+    host = [c for c in last if c[1] == dst]
+    srv = [c for c in last if c[2] == service]
+    host_srv = sum(c[2] == service for c in host)
+    return (
+        count,
+        srv_count,
+        _rate(sum(c[4] in SERROR_FLAGS for c in same_host), count),
+        _rate(sum(c[4] == 'REJ' for c in same_host), count),
+        _rate(same_host_srv, count),
+        _rate(count - same_host_srv, count),
+        _rate(srv_count - same_host_srv, srv_count),
+        len(host),
+        len(srv),
+        _rate(len(host) - host_srv, len(host)),
+        _rate(sum(c[3] == sport for c in host), len(host)),
+        _rate(len(srv) - host_srv, len(srv)),
+    )
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_windows_match_brute_force(seed):
+    rng = random.Random(seed)
+    windows = TrafficWindows(window_seconds=2.0, host_window=20)
+    history, ts = [], 0.0
+    for _ in range(2000):
+        ts += rng.expovariate(10.0)
+        conn = (ts, rng.randrange(4), (6, rng.choice((22, 80, 443))), rng.choice((1000, 1001, 1002)),
+                rng.choice(('SF', 'S0', 'REJ', 'OTH')))
+        history.append(conn)
+        assert windows.add(*conn) == brute_force(history, 2.0, 20)
+
+
+def test_same_src_port_rate_is_per_destination_host():
+    windows = TrafficWindows()
+    windows.add(0.0, 'a', (6, 80), 1000, 'SF')
+    windows.add(0.1, 'b', (6, 80), 1000, 'SF')   # other host, same service and port
+    features = windows.add(0.2, 'a', (6, 22), 1000, 'SF')
+    # 2 connections to host a, both from port 1000
+    assert features[10] == 1.0
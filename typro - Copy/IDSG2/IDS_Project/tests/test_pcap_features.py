@@ -0,0 +1,80 @@
+import random
+import struct
+
+import numpy as np
+import pytest
+
+from ids.capture import LINKTYPE_RAW
+from ids.flow_table import FEATURE_ORDER, ip_to_int
+from ids.pcap_features import iter_flow_features
+
+TIMEOUT = 2.0
+
+
+def write_pcap(path, packets):
+    """A classic pcap of raw IPv4/TCP packets (ts as (sec, usec), src, dst, sport, dport, flags, length)."""
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINKTYPE_RAW))
+        for ts, src, dst, sport, dport, flags, length in packets:
+            ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, length, 0, 0, 64, 6, 0,
+                             struct.pack('!I', src), struct.pack('!I', dst))
+            tcp = struct.pack('!HHIIBBHHH', sport, dport, 0, 0, 0x50, flags, 0, 0, 0)
+            sec, usec = ts
+            f.write(struct.pack('<IIII', sec, usec, len(ip + tcp), length))
+            f.write(ip + tcp)
+
+
+def brute_force(packets, timeout):
+    """Flows recounted from scratch: per 5-tuple, a gap of more than timeout starts a new flow."""
+    flows, open_flows = [], {}
+    for (sec, usec), src, dst, sport, dport, flags, length in packets:
+        ts = sec + usec * 1e-6   # as the pcap reader computes it
+        key = (src, dst, sport, dport)
+        flow = open_flows.get(key)
+        if flow is None or ts - flow['last'] > timeout:
+            flow = open_flows[key] = {'key': key, 'first': ts, 'last': ts, 'bytes': 0,
+                                      'packets': 0, 'syn': 0, 'ack': 0, 'fin': 0}
+            flows.append(flow)
+        flow['last'] = ts
+        flow['bytes'] += length
+        flow['packets'] += 1
+        flow['syn'] += bool(flags & 0x02)
+        flow['ack'] += bool(flags & 0x10)
+        flow['fin'] += bool(flags & 0x01)
+    return sorted(
+        (f['key'][0], f['key'][1], round(max(0.000001, f['last'] - f['first']), 6), f['bytes'],
+         f['packets'], f['bytes'] / f['packets'], f['key'][2], f['key'][3], 6, f['syn'], f['ack'], f['fin'])
+        for f in flows)
+
+
+def extracted(path, chunk_packets):
+    rows = []
+    for frame in iter_flow_features(path, chunk_packets, TIMEOUT):
+        for row in frame.itertuples(index=False):
+            values = row._asdict()
+            rows.append((int(values['src']), int(values['dst']), round(values['duration'], 6))
+                        + tuple(values[name] for name in FEATURE_ORDER[1:]))
+    return sorted(rows)
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+@pytest.mark.parametrize('chunk_packets', [7, 64, 100000])
+def test_flows_match_brute_force(tmp_path, seed, chunk_packets):
+    rng = random.Random(seed)
+    hosts = [ip_to_int(f'10.0.0.{i}') for i in range(1, 5)]
+    us, packets = 1700000000 * 10**6, []
+    for _ in range(2000):
+        us += rng.choice((0, 1000, 50000, 500000, 1900000, 2500000))   # some gaps exceed the timeout
+        packets.append((divmod(us, 10**6), rng.choice(hosts), rng.choice(hosts), rng.choice((1025, 1026)),
+                        rng.choice((22, 80)), rng.choice((0x02, 0x10, 0x11, 0x18)), rng.randint(40, 1500)))
+    path = str(tmp_path / 'flows.pcap')
+    write_pcap(path, packets)
+    assert extracted(path, chunk_packets) == brute_force(packets, TIMEOUT)
+
+
+def test_single_packet_flow_has_the_duration_floor(tmp_path):
+    path = str(tmp_path / 'one.pcap')
+    write_pcap(path, [((1700000000, 0), ip_to_int('10.0.0.1'), ip_to_int('10.0.0.2'), 1025, 80, 0x02, 60)])
+    frame = next(iter_flow_features(path))
+    assert frame['duration'].tolist() == [0.000001]
+    assert np.array_equal(frame.columns[2:], FEATURE_ORDER)
@@ -0,0 +1,118 @@
+import gzip
+import io
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import app
+from database import alerts as alert_store
+from database.db import AnalysisJob, User, db
+from ids import pcap_upload
+
+
+@pytest.fixture
+def user_id():
+    with app.app_context():
+        user = User(username=f'upload-{time.monotonic_ns()}', password_hash='-')
+        db.session.add(user)
+        db.session.commit()
+        now = datetime.now()
+        alert_store.insert_alerts(db.session.connection(), [
+            {'timestamp': now - timedelta(hours=i), 'source_ip': '10.0.0.1', 'destination_ip': '10.0.0.2',
+             'protocol': 'TCP', 'alert_type': 'Malicious Flow', 'severity': 'high' if i % 2 else 'low',
+             'description': f'alert {i}', 'user_id': user.id}
+            for i in range(30)])
+        db.session.commit()
+        yield user.id
+        alert_store.delete_user_alerts(db.session.connection(), user.id)
+        db.session.commit()
+
+
+@pytest.fixture
+def client(user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def test_dashboard(client):
+    response = client.get('/ids/')
+    assert response.status_code == 200
+    assert b'10.0.0.1' in response.data
+    today = datetime.now().strftime('%Y-%m-%d').encode()
+    assert b'<td>' + today + b'</td>' in response.data
+
+
+def test_run_without_file_redirects(client):
+    response = client.post('/ids/run')
+    assert response.status_code == 302
+
+
+def test_run_queues_job_and_reports_it(client, user_id, tmp_path, monkeypatch):
+    monkeypatch.setattr(pcap_upload, 'UPLOAD_DIR', str(tmp_path))
+    response = client.post('/ids/run', data={'pcap_file': (io.BytesIO(b'not a capture'), 'test.pcap')},
+                           headers={'Accept': 'application/json'})
+    assert response.status_code == 202
+    job = response.get_json()
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        status = client.get(job['status_url']).get_json()
+        if status['status'] in ('done', 'failed'):
+            break
+        time.sleep(0.05)
+    assert status['status'] in ('done', 'failed')
+    assert status['id'] == job['job_id']
+
+    progress = client.get(job['progress_url']).get_json()
+    assert progress['status'] == status['status']
+    assert job['job_id'] in [j['id'] for j in client.get('/ids/jobs').get_json()]
+    with app.app_context():
+        assert db.session.get(AnalysisJob, job['job_id']).user_id == user_id
+
+
+def test_logs_pages_follow_the_cursor(client):
+    seen, after = [], None
+    while True:
+        query = {'limit': 7} if after is None else {'limit': 7, 'after': after}
+        page = client.get('/ids/logs', query_string=query, headers={'Accept': 'application/json'}).get_json()
+        seen.extend(a['description'] for a in page['alerts'])
+        after = page['next_cursor']
+        if after is None:
+            break
+    assert seen == [f'alert {i}' for i in range(30)]
+
+
+def test_logs_html_and_bad_cursor(client):
+    assert client.get('/ids/logs').status_code == 200
+    assert client.get('/ids/logs?after=nonsense').status_code == 400
+
+
+@pytest.mark.parametrize('fmt', ['json', 'ndjson', 'csv'])
+@pytest.mark.parametrize('compress', [False, True])
+def test_export(client, fmt, compress):
+    response = client.get('/ids/export', query_string={'format': fmt, 'gzip': int(compress)})
+    assert response.status_code == 200
+    body = gzip.decompress(response.data) if compress else response.data
+    text = body.decode()
+    if fmt == 'json':
+        assert len(json.loads(text)) == 30
+    elif fmt == 'ndjson':
+        assert len([json.loads(line) for line in text.splitlines()]) == 30
+    else:
+        assert len(text.splitlines()) == 31   # header
+
+
+def test_export_unknown_format(client):
+    assert client.get('/ids/export?format=xml').status_code == 400
+
+
+def test_clear(client, user_id):
+    response = client.post('/ids/clear')
+    assert response.status_code == 302
+    with app.app_context():
+        assert alert_store.count_alerts(db.session.connection(), user_id) == 0